@@ -18,7 +18,10 @@ from . import (
     llm_stub,
     multiplayer,
     objects,
+    profiler,
     sensors,
+    sim_clock,
+    tracer,
     world,
 )
 
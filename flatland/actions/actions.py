@@ -10,18 +10,19 @@ from ..utils import move_in
 if TYPE_CHECKING:
     from ..game import Game
     from ..objects.base_objects import GameObject
-    from ..objects.items import Ground
+    from ..world.ground_grid import GroundGrid
 
 
 class MovementMixin:
     direction: Direction
-    ground_objs_list: list["Ground"]
+    ground_grid: Optional["GroundGrid"] = None
 
-    def get_ground_objs(self, game: "Game") -> None:
+    def set_ground_grid(self, ground_grid: "GroundGrid") -> None:
+        """The grid is owned by the level and shared by all the objects in it"""
+        self.ground_grid = ground_grid
 
-        self.ground_objs_list: list["Ground"] = [
-            obj for obj in game.current_level._observers if obj.__class__.__name__ == "Ground"  # type: ignore
-        ]
+    def get_ground_objs(self, game: "Game") -> None:
+        self.set_ground_grid(game.current_level.ground_grid)
 
     def move(self: Any, direction: Direction) -> None:
         if self.direction == direction:
@@ -201,7 +202,6 @@ class LimbControlMixin:
                         case ("F", "0"):
                             print("F + 0 pressed")
         game.current_level.register(magic)
-        game.current_level.get_ground_objs(game)
 
     def push(self: Any, other: "GameObject") -> None:
         # stats check
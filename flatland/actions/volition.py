@@ -36,6 +36,12 @@ class VolitionEngine:
 
             return False
 
+    def can_act(self) -> bool:
+        """Whether the owner may ever decide to do something, either driven by the user or by AI"""
+        return any(
+            hasattr(self.owner, action) for action in ("get_pressed_keys", "speak", "move", "push")
+        )
+
     def prepare(self, game):
         """
         this is the stage in which the LLM thinks what to do
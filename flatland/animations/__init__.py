@@ -6,4 +6,4 @@ Once the sprites are set, all the rest is handled automatically.
 
 """
 
-from . import animations, render
+from . import animation_clock, animations, render, sprite_cache
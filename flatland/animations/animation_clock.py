@@ -0,0 +1,32 @@
+"""
+Pace of the sprite animations.
+
+By default, animations advance by one frame at each render, and the game renders at the pace of
+the simulation. A renderer drawing faster than that, like the multiplayer client interpolating at
+display rate, sets ``fps``: each object then advances by at most one frame per animation period,
+whatever the number of renders.
+"""
+
+from typing import Any, Optional
+
+
+class AnimationClock:
+    def __init__(self) -> None:
+        self.fps: Optional[float] = None  # None: one frame per render
+        self.frame = 0
+
+    def set_time(self, time_ms: float) -> None:
+        if self.fps:
+            self.frame = int(time_ms * self.fps / 1000)
+
+    def step(self, obj: Any) -> int:
+        """By how many frames the animation of obj moves at this render: 1 or 0"""
+        if self.fps is None:
+            return 1
+        if getattr(obj, "animation_frame", None) == self.frame:
+            return 0
+        obj.animation_frame = self.frame
+        return 1
+
+
+animation_clock = AnimationClock()
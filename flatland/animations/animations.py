@@ -14,6 +14,8 @@ import pygame
 
 from ..consts import TILE_SIZE, Direction
 from ..logger import Logger
+from .animation_clock import animation_clock
+from .sprite_cache import sprite_cache
 
 if TYPE_CHECKING:
     from ..objects.base_objects import GameObject
@@ -70,13 +72,10 @@ class MovementAnimationMixin:
     prev_y: int
 
     def create_movement_sprites(self: HasMovementAttributes) -> None:
-        self.movement_sprites = {
-            k: list(map(lambda x: pygame.image.load(x).convert_alpha(), lst_str))
-            for k, lst_str in self.movement_sprites_locations.items()
-        }
+        self.movement_sprites = sprite_cache.load_sprites(self, self.movement_sprites_locations)
 
     def update_movement_animation(self: HasMovementAttributes):
-        self.animation_index = (self.animation_index + 1) % len(
+        self.animation_index = (self.animation_index + animation_clock.step(self)) % len(
             self.movement_sprites[self.direction]
         )
 
@@ -136,16 +135,13 @@ class StandingAnimationMixin:
         self.standing_sprites = []
         for idx in range(len(self.standing_sprites_locations)):
             self.standing_sprites.append(
-                {
-                    k: list(map(lambda x: pygame.image.load(x).convert_alpha(), lst_str))
-                    for k, lst_str in self.standing_sprites_locations[idx].items()
-                }
+                sprite_cache.load_sprites(self, self.standing_sprites_locations[idx])
             )
 
     def update_standing_animation(self: T) -> None:
-        self.standing_animation_index = (self.standing_animation_index + 1) % len(
-            self.standing_sprites[self.current_standing_idx][self.direction]
-        )
+        self.standing_animation_index = (
+            self.standing_animation_index + animation_clock.step(self)
+        ) % len(self.standing_sprites[self.current_standing_idx][self.direction])
 
     def render_standing(self: T, screen: pygame.Surface) -> None:
         offset_x = self.sprite_size_x // 2 - TILE_SIZE // 2
@@ -165,14 +161,12 @@ class DeathAnimationMixin:
     dying_sprites: dict[Direction, Any]
 
     def create_dying_sprites(self: Any) -> None:
-        self.dying_sprites = {
-            k: list(map(lambda x: pygame.image.load(x).convert_alpha(), lst_str))
-            for k, lst_str in self.dying_sprites_locations.items()
-        }
+        self.dying_sprites = sprite_cache.load_sprites(self, self.dying_sprites_locations)
 
     def update_dying_animation(self: Any):
         self.dying_animation_index = min(
-            self.dying_animation_index + 1, len(self.dying_sprites[self.direction]) - 1
+            self.dying_animation_index + animation_clock.step(self),
+            len(self.dying_sprites[self.direction]) - 1,
         )
 
     def render_dying(self: Any, screen: pygame.Surface) -> None:
@@ -191,13 +185,10 @@ class PushAnimationMixin:
     push_sprites: dict[Direction, Any]
 
     def create_push_sprites(self: Any) -> None:
-        self.push_sprites = {
-            k: list(map(lambda x: pygame.image.load(x).convert_alpha(), lst_str))
-            for k, lst_str in self.push_sprites_locations.items()
-        }
+        self.push_sprites = sprite_cache.load_sprites(self, self.push_sprites_locations)
 
     def update_push_animation(self: Any):
-        self.push_animation_index = (self.push_animation_index + 1) % len(
+        self.push_animation_index = (self.push_animation_index + animation_clock.step(self)) % len(
             self.push_sprites[self.direction]
         )
 
@@ -217,15 +208,12 @@ class CastingAnimationMixin:
     casting_sprites: dict[Direction, Any]
 
     def create_casting_sprites(self: Any) -> None:
-        self.casting_sprites = {
-            k: list(map(lambda x: pygame.image.load(x).convert_alpha(), lst_str))
-            for k, lst_str in self.casting_sprites_locations.items()
-        }
+        self.casting_sprites = sprite_cache.load_sprites(self, self.casting_sprites_locations)
 
     def update_casting_animation(self: Any):
-        self.casting_animation_index = (self.casting_animation_index + 1) % len(
-            self.casting_sprites[self.direction]
-        )
+        self.casting_animation_index = (
+            self.casting_animation_index + animation_clock.step(self)
+        ) % len(self.casting_sprites[self.direction])
 
     def render_casting(self: Any, screen: pygame.Surface) -> None:
         offset_x = self.sprite_size_x // 2 - TILE_SIZE // 2
@@ -0,0 +1,123 @@
+"""
+Process-wide cache of the sprite surfaces.
+
+Sprites are keyed by path: all the objects using the same image share the same ``Surface``,
+which is decoded only once. The cache is thread safe, as levels may be built in background.
+
+Entries are reference counted by owner object (references are dropped when the owner is garbage
+collected) and, if ``max_bytes`` is set, the least recently used entries that are not referenced
+anymore are evicted to keep the cache under the memory cap.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import pygame
+
+from ..asset_mode import asset_mode
+from ..consts import Direction
+from ..logger import Logger
+
+
+class SpriteCache:
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self.max_bytes = max_bytes
+        self._surfaces: OrderedDict[Hashable, pygame.Surface] = OrderedDict()
+        self._refcounts: dict[Hashable, int] = {}
+        self._sizes: dict[Hashable, int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.logger = Logger()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._surfaces
+
+    def refcount(self, key: Hashable) -> int:
+        return self._refcounts.get(key, 0)
+
+    def _acquire(self, key: Hashable, factory: Callable[[], pygame.Surface]) -> pygame.Surface:
+        with self._lock:
+            surface = self._surfaces.get(key)
+            if surface is None:
+                self.misses += 1
+                surface = factory()
+                self._surfaces[key] = surface
+                self._sizes[key] = (
+                    surface.get_bytesize() * surface.get_width() * surface.get_height()
+                )
+                self.total_bytes += self._sizes[key]
+            else:
+                self.hits += 1
+                self._surfaces.move_to_end(key)
+            self._refcounts[key] = self._refcounts.get(key, 0) + 1
+            return surface
+
+    def get_or_create(
+        self, owner: Any, key: Hashable, factory: Callable[[], pygame.Surface]
+    ) -> pygame.Surface:
+        """
+        Return the surface cached under ``key``, creating it with ``factory`` if needed.
+        The reference taken by ``owner`` is released when ``owner`` is garbage collected.
+        """
+        surface = self._acquire(key, factory)
+        weakref.finalize(owner, self.release_many, [key])
+        self._evict()
+        return surface
+
+    def load_sprites(
+        self, owner: Any, locations: dict[Direction, list[str]]
+    ) -> dict[Direction, list[pygame.Surface]]:
+        """Load the ``{direction: [paths]}`` sprite locations of the animation mixins"""
+        if asset_mode.headless:
+            return locations  # type: ignore  # the paths stand for the frames
+        keys: list[Hashable] = []
+        sprites = {}
+        for k, lst_str in locations.items():
+            sprites[k] = [self._acquire(path, self._loader(path)) for path in lst_str]
+            keys.extend(lst_str)
+        weakref.finalize(owner, self.release_many, keys)
+        self._evict()
+        return sprites
+
+    @staticmethod
+    def _loader(path: str) -> Callable[[], pygame.Surface]:
+        return lambda: pygame.image.load(path).convert_alpha()
+
+    def release_many(self, keys: list[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                count = self._refcounts.get(key, 0) - 1
+                if count > 0:
+                    self._refcounts[key] = count
+                else:
+                    self._refcounts.pop(key, None)
+            self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self.max_bytes is None or self.total_bytes <= self.max_bytes:
+                return
+            for key in list(self._surfaces):  # from the least recently used
+                if self.total_bytes <= self.max_bytes:
+                    break
+                if self._refcounts.get(key, 0) == 0:
+                    del self._surfaces[key]
+                    self.total_bytes -= self._sizes.pop(key)
+                    self.logger.info(f"Sprite {key} evicted from the cache")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._surfaces.clear()
+            self._refcounts.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+
+sprite_cache = SpriteCache()
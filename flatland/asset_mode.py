@@ -0,0 +1,26 @@
+"""
+Asset-free mode, for the authoritative server.
+
+The server simulates the world but never draws nor plays it. In headless mode, the display and
+the mixer are not initialised, and the objects keep the metadata of their sprites (the paths, hence
+the number of frames, and the sizes) instead of loading them as surfaces. It is enabled with the
+``FLATLAND_HEADLESS`` environment variable, which must be set before the objects are imported.
+"""
+
+import os
+
+import pygame
+
+
+class AssetMode:
+    def __init__(self) -> None:
+        self.headless = os.getenv("FLATLAND_HEADLESS", "false").lower() == "true"
+
+    def init_display(self) -> None:
+        """Initialise pygame with a minimal window, needed to convert the loaded sprites"""
+        if not self.headless:
+            pygame.init()
+            pygame.display.set_mode((1, 1))
+
+
+asset_mode = AssetMode()
@@ -5,26 +5,36 @@ This loop is not directly used in the multiplayer game.
 """
 
 import os
+import time
 import warnings
-from typing import Any
+from typing import TYPE_CHECKING, Any, Optional
 
 import pygame
 
+from .asset_mode import asset_mode
 from .consts import MAX_X, MAX_Y, TILE_SIZE
 from .logger import Logger
 from .objects.items_registry import registry
+from .profiler import profiler
+from .sim_clock import sim_clock
+from .tracer import tracer
 from .world.level import Level
+from .world.level_factory import factory
+
+if TYPE_CHECKING:
+    from .objects.base_objects import GameObject
 
 os.environ["SDL_VIDEODRIVER"] = "dummy"  # Use a headless display
 
-# initialise pygame for CI tests
-pygame.init()
-pygame.display.set_mode((1, 1))  # Minimal dummy window
-try:
-    pygame.mixer.init()
-except pygame.error as e:
-    # fallback: disable sound if mixer init fails (e.g., in CI)
-    warnings.warn(f"Could not load mixer, {e}")
+# initialise pygame for CI tests, unless the game is only simulated
+if not asset_mode.headless:
+    pygame.init()
+    pygame.display.set_mode((1, 1))  # Minimal dummy window
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        # fallback: disable sound if mixer init fails (e.g., in CI)
+        warnings.warn(f"Could not load mixer, {e}")
 
 
 class Game:
@@ -35,7 +45,7 @@ class Game:
             cls._instance = super(Game, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, world: dict[str, Level], screen: pygame.Surface) -> None:
+    def __init__(self, world: dict[str, Level], screen: Optional[pygame.Surface] = None) -> None:
         if not hasattr(self, "current_level"):  # these checks are needed for the singleton
             self.current_level: Level = Level()
         if not hasattr(self, "world"):
@@ -43,18 +53,62 @@ class Game:
         if not hasattr(self, "screen"):
             self.screen = screen
         if not hasattr(self, "clock"):
-            self.clock = pygame.time.Clock()
+            self.clock = pygame.time.Clock() if screen is not None else None
         if not hasattr(self, "logger"):
             self.logger = Logger()
 
     def get_key_state(self) -> Any:
         return pygame.key.get_pressed()
 
+    def change_level(self, level_key: str, exit_name: str) -> "GameObject":
+        """Move the player, and its children, to the portal ``exit_name`` of level ``level_key``"""
+        # get player
+        player = [
+            obj for obj in self.current_level._observers if obj.__class__.__name__ == "Player"
+        ][0]
+        # unregister
+        self.current_level.unregister(player)
+        for obj in player.children:
+            self.current_level.unregister(obj)
+        # change level
+        self.current_level = self.world[level_key]
+        factory.prefetch_neighbours(self.current_level)
+        portal = [obj for obj in self.current_level._observers if obj.name == exit_name][0]
+        player.x = portal.x
+        player.y = portal.y
+        self.current_level.register(player)
+        for obj in player.children:
+            obj.x = portal.x
+            obj.y = portal.y
+            self.current_level.register(obj)
+        return player
+
+    def run_headless(self, ticks: int, level_key: Optional[str] = None, step_ms: int = 100) -> None:
+        """
+        Run ``ticks`` fixed steps of ``step_ms`` logical milliseconds each, as fast as possible:
+        nothing is rendered and the wall clock is not used, hence the game needs no screen.
+        Portal events are processed only if the pygame display is initialised.
+        """
+        if level_key is not None:
+            self.current_level = self.world[level_key]
+        with sim_clock.fixed_step(step_ms):
+            for _ in range(ticks):
+                if pygame.display.get_init():
+                    for event in pygame.event.get(pygame.USEREVENT):
+                        self.change_level(*event.code)
+                    keys = self.get_key_state()
+                else:
+                    keys = None
+                self.current_level.step(1, self, keys)
+
     def main(self, stop_event: Any = None) -> None:
+        if self.screen is None or self.clock is None:
+            raise RuntimeError("The game needs a screen to be played, see run_headless")
 
         pygame.display.set_caption("Flatland")
 
         self.current_level = self.world["level_0"]
+        factory.prefetch_neighbours(self.current_level)
         player = registry.create(
             cls_name="Player",
             x=4,
@@ -66,55 +120,35 @@ class Game:
             temperature=36.3,
         )
         self.current_level.register(player)
-        self.current_level.get_ground_objs(self)
 
         running = True
         while running:
+            tick_started = time.perf_counter()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
                 if event.type == pygame.USEREVENT:
                     level_key, exit_name = event.code
                     print(event, level_key)
-                    # get player
-                    player = [
-                        obj
-                        for obj in self.current_level._observers
-                        if obj.__class__.__name__ == "Player"
-                    ][0]
-                    # unregister
-                    self.current_level.unregister(player)
-                    for obj in player.children:
-                        self.current_level.unregister(obj)
-                    # change level
-                    self.current_level = self.world[level_key]
-                    portal = [
-                        obj for obj in self.current_level._observers if obj.name == exit_name
-                    ][0]
-                    player.x = portal.x
-                    player.y = portal.y
-                    self.current_level.register(player)
-                    for obj in player.children:
-                        obj.x = portal.x
-                        obj.y = portal.y
-                        self.current_level.register(obj)
-                    self.current_level.get_ground_objs(self)
+                    player = self.change_level(level_key, exit_name)
             self.screen.fill((0, 0, 0))  # to cancel previous state
-            self.current_level.reset_is_walkable()  # reset tiles to walkable: they will be changed when they are encumbered by objects
+            self.current_level.reset_is_walkable()  # rebuild the walkability map from the encumbrant objects
 
             keys = self.get_key_state()  # this does pygame.key.get_pressed()
 
             # send keys to the user
             if any(keys):
                 self.current_level.send_keys_to_user(keys)
-            near_objs = self.current_level._observers
-            # self.logger.info(near_objs)
             self.current_level.set_volume(player)  # type: ignore
-            self.current_level.prepare(near_objs, self)
+            # near objects are looked up per object in the level spatial index
+            self.current_level.prepare(None, self)
             self.current_level.update(keys)
             self.current_level.correct_periodic_positions()  # this is needed now that the self.current_level is periodic
             self.current_level.render(self.screen)
             pygame.display.flip()
+            if tracer.enabled:
+                tracer.complete("tick", "tick", tick_started, time.perf_counter() - tick_started)
+            profiler.maybe_dump()
             self.clock.tick(10)
 
             if stop_event is not None and stop_event.is_set():
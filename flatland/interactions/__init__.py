@@ -13,4 +13,4 @@ After the interaction mixins, there are also the evolution mixins, whose goal is
 For example, the evolution of the temperature and its decay is governed by an evolutor. Same for inertia and its evolution damped by friction.
 """
 
-from . import command, evolution, interactions, scheduler
+from . import command, dispatch, evolution, interactions, scheduler
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from .interactions import InteractionMixin
+from .dispatch import dispatch
 
 if TYPE_CHECKING:
     from ..__main__ import Game
@@ -14,18 +14,11 @@ class InteractionCommand:
         self.game = game
 
     def execute(self):
-        if isinstance(self.initiator, InteractionMixin):
-            callables = []
-            for base in self.initiator.__class__.__mro__:
-                if issubclass(base, InteractionMixin) and base != InteractionMixin:
-                    mixin_obj = base.__dict__.get("get_interaction_callables")
-                    if mixin_obj:
-                        calls = base.get_interaction_callables(
-                            self.initiator, self.target, self.game
-                        )
-                        callables.extend(calls)
-            for call in callables:
-                call()
+        callables = []
+        for handler in dispatch.handlers_for(self.initiator.__class__, self.target.__class__):
+            callables.extend(handler(self.initiator, self.target, self.game))
+        for call in callables:
+            call()
 
     def __repr__(self) -> str:
         return "(" + str(self.initiator) + ", " + str(self.target) + ")"
@@ -0,0 +1,66 @@
+"""
+Precompiled interaction dispatch tables.
+
+Walking the MRO of the initiator for every ``InteractionCommand`` is expensive, hence the
+``get_interaction_callables`` handlers of each concrete class are collected once, when the class
+is registered, and the handlers applicable to each (initiator class, target class) pair are cached.
+Pairs with no applicable handlers (e.g. Ground x Ground) do not even need a command.
+"""
+
+from typing import TYPE_CHECKING, Callable
+
+from .interactions import InteractionMixin
+
+if TYPE_CHECKING:
+    from ..game import Game
+    from ..objects.base_objects import GameObject
+
+Handler = Callable[["GameObject", "GameObject", "Game"], list[Callable[[], None]]]
+
+
+class InteractionDispatch:
+    def __init__(self) -> None:
+        # concrete class -> mixins defining get_interaction_callables, in MRO order
+        self._mixins: dict[type, tuple[type[InteractionMixin], ...]] = {}
+        # (initiator class, target class) -> handlers
+        self._matrix: dict[tuple[type, type], tuple[Handler, ...]] = {}
+
+    def compile(self, cls: type) -> tuple[type[InteractionMixin], ...]:
+        """Collect the interaction mixins of ``cls`` and fill its row and column of the matrix."""
+        mixins = tuple(
+            base
+            for base in cls.__mro__
+            if issubclass(base, InteractionMixin)
+            and base is not InteractionMixin
+            and "get_interaction_callables" in base.__dict__
+        )
+        self._mixins[cls] = mixins
+        for other in list(self._mixins):
+            self._matrix.pop((cls, other), None)
+            self._matrix.pop((other, cls), None)
+            self.handlers_for(cls, other)
+            self.handlers_for(other, cls)
+        return mixins
+
+    def mixins_of(self, cls: type) -> tuple[type[InteractionMixin], ...]:
+        mixins = self._mixins.get(cls)
+        if mixins is None:
+            mixins = self.compile(cls)
+        return mixins
+
+    def handlers_for(self, initiator_cls: type, target_cls: type) -> tuple[Handler, ...]:
+        key = (initiator_cls, target_cls)
+        handlers = self._matrix.get(key)
+        if handlers is None:
+            # classes that were not registered are compiled lazily
+            mixins = self.mixins_of(initiator_cls)
+            handlers = tuple(
+                base.__dict__["get_interaction_callables"]
+                for base in mixins
+                if base.applies_to(initiator_cls, target_cls)
+            )
+            self._matrix[key] = handlers
+        return handlers
+
+
+dispatch = InteractionDispatch()
@@ -4,27 +4,32 @@ is out of equilibrium, e.g. having non zero inertia (given that we assume fricti
 """
 
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
 from ..consts import Direction
 from ..logger import Logger
 from ..utils import move_in
 from .interactions import InteractionMixin
 
+# evolutions closer than this to their equilibrium value are considered settled
+EQUILIBRIUM_TOLERANCE = 0.01
+
 if TYPE_CHECKING:
     from ..game import Game
     from ..objects.base_objects import GameObject
-    from ..objects.items import Ground
+    from ..world.ground_grid import GroundGrid
 
 
 class InertiaPrincipleWithFrictionEvolution(InteractionMixin):
-    ground_objs_list: list["Ground"]
+    ground_grid: Optional["GroundGrid"] = None
+    only_with_self = True
 
-    def get_ground_objs(self, game: "Game") -> None:
+    def set_ground_grid(self, ground_grid: "GroundGrid") -> None:
+        """The grid is owned by the level and shared by all the objects in it"""
+        self.ground_grid = ground_grid
 
-        self.ground_objs_list: list["Ground"] = [
-            obj for obj in game.current_level._observers if obj.__class__.__name__ == "Ground"  # type: ignore
-        ]
+    def get_ground_objs(self, game: "Game") -> None:
+        self.set_ground_grid(game.current_level.ground_grid)
 
     def keep_on_moving(self: Any) -> None:
         if getattr(self, "inertia", 0) <= 0.1:
@@ -43,6 +48,9 @@ class InertiaPrincipleWithFrictionEvolution(InteractionMixin):
         else:
             self.inertia -= 1
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return getattr(self, "inertia", 0) <= 0.1
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
@@ -57,11 +65,16 @@ class HealthDecreasesEvolution(InteractionMixin):
     This mixing decreases health as time goes by. Used to remove spawned objects like a baloon.
     """
 
+    only_with_self = True
+
     def keep_on_decreasing(self):
         if getattr(self, "health", 0) <= 0:
             return  # No decrease, death
         self.health -= 1
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return getattr(self, "health", 0) <= 0
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
@@ -71,6 +84,8 @@ class HealthDecreasesEvolution(InteractionMixin):
 
 
 class DamageHealthByTemperature(InteractionMixin):
+    only_with_self = True
+
     def damage_by_temperature(self: Any):
         if self.temperature > self.temperature_threshold_to_hurt_upper:
             self.health -= 1
@@ -80,6 +95,14 @@ class DamageHealthByTemperature(InteractionMixin):
             self.temperature - self.equilibrium_temperature
         ) / 2  # decrease temperature
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return (
+            self.temperature_threshold_to_hurt_lower
+            <= self.temperature
+            <= self.temperature_threshold_to_hurt_upper
+            and abs(self.temperature - self.equilibrium_temperature) < EQUILIBRIUM_TOLERANCE
+        )
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
@@ -89,11 +112,16 @@ class DamageHealthByTemperature(InteractionMixin):
 
 
 class HeatDissipation(InteractionMixin):
+    only_with_self = True
+
     def dissipation(self: Any):
         self.temperature -= (
             self.temperature - self.equilibrium_temperature
         ) / 2  # decrease temperature
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return abs(self.temperature - self.equilibrium_temperature) < EQUILIBRIUM_TOLERANCE
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
@@ -103,6 +131,8 @@ class HeatDissipation(InteractionMixin):
 
 
 class DamageHealthByInertia(InteractionMixin):
+    only_with_self = True
+
     def damage_by_inertia(self: Any):
         if self.inertia > self.inertia_threshold_to_hurt_upper:
             self.health -= 1.0
@@ -111,6 +141,13 @@ class DamageHealthByInertia(InteractionMixin):
             self.health -= 1.0
             # self.inertia += 1
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return (
+            self.inertia_threshold_to_hurt_lower
+            <= self.inertia
+            <= self.inertia_threshold_to_hurt_upper
+        )
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
@@ -121,6 +158,7 @@ class DamageHealthByInertia(InteractionMixin):
 
 class DeathMixin(InteractionMixin):
     inertia: float
+    only_with_self = True
 
     def check_death(self, game: "Game") -> None:
         if hasattr(self, "health"):
@@ -130,6 +168,9 @@ class DeathMixin(InteractionMixin):
                 #    game.current_level.schedule_to_unregister(obj)
                 game.current_level.schedule_to_unregister(self)
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return getattr(self, "health", 0) >= 0.001
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
@@ -139,11 +180,16 @@ class DeathMixin(InteractionMixin):
 
 
 class ParentDeathIDie(InteractionMixin):
+    only_with_self = True
+
     def check_parent_death(self: Any, game: "Game") -> None:
         if self.parent.health < 0.001:
             self.logger.info(f"{self.__class__.__name__} dies because of parent")
             game.current_level.schedule_to_unregister(self)
 
+    def is_at_equilibrium(self: Any) -> bool:
+        return self.parent is None or self.parent.health >= 0.001
+
     def get_interaction_callables(
         self, other: "GameObject", game: "Game"
     ) -> list[Callable[[], None]]:
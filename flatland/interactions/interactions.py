@@ -5,18 +5,37 @@ The the evolutioners take care of evolving the system till a stable configuratio
 
 from abc import ABC, abstractmethod
 from statistics import mean
-from typing import TYPE_CHECKING, Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
 from ..consts import Direction
 from ..logger import Logger
 
 if TYPE_CHECKING:
+    import numpy as np
+
     from ..game import Game
     from ..objects.base_objects import GameObject
 
 
 class InteractionMixin(ABC):
     logger = Logger()
+    # set this to True for mixins that only produce callables when ``self is other``
+    only_with_self: bool = False
+
+    @classmethod
+    def applies_to(cls, initiator_cls: type, target_cls: type) -> bool:
+        """
+        Whether this mixin may ever produce callables for a pair of objects of these classes.
+        This is evaluated once per pair of classes and cached by the interaction dispatch.
+        """
+        return not cls.only_with_self or initiator_cls is target_cls
+
+    def is_at_equilibrium(self) -> bool:
+        """
+        Whether this mixin has nothing left to evolve on its own.
+        Objects whose mixins are all at equilibrium may be put to sleep by the level.
+        """
+        return True
 
     @abstractmethod
     def get_interaction_callables(
@@ -35,24 +54,28 @@ class InteractionMixin(ABC):
         }.get(direction, direction)
 
 
-class EncumbranceMixin(InteractionMixin):
+class EncumbranceMixin:
     """
-    This mixin prevent movements in the location of self. This has to be attached to the Ground objects.
+    This mixin exposes whether the location of self can be walked on. This has to be attached to the Ground objects.
+    Walkability is not computed by interactions anymore: the level rebuilds its walkability map in a single
+    vectorized pass (see ``GroundGrid.update_walkability``) and ``is_walkable`` is a view on that map.
     """
 
-    def reset_is_walkable(self) -> None:
-        self.is_walkable = True
+    walkability_map: Optional["np.ndarray"] = None
+    _is_walkable: bool = True  # used when self is not bound to any level
 
-    def prevent_movement(self: Any, other) -> None:
-        if self.distance(other) < 1 and other.is_encumbrant:
-            self.is_walkable = False
+    @property
+    def is_walkable(self: Any) -> bool:
+        if self.walkability_map is None:
+            return self._is_walkable
+        return bool(self.walkability_map[int(self.y), int(self.x)])
 
-    def get_interaction_callables(
-        self: Any, other: "GameObject", game: "Game"
-    ) -> list[Callable[[], None]]:
-        if other.__class__.__name__ != "Ground":
-            return [lambda: self.prevent_movement(other)]
-        return []
+    @is_walkable.setter
+    def is_walkable(self: Any, value: bool) -> None:
+        if self.walkability_map is None:
+            self._is_walkable = value
+        else:
+            self.walkability_map[int(self.y), int(self.x)] = value
 
 
 class ContactInteractionMixin(InteractionMixin):
@@ -62,6 +85,10 @@ class ContactInteractionMixin(InteractionMixin):
 
     inertia: float
 
+    @classmethod
+    def applies_to(cls, initiator_cls: type, target_cls: type) -> bool:
+        return issubclass(target_cls, ContactInteractionMixin)
+
     def on_contact(self: Any, other: "GameObject") -> None:
         if (
             isinstance(other, ContactInteractionMixin)
@@ -115,6 +142,10 @@ class ExplodeAtTouch(InteractionMixin):
     health: float
     inertia: float
 
+    @classmethod
+    def applies_to(cls, initiator_cls: type, target_cls: type) -> bool:
+        return issubclass(target_cls, HeatInteractionMixin)
+
     def explode(self, other: "GameObject"):
         if (
             isinstance(other, HeatInteractionMixin)
@@ -135,6 +166,10 @@ class ExplodeAtTouch(InteractionMixin):
 class HeatInteractionMixin(InteractionMixin):
     temperature: float
 
+    @classmethod
+    def applies_to(cls, initiator_cls: type, target_cls: type) -> bool:
+        return issubclass(target_cls, HeatInteractionMixin)
+
     def on_heat_transfer(self: Any, other: "GameObject"):
         if (
             isinstance(other, HeatInteractionMixin)
@@ -188,6 +223,10 @@ class ExtendedObjectMixin(InteractionMixin):
 
     schema: dict[Direction, list[tuple[int, int, bool]]]
 
+    def encumbered_cells(self: Any) -> list[tuple[int, int]]:
+        """The cells made unwalkable by the extended object, according to the current schema"""
+        return [(self.x + dx, self.y + dy) for dx, dy, enc in self.schema[self.direction] if enc]
+
     def affect_children(self: Any, other: "GameObject", j: int) -> None:
         # children positions and encumbrance
         dx, dy, other.is_encumbrant = self.schema[self.direction][j]
@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 
-import pygame
+from ..sim_clock import sim_clock
+from ..tracer import object_args, tracer
 
 if TYPE_CHECKING:
     from .command import InteractionCommand
@@ -9,7 +10,7 @@ if TYPE_CHECKING:
 class InteractionScheduler:
     def __init__(self, interval: float = 1.0):
         self.queue: list["InteractionCommand"] = []
-        self.last_execution = pygame.time.get_ticks()
+        self.last_execution = sim_clock.get_ticks()
         self.interval = interval
         self.last_tick_up: int = 0
 
@@ -17,9 +18,15 @@ class InteractionScheduler:
         self.queue.append(command)
 
     def update(self) -> None:
-        tick = int(pygame.time.get_ticks() // (self.interval * 1000))
+        tick = int(sim_clock.get_ticks() // (self.interval * 1000))
         if tick != self.last_tick_up:
             for command in self.queue:
-                command.execute()
+                if tracer.enabled:
+                    initiator, target = command.initiator, command.target
+                    name = f"{initiator.__class__.__name__} -> {target.__class__.__name__}"
+                    args = {"initiator": object_args(initiator), "target": object_args(target)}
+                    tracer.call(name, "interaction", args, command.execute)
+                else:
+                    command.execute()
             self.queue.clear()
             self.last_tick_up = tick
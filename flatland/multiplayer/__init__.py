@@ -8,4 +8,16 @@ The clients only send the commands of the player, the server handles all the log
 The client is taking care of animations and rendering.
 """
 
-from . import client, server
+from . import (
+    async_server,
+    client,
+    framing,
+    inputs,
+    interest,
+    interpolation,
+    replication,
+    server,
+    sharding,
+    tick_scheduler,
+    wire,
+)
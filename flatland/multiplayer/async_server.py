@@ -0,0 +1,114 @@
+"""
+Event loop based server.
+
+All the connections, the parsing of the inputs and the tick loop run in a single asyncio event
+loop, without a thread per client. The tick loop never writes to a socket: it snapshots the levels
+and wakes up the sender of each client. A sender writes the next snapshot of its client to the
+connection, whose outbound buffer is bounded, and waits for it to drain. When a client falls
+behind, the snapshots produced in the meantime are not queued: once the buffer drains, the client
+receives the keyframe of the last tick instead, which supersedes them.
+"""
+
+import asyncio
+import itertools
+from typing import Any, Optional
+
+from flatland.multiplayer import wire
+from flatland.multiplayer.framing import StreamFrameReader
+from flatland.multiplayer.interest import InterestArea
+from flatland.multiplayer.server import GameServer
+from flatland.multiplayer.tick_scheduler import TICK_RATE_HZ
+from flatland.profiler import profiler
+from flatland.world.level import Level
+
+WRITE_BUFFER_LIMIT = 64 * 1024  # bytes buffered per client before the sender waits for a drain
+
+
+class AsyncGameServer(GameServer):
+    def __init__(
+        self,
+        world: dict[str, Level],
+        interest: Optional[InterestArea] = None,
+        write_buffer_limit: int = WRITE_BUFFER_LIMIT,
+        workers: int = 1,
+        tick_rate_hz: float = TICK_RATE_HZ,
+    ) -> None:
+        super().__init__(world, interest, workers, tick_rate_hz)
+        self.write_buffer_limit = write_buffer_limit
+        self.ready: dict[int, asyncio.Event] = dict()  # client_id -> set when a snapshot is due
+        self._client_ids = itertools.count()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        client_id = next(self._client_ids)
+        self.logger.info(f"Client {writer.get_extra_info('peername')} connected as {client_id}")
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        sender = None
+        frames = StreamFrameReader(reader)
+        try:
+            player, join_message = await self.admit(client_id, frames, writer)
+            writer.write(join_message)
+            self.ready[client_id] = asyncio.Event()
+            sender = asyncio.create_task(self.send_snapshots(client_id, writer))
+            while True:
+                self.handle_message(client_id, player, wire.decode(await frames.read_frame()))
+        except Exception as e:  # the connection ended, or the client sent a bad message
+            self.logger.info(f"Connection of client {client_id} ended: {e!r}")
+        finally:
+            if sender is not None:
+                sender.cancel()
+            self.ready.pop(client_id, None)
+            self.disconnect(client_id)
+
+    async def admit(
+        self, client_id: int, frames: StreamFrameReader, writer: asyncio.StreamWriter
+    ) -> tuple[Any, bytes]:
+        """The player of a new connection, with its join message"""
+        with self.lock:
+            return self.join(client_id, writer)
+
+    async def send_snapshots(self, client_id: int, writer: asyncio.StreamWriter) -> None:
+        ready = self.ready[client_id]
+        try:
+            while True:
+                await ready.wait()
+                ready.clear()
+                with self.lock:
+                    level = self.client_levels.get(client_id)
+                    if level is None:
+                        return  # disconnected, e.g. handed over to another worker
+                    with profiler.phase(level.level_key, "broadcast"):
+                        data = self.next_snapshot(client_id)
+                        if data is not None:
+                            writer.write(data)
+                if data is not None:
+                    await writer.drain()  # a slow client only delays its own sender
+        except ConnectionError:
+            writer.close()  # the reader sees the connection end and disconnects the client
+
+    def broadcast(self) -> list[int]:
+        """Snapshot the levels, then let the senders write them: never blocks on a socket"""
+        with self.lock:
+            self.tick_stages()
+        for ready in self.ready.values():
+            ready.set()
+        return []
+
+    async def world_loop_async(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_scheduler.delay())
+            self.tick_scheduler.run(self.update_world)
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 12345) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print("Server listening...")
+        world_loop = asyncio.create_task(self.world_loop_async())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            world_loop.cancel()
+
+    def run(self, host="0.0.0.0", port=12345):
+        asyncio.run(self.serve(host, port))
@@ -0,0 +1,96 @@
+"""
+Benchmark of the wire protocol against pickle, on the snapshots of a real level.
+
+The codec is smaller, and faster on the keys, but the C pickler is faster on the snapshots: the
+server pickles them by default, see ``wire.encode_from_server``.
+
+Run it with::
+
+    python -m flatland.multiplayer.bench_wire
+"""
+
+import os
+import pickle
+import timeit
+from typing import Any, Callable
+
+import pygame
+
+from flatland.consts import MAX_X, MAX_Y, TILE_SIZE
+from flatland.multiplayer import wire
+from flatland.multiplayer.inputs import InputSender
+from flatland.multiplayer.replication import LevelSnapshotStage
+from flatland.sim_clock import sim_clock
+
+MOVERS = 8  # objects moving in the delta sample
+
+
+def sample_messages(level_key: str = "level_0") -> dict[str, dict[str, Any]]:
+    """
+    A keyframe of a real level, the delta of a few simulation steps, often empty as no player
+    plays, the delta of some objects moving and losing health, and a key state
+    """
+    from flatland.world.world import world
+
+    level = world[level_key]
+    stage = LevelSnapshotStage(level_key, pickle.dumps)  # as the server streams the level
+    stage.tick(level.get_serializable_state())
+    keyframe = stage.keyframe_snapshot()
+    with sim_clock.fixed_step(step_ms=100):
+        level.step(5)
+    stage.tick(level.get_serializable_state())
+    steps_delta = pickle.loads(stage.delta())
+    movers = [obj for obj in level._observers if obj.__class__.__name__ != "Ground"][:MOVERS]
+    for i, obj in enumerate(movers):
+        obj.prev_x, obj.x = obj.x, obj.x + 1
+        if i % 2:
+            obj.health -= 1
+    stage.tick(level.get_serializable_state())
+    delta = pickle.loads(stage.delta())
+    pressed = pygame.key.ScancodeWrapper(tuple(i == 82 for i in range(512)))
+    keys = InputSender().poll(pressed, now=0.0)
+    return {
+        "keyframe": keyframe,
+        "steps_delta": steps_delta,
+        "delta": delta,
+        "keys": keys,  # type: ignore
+    }
+
+
+def _time_us(fn: Callable[[], Any], number: int) -> float:
+    """Best of 5 runs, in microseconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def bench(number: int = 200) -> list[dict[str, Any]]:
+    results = []
+    for name, message in sample_messages().items():
+        pickled, encoded = pickle.dumps(message), wire.encode(message)
+        results.append(
+            {
+                "message": name,
+                "pickle_bytes": len(pickled),
+                "wire_bytes": len(encoded),
+                "pickle_dumps_us": _time_us(lambda: pickle.dumps(message), number),
+                "wire_encode_us": _time_us(lambda: wire.encode(message), number),
+                "pickle_loads_us": _time_us(lambda: pickle.loads(pickled), number),
+                "wire_decode_us": _time_us(lambda: wire.decode(encoded), number),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    pygame.display.set_mode((MAX_X * TILE_SIZE, MAX_Y * TILE_SIZE))
+    print(
+        f"{'message':<12}{'pickle B':>10}{'wire B':>10}"
+        f"{'dumps us':>10}{'encode us':>11}{'loads us':>10}{'decode us':>11}"
+    )
+    for r in bench():
+        print(
+            f"{r['message']:<12}{r['pickle_bytes']:>10}{r['wire_bytes']:>10}"
+            f"{r['pickle_dumps_us']:>10.1f}{r['wire_encode_us']:>11.1f}"
+            f"{r['pickle_loads_us']:>10.1f}{r['wire_decode_us']:>11.1f}"
+        )
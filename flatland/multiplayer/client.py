@@ -1,85 +1,62 @@
 import copy
-import pickle
+import math
 import socket
 import struct
 import threading
 import time
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Optional
 
 import pygame
 
+from flatland.animations.animation_clock import animation_clock
 from flatland.consts import MAX_X, MAX_Y, TILE_SIZE
+from flatland.multiplayer import wire
+from flatland.multiplayer.framing import FrameReader
+from flatland.multiplayer.inputs import InputSender
+from flatland.multiplayer.interpolation import JitterBuffer, next_positions
 from flatland.objects.items_registry import registry
-from flatland.world.level import Level
+from flatland.world.level import Level, sprite_key
 
 if TYPE_CHECKING:
+    from flatland.multiplayer.replication import ObjState, Snapshot
     from flatland.objects.base_objects import GameObject
 
 
+RENDER_FPS = 60
+ANIMATION_FPS = 10  # the pace of the sprite animations, whatever the render rate
+SNAP_DISTANCE = 2  # tiles: farther moves (wrap-arounds, teleports) are not interpolated
+
+
+def now_ms() -> float:
+    return time.monotonic() * 1000
+
+
 class GameClient:
     def __init__(self, host: str, port: int) -> None:
         self.level = Level()
         self.running = True
         self.obj_map: dict[str, "GameObject"] = {}  # key = object ID or unique hash
+        self.sprite_manifest: dict[str, dict[str, Any]] = {}  # sprite key -> sprite tables
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((host, port))
+        self.frames = FrameReader.from_socket(self.sock)
         self.init_world_state()
         pygame.init()
         self.screen = pygame.display.set_mode((MAX_X * TILE_SIZE, MAX_Y * TILE_SIZE))
         self.clock = pygame.time.Clock()
-        self.old_world_state: Any = None
 
     def init_world_state(self) -> None:
         # Receive full initial world state
-        length_data = self.recv_all(self.sock, 4)
-        message_length = struct.unpack("!I", length_data)[0]
-        data = self.recv_all(self.sock, message_length)
-        payload = pickle.loads(data)
+        payload = wire.decode_from_server(self.frames.read_frame())
 
-        world_state = payload["world_state"]
         self.my_player_id = payload["player_id"]  # 👈 Save your player ID
-        self.current_level_key = payload["level_key"]
-
-        for obj_data in world_state["objects"]:
-            obj_id = obj_data["id"]
-            instance = registry.create(
-                cls_name=obj_data["cls_name"],
-                x=obj_data["x"],
-                y=obj_data["y"],
-                name=obj_data["name"],
-                health=obj_data["health"],
-                vision_range=5,
-                hearing_range=5,
-                temperature=36.3,
-                tile_name=obj_data["tile_name"],
-            )
-            for k, v in obj_data.items():
-                if k != "cls_name":
-                    setattr(instance, k, v)
-            self.level.register(instance)
-            self.obj_map[obj_id] = instance
-        # connect parents and children
-        for obj in self.level._observers:
-            if obj.parent_id:
-                self.obj_map[obj.parent_id].children.append(obj)
-                obj.parent = self.obj_map[obj.parent_id]
-
-    @staticmethod
-    def recv_all(sock, n):
-        """Helper function to receive exactly n bytes"""
-        data = bytearray()
-        while len(data) < n:
-            try:
-                packet = sock.recv(n - len(data))
-                if not packet:
-                    raise ConnectionError(
-                        f"Socket connection broken while expecting {n} bytes, got only {len(data)} bytes"
-                    )
-                data.extend(packet)
-            except Exception as e:
-                print(f"recv_all exception: {e}, received so far: {len(data)} / {n}")
-                raise
-        return data
+        self.current_level_key = payload["snapshot"]["level_key"]
+        self.last_seq: Optional[int] = None  # sequence number of the last applied snapshot
+        self.resync_requested = False
+        self.buffer = JitterBuffer()
+        self.buffer.push(payload["snapshot"], now_ms())
+        for snapshot in self.buffer.pop_due(math.inf):
+            self.apply_snapshot(snapshot)
 
     def request_portal(self, target_level_key: str, exit_name: str) -> None:
         message = {
@@ -87,32 +64,38 @@ class GameClient:
             "target_level": target_level_key,
             "exit_name": exit_name,
         }
-        payload = pickle.dumps(message)
+        payload = wire.encode(message)
+        length_prefix = struct.pack("!I", len(payload))
+        self.sock.sendall(length_prefix + payload)
+
+    def request_resync(self) -> None:
+        """Ask the server for a keyframe, e.g. when a delta does not apply to the current state"""
+        if self.resync_requested:
+            return
+        self.resync_requested = True
+        payload = wire.encode({"type": "resync"})
         length_prefix = struct.pack("!I", len(payload))
         self.sock.sendall(length_prefix + payload)
 
     def send_inputs(self) -> None:
+        """Poll the keys at 20Hz, and send them when they change or for the heartbeat"""
+        sender = InputSender()
         while self.running:
-            keys = pygame.key.get_pressed()
-            payload = pickle.dumps(keys)
-            length_prefix = struct.pack("!I", len(payload))
-            self.sock.sendall(length_prefix + payload)
-            time.sleep(1 / 20)  # 60Hz input send
+            message = sender.poll(pygame.key.get_pressed(), time.monotonic())
+            if message is not None:
+                payload = wire.encode(message)
+                length_prefix = struct.pack("!I", len(payload))
+                self.sock.sendall(length_prefix + payload)
+            time.sleep(1 / 20)
 
     def receive_world(self) -> None:
         while self.running:
             try:
-                length_data = self.recv_all(self.sock, 4)
-                message_length = struct.unpack("!I", length_data)[0]
-                data = self.recv_all(self.sock, message_length)
-                payload = pickle.loads(data)
-                world_state = payload["world_state"]
-                level_key = payload["level_key"]
-
-                # Update local state (must be thread-safe)
+                snapshot = wire.decode_from_server(self.frames.read_frame())
+
+                # Update local state (must be thread-safe): deltas must all be applied, in order
                 with self.state_lock:
-                    self.latest_world_state = world_state
-                    self.latest_level_key = level_key
+                    self.buffer.push(snapshot, now_ms())
 
             except Exception as e:
                 print(f"Receiver thread exception: {e}")
@@ -121,8 +104,7 @@ class GameClient:
     def run(self) -> None:
         self.running = True
         self.state_lock = threading.Lock()
-        self.latest_world_state = None
-        self.latest_level_key = None
+        animation_clock.fps = ANIMATION_FPS
 
         threading.Thread(target=self.send_inputs, daemon=True).start()
         threading.Thread(target=self.receive_world, daemon=True).start()
@@ -130,30 +112,23 @@ class GameClient:
         while self.running:
             pygame.event.pump()
 
+            now = now_ms()
+            animation_clock.set_time(now)
             with self.state_lock:
-                world_state = self.latest_world_state
-                level_key = self.latest_level_key
+                snapshots = self.buffer.pop_due(now)
+                alpha, upcoming = self.buffer.interpolation(now)
 
-            if world_state is not None:
-                portals, players = [], []
-                for obj in world_state["objects"]:
-                    if obj["level_key"] is not None:
-                        portals.append(obj)
-                    if obj["cls_name"] == "Player":
-                        players.append(obj)
-
-                self.render(world_state, level_key)
+            self.render(snapshots, upcoming, alpha)
 
+            player = self.obj_map.get(self.my_player_id)
+            if player is not None:
                 # portal request handling remains the same
-                for portal in portals:
-                    player = [player for player in players if player["id"] == self.my_player_id][0]
+                for portal in self.obj_map.values():
+                    if getattr(portal, "level_key", None) is None:
+                        continue
                     keys = pygame.key.get_pressed()
-                    if (
-                        keys[pygame.K_q]
-                        and player["x"] == portal["x"]
-                        and player["y"] == portal["y"]
-                    ):
-                        self.request_portal(portal["level_key"], portal["exit_name"])
+                    if keys[pygame.K_q] and player.x == portal.x and player.y == portal.y:
+                        self.request_portal(portal.level_key, portal.exit_name)  # type: ignore
                         break
 
             for event in pygame.event.get():
@@ -161,48 +136,67 @@ class GameClient:
                     self.running = False
 
             pygame.display.flip()
-            self.clock.tick(10)
+            self.clock.tick(RENDER_FPS)
 
-    def render(self, world_state: dict[str, list[dict[str, Any]]], level_key: str) -> None:
-        self.screen.fill((0, 0, 0))
+    def spawn(self, obj_data: "ObjState") -> None:
+        instance = registry.create(
+            cls_name=obj_data["cls_name"],
+            x=obj_data["x"],
+            y=obj_data["y"],
+            name=obj_data["name"],
+            health=obj_data["health"],
+            vision_range=5,
+            hearing_range=5,
+            temperature=36.3,
+            tile_name=obj_data["tile_name"],
+            speech=obj_data["speech"],
+        )
+        sprite_tables = self.sprite_manifest.get(
+            sprite_key(obj_data["cls_name"], obj_data["tile_name"])
+        )
+        for k, v in {**(sprite_tables or {}), **obj_data}.items():
+            if k != "cls_name":
+                setattr(instance, k, v)
+        self.level.register(instance)
+        self.obj_map[obj_data["id"]] = instance
+
+    def despawn(self, obj_id: str) -> None:
+        inst = self.obj_map.pop(obj_id, None)
+        if inst is not None:
+            self.level.unregister(inst)
+
+    def apply_snapshot(self, snapshot: "Snapshot") -> None:
+        """Apply a keyframe, or a delta against the last applied snapshot, to the local level"""
+        self.sprite_manifest.update(snapshot["manifest"])
+        if snapshot["type"] == "keyframe":
+            self.resync_requested = False
+            level_key = snapshot["level_key"]
+            if self.current_level_key != level_key:
+                self.level = Level(level_key)
+                self.obj_map.clear()
+                self.current_level_key = level_key
+            incoming_ids = set()
+            for obj_data in snapshot["objects"]:
+                incoming_ids.add(obj_data["id"])
+                if obj_data["id"] in self.obj_map:
+                    self.update_fields(obj_data["id"], obj_data)
+                else:
+                    self.spawn(obj_data)
+            for obj_id in set(self.obj_map) - incoming_ids:
+                self.despawn(obj_id)
+        elif snapshot["baseline"] != self.last_seq:
+            # a snapshot was missed: the delta cannot be applied
+            self.request_resync()
+            return
+        else:
+            for obj_id in snapshot["despawn"]:
+                self.despawn(obj_id)
+            for obj_data in snapshot["spawn"]:
+                self.spawn(obj_data)
+            for obj_id, changed in snapshot["update"].items():
+                self.update_fields(obj_id, changed)
+        self.last_seq = snapshot["seq"]
 
-        # Build set of current object IDs received from server
-        incoming_ids = set()
-        if self.current_level_key != level_key:
-            self.level = Level(level_key)
-            self.obj_map.clear()
-            self.current_level_key = level_key
-
-        for obj_data in world_state["objects"]:
-            obj_id = obj_data["id"]  # <-- unique ID of object
-            incoming_ids.add(obj_id)
-
-            if obj_id in self.obj_map:
-                # Object already exists → update fields
-                instance = self.obj_map[obj_id]
-
-                for k, v in obj_data.items():
-                    if k != "cls_name":
-                        setattr(instance, k, v)
-            else:
-                # New object → create it
-                instance = registry.create(
-                    cls_name=obj_data["cls_name"],
-                    x=obj_data["x"],
-                    y=obj_data["y"],
-                    name=obj_data["name"],
-                    health=obj_data["health"],
-                    vision_range=5,
-                    hearing_range=5,
-                    temperature=36.3,
-                    tile_name=obj_data["tile_name"],
-                    speech=obj_data["speech"],
-                )
-                for k, v in obj_data.items():
-                    if k != "cls_name":
-                        setattr(instance, k, v)
-                self.level.register(instance)
-                self.obj_map[obj_id] = instance
         # connect parents and children
         for obj in self.level._observers:
             obj.children.clear()
@@ -218,12 +212,53 @@ class GameClient:
                         obj.y = self.obj_map[obj.parent_id].y
                 except KeyError:
                     pass
-        # Unregister missing objects
-        existing_ids = set(self.obj_map.keys())
-        removed_ids = existing_ids - incoming_ids
-        for obj_id in removed_ids:
-            inst = self.obj_map.pop(obj_id)
-            self.level.unregister(inst)
 
-        # Render everything
+    def update_fields(self, obj_id: str, changed: "ObjState") -> None:
+        instance = self.obj_map[obj_id]
+        for k, v in changed.items():
+            if k != "cls_name":
+                setattr(instance, k, v)
+
+    def interpolated_positions(
+        self, upcoming: Optional["Snapshot"], alpha: float
+    ) -> dict["GameObject", tuple[float, float]]:
+        """The positions to draw the objects at, ``alpha`` of the way to the upcoming snapshot"""
+        positions: dict["GameObject", tuple[float, float]] = {}
+        if upcoming is None or alpha <= 0:
+            return positions
+        for obj_id, (next_x, next_y) in next_positions(upcoming).items():
+            obj = self.obj_map.get(obj_id)
+            if obj is None:
+                continue
+            next_x = obj.x if next_x is None else next_x
+            next_y = obj.y if next_y is None else next_y
+            if abs(next_x - obj.x) > SNAP_DISTANCE or abs(next_y - obj.y) > SNAP_DISTANCE:
+                continue
+            positions[obj] = (obj.x + alpha * (next_x - obj.x), obj.y + alpha * (next_y - obj.y))
+        return positions
+
+    def render(
+        self, snapshots: list["Snapshot"], upcoming: Optional["Snapshot"] = None, alpha: float = 0.0
+    ) -> None:
+        """
+        Apply the snapshots that are due, in order, then render the level with the objects
+        interpolated towards the upcoming snapshot.
+        """
+        for snapshot in snapshots:
+            self.apply_snapshot(snapshot)
+
+        # the objects are drawn at their interpolated position, without their own movement blending
+        saved: dict["GameObject", tuple[int, int, int, int]] = {}
+        for obj in self.level._observers:
+            saved[obj] = (obj.x, obj.y, obj.prev_x, obj.prev_y)
+            obj.prev_x, obj.prev_y = obj.x, obj.y
+        for obj, (x, y) in self.interpolated_positions(upcoming, alpha).items():
+            # between two tiles for this frame only: the tile positions are restored after it
+            obj.x = obj.prev_x = x  # type: ignore[assignment]
+            obj.y = obj.prev_y = y  # type: ignore[assignment]
+
+        self.screen.fill((0, 0, 0))
         self.level.render(self.screen)
+
+        for obj, (x, y, prev_x, prev_y) in saved.items():
+            obj.x, obj.y, obj.prev_x, obj.prev_y = x, y, prev_x, prev_y
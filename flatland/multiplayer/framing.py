@@ -0,0 +1,138 @@
+"""
+Zero-copy reception of the length prefixed frames.
+
+A ``FrameReader`` receives into a single buffer, reused for the whole connection: each
+``recv_into`` fills as much of its free space as the socket has data, hence a single call may
+bring several frames, or only part of one. The frames are returned as ``memoryview`` slices of
+the buffer, which ``wire.decode`` reads in place: no bytes are copied nor allocated per message.
+
+The buffer only grows for a frame larger than it, and the unread bytes are moved back to its start
+when a frame would not fit after them.
+
+The asyncio streams have no ``recv_into``: a ``StreamFrameReader`` copies the chunks they read into
+the free space of the same buffer, which frames them the same way.
+"""
+
+import asyncio
+import socket
+import struct
+from typing import Callable, Optional
+
+from flatland.multiplayer.wire import WireError
+
+BUFFER_SIZE = 64 * 1024
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # a larger length prefix is a corrupted or hostile stream
+
+_LENGTH = struct.Struct("!I")
+
+
+class FrameBuffer:
+    """The buffer of the received bytes, and the frames buffered in it"""
+
+    def __init__(
+        self, buffer_size: int = BUFFER_SIZE, max_frame_size: int = MAX_FRAME_SIZE
+    ) -> None:
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # first unread byte
+        self.end = 0  # end of the received bytes
+
+    def buffered_frame(self) -> Optional[memoryview]:
+        """
+        The payload of the next frame, if fully received, else None, once there is room for it
+        after the unread bytes. It is only valid until the next call.
+        """
+        unread = self.end - self.start
+        if unread < _LENGTH.size:
+            self.reserve(_LENGTH.size)
+            return None
+        (length,) = _LENGTH.unpack_from(self.buffer, self.start)
+        if length > self.max_frame_size:
+            raise WireError(f"Frame of {length} bytes exceeds the limit of {self.max_frame_size}")
+        if unread < _LENGTH.size + length:
+            self.reserve(_LENGTH.size + length)
+            return None
+        start = self.start + _LENGTH.size
+        self.start = start + length
+        return self.view[start : self.start]
+
+    def reserve(self, n: int) -> None:
+        """Make room for ``n`` unread bytes in the buffer"""
+        unread = self.end - self.start
+        if not unread:
+            self.start = self.end = 0
+        if self.start + n > len(self.buffer):
+            if n > len(self.buffer):
+                # a new buffer: the frames returned before may still be referenced
+                buffer = bytearray(max(n, 2 * len(self.buffer)))
+                buffer[:unread] = self.view[self.start : self.end]
+                self.buffer, self.view = buffer, memoryview(buffer)
+            else:
+                self.view[:unread] = self.view[self.start : self.end]
+            self.start, self.end = 0, unread
+
+
+class FrameReader(FrameBuffer):
+    def __init__(
+        self,
+        recv_into: Callable[[memoryview], int],
+        buffer_size: int = BUFFER_SIZE,
+        max_frame_size: int = MAX_FRAME_SIZE,
+    ) -> None:
+        super().__init__(buffer_size, max_frame_size)
+        self.recv_into = recv_into
+
+    @classmethod
+    def from_socket(cls, sock: socket.socket, **kwargs: int) -> "FrameReader":
+        return cls(sock.recv_into, **kwargs)
+
+    def read_frame(self) -> memoryview:
+        """The payload of the next frame. It is only valid until the next call."""
+        self.fill(_LENGTH.size)
+        (length,) = _LENGTH.unpack_from(self.buffer, self.start)
+        if length > self.max_frame_size:
+            raise WireError(f"Frame of {length} bytes exceeds the limit of {self.max_frame_size}")
+        self.fill(_LENGTH.size + length)
+        start = self.start + _LENGTH.size
+        self.start = start + length
+        return self.view[start : self.start]
+
+    def fill(self, n: int) -> None:
+        """Receive until at least ``n`` unread bytes are buffered"""
+        if self.end - self.start >= n:
+            return
+        self.reserve(n)
+        while self.end - self.start < n:
+            received = self.recv_into(self.view[self.end :])
+            if not received:
+                raise ConnectionError(
+                    f"Connection closed while expecting {n} bytes, got {self.end - self.start}"
+                )
+            self.end += received
+
+
+class StreamFrameReader(FrameBuffer):
+    """The frames of an asyncio stream, see ``async_server``"""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        buffer_size: int = BUFFER_SIZE,
+        max_frame_size: int = MAX_FRAME_SIZE,
+    ) -> None:
+        super().__init__(buffer_size, max_frame_size)
+        self.reader = reader
+
+    async def read_frame(self) -> memoryview:
+        """The payload of the next frame. It is only valid until the next call."""
+        while (frame := self.buffered_frame()) is None:
+            # at most the free space, reserved for the frame by ``buffered_frame``
+            chunk = await self.reader.read(len(self.buffer) - self.end)
+            if not chunk:
+                raise ConnectionError(
+                    f"Connection closed with {self.end - self.start} bytes of a frame"
+                )
+            self.view[self.end : self.end + len(chunk)] = chunk
+            self.end += len(chunk)
+        return frame
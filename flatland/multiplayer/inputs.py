@@ -0,0 +1,93 @@
+"""
+Compact input uplink.
+
+The client does not send the whole keyboard state, but the bitmask of the keys the game reacts to,
+with a sequence number. It is sent when it changes, and at a low rate as a heartbeat otherwise.
+The server holds the last input of each player, ignoring the inputs older than it, and feeds it
+to the player at every tick.
+"""
+
+import math
+from typing import Any, Iterator, Optional
+
+import pygame
+
+# the keys the game reacts to, see ``VolitionEngine.prepare``
+GAME_KEYS = (
+    pygame.K_UP,
+    pygame.K_DOWN,
+    pygame.K_LEFT,
+    pygame.K_RIGHT,
+    pygame.K_e,
+    pygame.K_q,
+    pygame.K_SPACE,
+    pygame.K_a,
+    pygame.K_s,
+    pygame.K_d,
+    pygame.K_f,
+    pygame.K_0,
+    pygame.K_1,
+    pygame.K_2,
+    pygame.K_3,
+    pygame.K_4,
+    pygame.K_5,
+    pygame.K_6,
+    pygame.K_7,
+    pygame.K_8,
+    pygame.K_9,
+)
+KEY_BITS = {key: 1 << i for i, key in enumerate(GAME_KEYS)}
+HEARTBEAT_S = 1.0
+
+
+def key_mask(pressed: Any) -> int:
+    """The bitmask of the game keys pressed, from ``pygame.key.get_pressed()``"""
+    mask = 0
+    for key, bit in KEY_BITS.items():
+        if pressed[key]:
+            mask |= bit
+    return mask
+
+
+class KeyMask:
+    """A key bitmask, indexed by key like ``pygame.key.get_pressed()``"""
+
+    __slots__ = ("mask",)
+
+    def __init__(self, mask: int = 0) -> None:
+        self.mask = mask
+
+    def __getitem__(self, key: int) -> bool:
+        return bool(self.mask & KEY_BITS.get(key, 0))
+
+    def __iter__(self) -> Iterator[bool]:
+        return (bool(self.mask & bit) for bit in KEY_BITS.values())
+
+    def __len__(self) -> int:
+        return len(GAME_KEYS)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, KeyMask) and other.mask == self.mask
+
+    def __repr__(self) -> str:
+        return f"KeyMask({self.mask:#x})"
+
+
+class InputSender:
+    """Client side: decides when to send the key state"""
+
+    def __init__(self, heartbeat_s: float = HEARTBEAT_S) -> None:
+        self.heartbeat_s = heartbeat_s
+        self.seq = -1
+        self.mask: Optional[int] = None
+        self.last_sent = -math.inf
+
+    def poll(self, pressed: Any, now: float) -> Optional[dict[str, Any]]:
+        """The input message to send, if the keys changed or the heartbeat is due"""
+        mask = key_mask(pressed)
+        if mask == self.mask and now - self.last_sent < self.heartbeat_s:
+            return None
+        self.seq += 1
+        self.mask = mask
+        self.last_sent = now
+        return {"type": "keys", "seq": self.seq, "mask": mask}
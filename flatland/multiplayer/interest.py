@@ -0,0 +1,54 @@
+"""
+Server side interest management.
+
+A client is only sent the objects in its area of interest: a view rectangle centred on its player,
+or a circle, plus the children of the visible objects (e.g. what the player carries). The objects
+entering the area are spawned on the client and the objects leaving it are despawned.
+"""
+
+from typing import TYPE_CHECKING, Optional
+
+from flatland.consts import MAX_X, MAX_Y
+from flatland.multiplayer.replication import ObjIds
+
+if TYPE_CHECKING:
+    from flatland.objects.base_objects import GameObject
+    from flatland.world.level import Level
+
+
+class InterestArea:
+    """
+    A view rectangle of ``width x height`` tiles, the screen by default, or a circle of ``radius``
+    tiles when given.
+    """
+
+    def __init__(
+        self, width: float = MAX_X, height: float = MAX_Y, radius: Optional[float] = None
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.radius = radius
+
+    def covers(self, level: "Level") -> bool:
+        index = level.spatial_index
+        if self.radius is not None:
+            return self.radius >= index.periodic_distance(0, 0, index.width / 2, index.height / 2)
+        return self.width >= index.width and self.height >= index.height
+
+    def visible(self, level: "Level", center: "GameObject") -> ObjIds:
+        """The ids of the objects the client sees, or None when it sees the whole level"""
+        if self.covers(level):
+            return None
+        if self.radius is not None:
+            objs = level.spatial_index.query(center.x, center.y, self.radius)
+        else:
+            objs = level.spatial_index.query_rect(
+                center.x, center.y, self.width / 2, self.height / 2
+            )
+        visible: dict[str, None] = {}
+        while objs:
+            obj = objs.pop()
+            if obj.id not in visible:
+                visible[obj.id] = None
+                objs.extend(obj.children)
+        return visible
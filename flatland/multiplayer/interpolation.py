@@ -0,0 +1,80 @@
+"""
+Client side snapshot buffering.
+
+The snapshots do not arrive at a regular pace: the network adds jitter, and a late snapshot would
+make the objects stall then jump. The client therefore renders the world slightly in the past: the
+snapshots are buffered and applied when the render time, ``delay_ms`` behind the estimated server
+time, reaches them. Between two snapshots, the positions are interpolated at display rate.
+"""
+
+from collections import deque
+from typing import Optional
+
+from flatland.multiplayer.replication import Snapshot
+
+DELAY_MS = 150.0  # how far in the past the client renders, about 1.5 server ticks of jitter
+MAX_BUFFERED = 64  # beyond that the client is too late, the oldest snapshots are applied at once
+
+
+def next_positions(snapshot: Snapshot) -> dict[str, tuple[Optional[float], Optional[float]]]:
+    """The positions of the objects that the snapshot moves, by object id, None when unchanged"""
+    if snapshot["type"] == "keyframe":
+        return {obj["id"]: (obj["x"], obj["y"]) for obj in snapshot["objects"]}
+    positions: dict[str, tuple[Optional[float], Optional[float]]]
+    positions = {obj["id"]: (obj["x"], obj["y"]) for obj in snapshot["spawn"]}
+    for obj_id, changed in snapshot["update"].items():
+        if "x" in changed or "y" in changed:
+            positions[obj_id] = (changed.get("x"), changed.get("y"))
+    return positions
+
+
+class JitterBuffer:
+    """
+    Holds the received snapshots until their time comes. The offset between the server clock and
+    the local clock is estimated with an exponential moving average over the received snapshots.
+    """
+
+    def __init__(self, delay_ms: float = DELAY_MS, smoothing: float = 0.05) -> None:
+        self.delay_ms = delay_ms
+        self.smoothing = smoothing
+        self.offset_ms: Optional[float] = None  # server time - local time
+        self.snapshots: deque[Snapshot] = deque()
+        self.last_time_ms: Optional[float] = None  # server time of the last popped snapshot
+
+    def push(self, snapshot: Snapshot, now_ms: float) -> None:
+        sample = snapshot["time_ms"] - now_ms
+        if self.offset_ms is None:
+            self.offset_ms = sample
+        else:
+            self.offset_ms += self.smoothing * (sample - self.offset_ms)
+        self.snapshots.append(snapshot)
+
+    def render_time(self, now_ms: float) -> float:
+        """The server time to render at"""
+        return now_ms + (self.offset_ms or 0.0) - self.delay_ms
+
+    def pop_due(self, now_ms: float) -> list[Snapshot]:
+        """The snapshots to apply before rendering, in order"""
+        render_time = self.render_time(now_ms)
+        due = []
+        while self.snapshots and (
+            self.snapshots[0]["time_ms"] <= render_time or len(self.snapshots) > MAX_BUFFERED
+        ):
+            due.append(self.snapshots.popleft())
+        if due:
+            self.last_time_ms = due[-1]["time_ms"]
+        return due
+
+    def interpolation(self, now_ms: float) -> tuple[float, Optional[Snapshot]]:
+        """
+        How far the render time is between the last popped snapshot and the next one, in [0, 1],
+        and the next one. The next snapshot is None when there is nothing to interpolate towards.
+        """
+        if not self.snapshots or self.last_time_ms is None:
+            return 0.0, None
+        upcoming = self.snapshots[0]
+        span = upcoming["time_ms"] - self.last_time_ms
+        if span <= 0:
+            return 0.0, None
+        alpha = (self.render_time(now_ms) - self.last_time_ms) / span
+        return min(max(alpha, 0.0), 1.0), upcoming
@@ -0,0 +1,423 @@
+"""
+Load test of the server with headless bot clients.
+
+Run it with::
+
+    python -m flatland.multiplayer.load_test --bots 50 --duration 30 --report load_test.json
+
+By default, a local ``AsyncGameServer`` is started in a process of its own, and its tick
+durations are part of the report; ``--host`` and ``--port`` target a running server instead.
+The bots speak the real protocol but render nothing. They are asyncio tasks, spread over
+``--processes`` processes, so that decoding the snapshots does not make the bots the bottleneck.
+Each bot sends its key state like ``GameClient``, following a script or at random, and measures:
+
+- the rate of the snapshots it receives, and the ticks it missed (snapshots superseded by later
+  ones),
+- the bandwidth, both ways, length prefixes included,
+- the latency from sending a direction to receiving the first snapshot where its player faces it.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from typing import Any, Callable, Iterator, Optional
+
+import pygame
+
+from flatland.consts import Direction
+from flatland.multiplayer import wire
+from flatland.multiplayer.async_server import AsyncGameServer
+from flatland.multiplayer.framing import StreamFrameReader
+from flatland.multiplayer.inputs import KEY_BITS, InputSender, KeyMask
+from flatland.multiplayer.interest import InterestArea
+from flatland.multiplayer.sharding import CONNECT_ATTEMPTS, CONNECT_RETRY_S, prefixed
+from flatland.multiplayer.tick_scheduler import TICK_RATE_HZ
+
+INPUT_PERIOD_S = 1 / 20  # the keys are polled at the rate of ``GameClient.send_inputs``
+SERVER_EXIT_S = 10.0
+
+# in the order ``VolitionEngine.prepare`` gives them precedence
+DIRECTION_KEYS = {
+    Direction.UP: pygame.K_UP,
+    Direction.DOWN: pygame.K_DOWN,
+    Direction.LEFT: pygame.K_LEFT,
+    Direction.RIGHT: pygame.K_RIGHT,
+}
+KEY_NAMES = {
+    "up": pygame.K_UP,
+    "down": pygame.K_DOWN,
+    "left": pygame.K_LEFT,
+    "right": pygame.K_RIGHT,
+    "push": pygame.K_e,
+    "grab": pygame.K_q,
+    "slash": pygame.K_SPACE,
+}
+
+Inputs = Iterator[tuple[int, float]]  # key bitmasks, with the seconds they are held for
+
+
+def random_inputs(rng: random.Random, min_hold_s: float = 0.2, max_hold_s: float = 1.0) -> Inputs:
+    """Random directions, never the same twice in a row, each held for a random time"""
+    direction = None
+    while True:
+        direction = rng.choice([d for d in DIRECTION_KEYS if d != direction])
+        yield KEY_BITS[DIRECTION_KEYS[direction]], rng.uniform(min_hold_s, max_hold_s)
+
+
+def parse_script(script: str) -> list[tuple[int, float]]:
+    """Steps like ``right:1,right+slash:0.5,idle:2``: the keys pressed, and for how many seconds"""
+    steps = []
+    for step in script.split(","):
+        keys, _, hold_s = step.strip().partition(":")
+        mask = 0
+        for name in keys.split("+"):
+            if name == "idle":
+                continue
+            if name not in KEY_NAMES:
+                raise ValueError(f"Unknown key {name!r}, expected one of {', '.join(KEY_NAMES)}")
+            mask |= KEY_BITS[KEY_NAMES[name]]
+        steps.append((mask, float(hold_s or 1.0)))
+    return steps
+
+
+def expected_direction(mask: int) -> Optional[Direction]:
+    """The direction the player turns to with these keys, if any"""
+    for direction, key in DIRECTION_KEYS.items():
+        if mask & KEY_BITS[key]:
+            return direction
+    return None
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Bot:
+    """A headless client, measuring what it sends and receives"""
+
+    def __init__(
+        self, bot_id: int, inputs: Inputs, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.bot_id = bot_id
+        self.inputs = inputs
+        self.clock = clock
+        self.player_id: Optional[str] = None
+        self.direction: Optional[Direction] = None  # of the player, in the last snapshot
+        self.pending: Optional[tuple[Direction, float]] = None  # direction sent, and when
+        self.snapshots = 0
+        self.keyframes = 0
+        self.missed_ticks = 0
+        self.last_tick: Optional[int] = None
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.latencies_ms: list[float] = []
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def player_state(self, snapshot: dict[str, Any]) -> Optional[dict[str, Any]]:
+        if snapshot["type"] == "keyframe":
+            objects = snapshot["objects"]
+        else:
+            if self.player_id in snapshot["update"]:
+                return snapshot["update"][self.player_id]
+            objects = snapshot["spawn"]
+        return next((state for state in objects if state["id"] == self.player_id), None)
+
+    def on_message(self, data: wire.Buffer, now: float) -> None:
+        self.bytes_received += 4 + len(data)
+        snapshot = wire.decode_from_server(data)
+        if snapshot["type"] == "join":
+            self.player_id = snapshot["player_id"]
+            snapshot = snapshot["snapshot"]
+        self.snapshots += 1
+        self.keyframes += snapshot["type"] == "keyframe"
+        if self.last_tick is not None:
+            self.missed_ticks += max(0, snapshot["tick"] - self.last_tick - 1)
+        self.last_tick = snapshot["tick"]
+        state = self.player_state(snapshot)
+        if state is None or "direction" not in state:
+            return
+        self.direction = state["direction"]
+        if self.pending is not None and self.pending[0] == self.direction:
+            self.latencies_ms.append(1000 * (now - self.pending[1]))
+            self.pending = None
+
+    def press(self, mask: int) -> None:
+        """Start waiting for the echo of the keys, if they turn the player"""
+        direction = expected_direction(mask)
+        if direction is not None and direction != self.direction:
+            self.pending = (direction, self.clock())
+
+    async def send_inputs(self, writer: asyncio.StreamWriter) -> None:
+        sender = InputSender()
+        for mask, hold_s in self.inputs:
+            self.press(mask)
+            end = self.clock() + hold_s
+            while True:
+                message = sender.poll(KeyMask(mask), self.clock())
+                if message is not None:
+                    data = prefixed(wire.encode(message))
+                    writer.write(data)
+                    self.bytes_sent += len(data)
+                    await writer.drain()
+                remaining = end - self.clock()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(INPUT_PERIOD_S, remaining))
+
+    async def receive(self, reader: asyncio.StreamReader) -> None:
+        frames = StreamFrameReader(reader)
+        while True:
+            data = await frames.read_frame()
+            self.on_message(data, self.clock())
+
+    async def run(self, host: str, port: int, duration_s: float) -> None:
+        try:
+            reader, writer = await connect(host, port)
+        except ConnectionError as e:
+            self.error = repr(e)
+            return
+        self.started = self.clock()
+        sender = asyncio.create_task(self.send_inputs(writer))
+        try:
+            await asyncio.wait_for(self.receive(reader), duration_s)
+        except asyncio.TimeoutError:  # not the builtin one before python 3.11
+            pass  # the end of the test
+        except (ConnectionError, asyncio.IncompleteReadError, wire.WireError) as e:
+            self.error = repr(e)
+        finally:
+            self.ended = self.clock()
+            sender.cancel()
+            writer.close()
+
+    def report(self) -> dict[str, Any]:
+        if self.started is None or self.ended is None:
+            elapsed = 0.0
+        else:
+            elapsed = self.ended - self.started
+        per_s = 1 / elapsed if elapsed else 0.0
+        return {
+            "bot": self.bot_id,
+            "error": self.error,
+            "duration_s": elapsed,
+            "snapshots": self.snapshots,
+            "keyframes": self.keyframes,
+            "missed_ticks": self.missed_ticks,
+            "snapshot_rate_hz": self.snapshots * per_s,
+            "down_kbps": 8 * self.bytes_received * per_s / 1000,
+            "up_kbps": 8 * self.bytes_sent * per_s / 1000,
+            "latency_median_ms": percentile(self.latencies_ms, 0.5),
+            "latency_p95_ms": percentile(self.latencies_ms, 0.95),
+            "latencies_ms": self.latencies_ms,
+        }
+
+
+async def connect(host: str, port: int) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Connect to the server, which may still be loading its levels"""
+    for _ in range(CONNECT_ATTEMPTS):
+        try:
+            return await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(CONNECT_RETRY_S)
+    raise ConnectionError(f"The server {host}:{port} is not reachable")
+
+
+async def run_bots_async(
+    bots: list[Bot], host: str, port: int, duration_s: float, ramp_s: float = 0.0
+) -> list[dict[str, Any]]:
+    """Run the bots for ``duration_s`` each, their connections spread over ``ramp_s``"""
+
+    async def run(i: int, bot: Bot) -> None:
+        await asyncio.sleep(ramp_s * i / len(bots))
+        await bot.run(host, port, duration_s)
+
+    await asyncio.gather(*(run(i, bot) for i, bot in enumerate(bots)))
+    return [bot.report() for bot in bots]
+
+
+def run_bots(
+    bot_ids: list[int],
+    host: str,
+    port: int,
+    duration_s: float,
+    ramp_s: float,
+    script: Optional[str],
+    seed: int,
+) -> list[dict[str, Any]]:
+    """Entry point of a bot process"""
+    bots = [
+        Bot(
+            bot_id,
+            (
+                itertools.cycle(parse_script(script))
+                if script
+                else random_inputs(random.Random(seed + bot_id))
+            ),
+        )
+        for bot_id in bot_ids
+    ]
+    return asyncio.run(run_bots_async(bots, host, port, duration_s, ramp_s))
+
+
+def run_local_server(
+    port: int,
+    tick_rate_hz: float,
+    workers: int,
+    interest_radius: Optional[float],
+    conn: Any,
+) -> None:
+    """Entry point of the server process: serves until asked for its statistics"""
+    from flatland.world.world import world
+
+    server = AsyncGameServer(
+        world, InterestArea(radius=interest_radius), workers=workers, tick_rate_hz=tick_rate_hz
+    )
+
+    async def serve() -> None:
+        serving = asyncio.create_task(server.serve("127.0.0.1", port))
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        durations = list(server.tick_scheduler.durations)
+        p95 = percentile(durations, 0.95)
+        conn.send(
+            {
+                **server.tick_scheduler.stats(),
+                "p95_ms": 1000 * p95 if p95 is not None else 0.0,
+                "dropped_snapshots": server.dropped_snapshots,
+            }
+        )
+        serving.cancel()
+
+    asyncio.run(serve())
+
+
+def summarize(bots: list[dict[str, Any]]) -> dict[str, Any]:
+    """The totals and distributions over the bots that connected"""
+    connected = [bot for bot in bots if bot["duration_s"]]
+    latencies = [latency for bot in connected for latency in bot["latencies_ms"]]
+    rates = [bot["snapshot_rate_hz"] for bot in connected]
+    return {
+        "bots": len(bots),
+        "connected": len(connected),
+        "errors": sum(bot["error"] is not None for bot in bots),
+        "snapshot_rate_hz_mean": sum(rates) / len(rates) if rates else 0.0,
+        "snapshot_rate_hz_min": min(rates, default=0.0),
+        "missed_ticks": sum(bot["missed_ticks"] for bot in connected),
+        "down_kbps_total": sum(bot["down_kbps"] for bot in connected),
+        "up_kbps_total": sum(bot["up_kbps"] for bot in connected),
+        "latency_samples": len(latencies),
+        "latency_median_ms": percentile(latencies, 0.5),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "latency_max_ms": max(latencies, default=None),
+    }
+
+
+def load_test(args: argparse.Namespace) -> dict[str, Any]:
+    context = multiprocessing.get_context("spawn")  # the children do not inherit pygame
+    server_conn = server = None
+    if args.host is None:
+        server_conn, child_conn = context.Pipe()
+        server = context.Process(
+            target=run_local_server,
+            args=(args.port, args.tick_rate, args.workers, args.interest_radius, child_conn),
+            name="flatland-load-test-server",
+            daemon=True,
+        )
+        server.start()
+    host = args.host or "127.0.0.1"
+    processes = max(1, min(args.processes, args.bots))
+    groups = [list(range(args.bots))[i::processes] for i in range(processes)]
+    try:
+        with context.Pool(processes) as pool:
+            results = pool.starmap(
+                run_bots,
+                [
+                    (group, host, args.port, args.duration, args.ramp, args.script, args.seed)
+                    for group in groups
+                ],
+            )
+        server_stats = None
+        if server_conn is not None:
+            server_conn.send("stop")
+            server_stats = server_conn.recv()
+    finally:
+        if server is not None:
+            server.join(SERVER_EXIT_S)  # e.g. writing its trace, see ``tracer``
+            server.terminate()
+    bots = sorted((bot for group in results for bot in group), key=lambda bot: bot["bot"])
+    return {
+        "config": vars(args),
+        "summary": summarize(bots),
+        "server": server_stats,
+        "bots": bots,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a Flatland server with bot clients")
+    parser.add_argument("--bots", type=int, default=10, help="Number of bot clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds each bot plays")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Seconds to connect all the bots")
+    parser.add_argument(
+        "--processes", type=int, default=os.cpu_count() or 1, help="Processes running the bots"
+    )
+    parser.add_argument(
+        "--script",
+        type=str,
+        default=None,
+        help="Inputs replayed by every bot, e.g. 'right:1,up+slash:0.5,idle:2' (default: random)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random inputs")
+    parser.add_argument(
+        "--host", type=str, default=None, help="Server to test (default: start a local one)"
+    )
+    parser.add_argument("--port", type=int, default=12345, help="Server port")
+    parser.add_argument(
+        "--tick-rate", type=float, default=TICK_RATE_HZ, help="World updates per second"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Threads updating the levels of the local server"
+    )
+    parser.add_argument(
+        "--interest-radius", type=float, default=None, help="Interest radius of the local server"
+    )
+    parser.add_argument("--report", type=str, default="load_test.json", help="Report file")
+    args = parser.parse_args()
+    if args.script:
+        parse_script(args.script)  # fail early on a bad script
+
+    os.environ.setdefault("FLATLAND_HEADLESS", "true")  # inherited by the server and the bots
+    report = load_test(args)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    summary, server_stats = report["summary"], report["server"]
+    print(f"{summary['connected']}/{summary['bots']} bots connected, {summary['errors']} errors")
+    print(
+        f"snapshots: {summary['snapshot_rate_hz_mean']:.1f} Hz mean, "
+        f"{summary['snapshot_rate_hz_min']:.1f} Hz min, {summary['missed_ticks']} missed ticks"
+    )
+    print(
+        f"bandwidth: {summary['down_kbps_total']:.0f} kbps down, "
+        f"{summary['up_kbps_total']:.0f} kbps up"
+    )
+    if summary["latency_samples"]:
+        print(
+            f"input latency: {summary['latency_median_ms']:.0f} ms median, "
+            f"{summary['latency_p95_ms']:.0f} ms p95, {summary['latency_max_ms']:.0f} ms max"
+        )
+    if server_stats is not None:
+        print(
+            f"server ticks: {server_stats['median_ms']:.1f} ms median, "
+            f"{server_stats['p95_ms']:.1f} ms p95, {server_stats['max_ms']:.1f} ms max, "
+            f"{server_stats['overruns']} overruns, {server_stats['skipped_ticks']} skipped"
+        )
+    print(f"report written to {args.report}")
@@ -0,0 +1,202 @@
+"""
+Delta-encoded state replication.
+
+Instead of sending the full level state at every tick, the server only sends what changed since
+the last tick (the baseline of the delta):
+
+- ``spawn``: the full state of the objects that appeared,
+- ``despawn``: the ids of the objects that disappeared,
+- ``update``: for each object that changed, only the changed fields.
+
+A keyframe with the full state is sent when the client joins or changes level, every
+``KEYFRAME_INTERVAL`` ticks of the level to resync, and whenever the client asks for it (e.g.
+because it missed a snapshot).
+Every snapshot carries its sequence number and the sequence number of its baseline, hence the
+client can check that the delta applies to the state it holds. They also carry the tick of the
+server and its time, which the client uses to interpolate between the snapshots.
+
+The server does not encode the snapshots per client: all the clients in a level share the same
+stream of snapshots, produced once per tick by the ``LevelSnapshotStage`` of the level, whatever
+the number of clients. A client joining the level, asking for a resync or missing a delta
+receives the keyframe of the current tick instead of its delta, then follows the deltas of the
+level. The periodic keyframes are part of that stream, hence serialized once too. Only the clients
+that see part of the level (see ``interest``) get snapshots filtered and encoded for them.
+
+The sprite tables are not part of the object states: the snapshots carry the entries of the
+sprite manifest of the level needed by the objects they spawn, one per class. The static objects,
+like the ground, are only read once by the level: they are in the keyframes and spawns only.
+"""
+
+from typing import Any, Callable, Optional
+
+from flatland.world.level import sprite_key
+
+KEYFRAME_INTERVAL = 50  # ticks of a level between two keyframes
+
+Snapshot = dict[str, Any]
+ObjState = dict[str, Any]
+ObjIds = Optional[dict[str, None]]  # ordered set of object ids, None for all the objects
+
+
+class LevelSnapshotStage:
+    """
+    Server side: one stage per level. At each tick, the state of the level is read, diffed and
+    serialized once; the resulting buffers are immutable and sent as is to every client.
+    """
+
+    def __init__(
+        self,
+        level_key: str,
+        serialize: Callable[[Snapshot], bytes],
+        keyframe_interval: int = KEYFRAME_INTERVAL,
+    ) -> None:
+        self.level_key = level_key
+        self.serialize = serialize
+        self.keyframe_interval = keyframe_interval
+        self.baseline: dict[str, ObjState] = {}
+        self.previous: dict[str, ObjState] = {}  # the baseline of the previous tick
+        self.update: dict[str, ObjState] = {}  # the changed fields of the last tick
+        self.objects: list[ObjState] = []
+        self.manifest: dict[str, Any] = {}
+        self.seq = -1
+        self.server_tick = 0  # the tick of the server and its time, for the client interpolation
+        self.time_ms = 0.0
+        self._delta = b""
+        self._keyframe: Optional[bytes] = None  # serialized on demand, at most once per tick
+
+    def tick(self, world_state: dict[str, Any], tick: int = 0, time_ms: float = 0.0) -> None:
+        self.seq += 1
+        self.server_tick = tick
+        self.time_ms = time_ms
+        self.previous = self.baseline
+        delta, self.baseline = diff(self.baseline, world_state["objects"])
+        self.update = delta["update"]
+        self.objects = world_state["objects"]
+        self.manifest = world_state["manifest"]
+        self._delta = self.serialize(
+            {
+                "type": "delta",
+                "seq": self.seq,
+                "baseline": self.seq - 1 if self.seq else None,
+                "tick": self.server_tick,
+                "time_ms": self.time_ms,
+                "level_key": self.level_key,
+                **delta,
+                "manifest": manifest_for(self.manifest, delta["spawn"]),
+            }
+        )
+        self._keyframe = None
+
+    def delta(self) -> bytes:
+        """The changes of the last tick, for the clients holding the previous snapshot"""
+        return self._delta
+
+    def is_resync(self) -> bool:
+        """Whether all the clients get the keyframe of the last tick, to resync periodically"""
+        return self.seq % self.keyframe_interval == 0
+
+    def delta_for(self, known: ObjIds, visible: ObjIds) -> bytes:
+        """
+        The changes of the last tick seen by a client that held the ``known`` objects at the
+        previous tick and now sees the ``visible`` ones: the objects entering its view are
+        spawned, the objects leaving it are despawned.
+        """
+        if known is None and visible is None:
+            return self._delta
+        known_ids = self.previous if known is None else known
+        visible_ids = self.baseline if visible is None else visible
+        spawn = [self.baseline[i] for i in visible_ids if i not in known_ids]
+        return self.serialize(
+            {
+                "type": "delta",
+                "seq": self.seq,
+                "baseline": self.seq - 1 if self.seq else None,
+                "tick": self.server_tick,
+                "time_ms": self.time_ms,
+                "level_key": self.level_key,
+                "spawn": spawn,
+                "despawn": [i for i in known_ids if i not in visible_ids],
+                "update": {
+                    i: changed
+                    for i, changed in self.update.items()
+                    if i in visible_ids and i in known_ids
+                },
+                "manifest": manifest_for(self.manifest, spawn),
+            }
+        )
+
+    def keyframe_snapshot(self, visible: ObjIds = None) -> Snapshot:
+        objects = self.objects if visible is None else [self.baseline[i] for i in visible]
+        return {
+            "type": "keyframe",
+            "seq": self.seq,
+            "baseline": None,
+            "tick": self.server_tick,
+            "time_ms": self.time_ms,
+            "level_key": self.level_key,
+            "objects": objects,
+            "manifest": manifest_for(self.manifest, objects),
+        }
+
+    def keyframe_for(self, visible: ObjIds) -> bytes:
+        if visible is None:
+            return self.keyframe()
+        return self.serialize(self.keyframe_snapshot(visible))
+
+    def visible(self, ids: ObjIds) -> ObjIds:
+        """Restrict ids to the objects of the last tick"""
+        if ids is None:
+            return None
+        return {i: None for i in ids if i in self.baseline}
+
+    def keyframe(self) -> bytes:
+        """The full state at the last tick, for the clients joining the level or resyncing"""
+        if self._keyframe is None:
+            self._keyframe = self.serialize(self.keyframe_snapshot())
+        return self._keyframe
+
+
+def diff(
+    baseline: dict[str, ObjState], objects: list[ObjState]
+) -> tuple[dict[str, Any], dict[str, ObjState]]:
+    """The spawn, despawn and update fields of the delta from baseline, and the new baseline"""
+    spawn, update = [], {}
+    current: dict[str, ObjState] = {}
+    for obj_state in objects:
+        obj_id = obj_state["id"]
+        current[obj_id] = obj_state
+        old = baseline.get(obj_id)
+        if old is None:
+            spawn.append(obj_state)
+            continue
+        if old is obj_state:  # the state of a static object
+            continue
+        # the sprite locations are shared and never mutated: compare them by identity first
+        changed = {k: v for k, v in obj_state.items() if old.get(k) is not v and old.get(k) != v}
+        if changed:
+            update[obj_id] = changed
+    despawn = [obj_id for obj_id in baseline if obj_id not in current]
+    return {"spawn": spawn, "despawn": despawn, "update": update}, current
+
+
+def manifest_for(manifest: dict[str, Any], obj_states: list[ObjState]) -> dict[str, Any]:
+    """The entries of the sprite manifest used by the objects"""
+    keys = dict.fromkeys(sprite_key(s["cls_name"], s["tile_name"]) for s in obj_states)
+    return {key: manifest[key] for key in keys if key in manifest}
+
+
+def apply_snapshot(state: dict[str, ObjState], snapshot: Snapshot) -> dict[str, ObjState]:
+    """
+    Apply a snapshot to a ``{object id: object state}`` dict, returning the new state.
+    This mirrors what the client does with the game objects.
+    """
+    if snapshot["type"] == "keyframe":
+        return {obj_state["id"]: dict(obj_state) for obj_state in snapshot["objects"]}
+    state = dict(state)
+    for obj_id in snapshot["despawn"]:
+        state.pop(obj_id, None)
+    for obj_state in snapshot["spawn"]:
+        state[obj_state["id"]] = dict(obj_state)
+    for obj_id, changed in snapshot["update"].items():
+        state[obj_id] = {**state[obj_id], **changed}
+    return state
@@ -1,169 +1,349 @@
-import pickle
+"""
+Threaded game server.
+
+Each level is a unit with its own lock: the occupied levels are updated and snapshotted
+concurrently by a pool of workers. The operations spanning several levels, the portal transfers
+and the removal of the players who left, are queued and applied between two ticks, when no level
+is being updated. ``self.lock`` only guards the bookkeeping of the clients: the sockets are
+written once it is released, each under the send lock of its client.
+"""
+
+import queue
 import socket
 import struct
 import threading
 import time
-from typing import Any
+from concurrent.futures import Executor, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, Optional
 
 import pygame
 
 from flatland.logger import Logger
-from flatland.multiplayer.client import GameClient
+from flatland.multiplayer import wire
+from flatland.multiplayer.framing import FrameReader
+from flatland.multiplayer.inputs import KeyMask
+from flatland.multiplayer.interest import InterestArea
+from flatland.multiplayer.replication import LevelSnapshotStage, ObjIds
+from flatland.multiplayer.tick_scheduler import TICK_RATE_HZ, TickScheduler
 from flatland.objects.items import Player  # your Player class
 from flatland.objects.items_registry import registry
+from flatland.profiler import profiler
+from flatland.sim_clock import sim_clock
 from flatland.world.level import Level
+from flatland.world.level_factory import factory
+
+FULL_RATE_RADIUS = 4.0  # tiles around the players where the objects are updated at every tick
 
 
 class GameServer:
-    def __init__(self, world: dict[str, Level]) -> None:
+    def __init__(
+        self,
+        world: dict[str, Level],
+        interest: Optional[InterestArea] = None,
+        workers: int = 1,
+        tick_rate_hz: float = TICK_RATE_HZ,
+    ) -> None:
         self.world = world
-        self.current_level: Any = None
-        for level in self.world.values():
-            self.current_level = level
-            level.get_ground_objs(self)  # type: ignore
-        self.current_level = None
         self.clients: dict[int, tuple] = dict()  # client_id -> (socket, Player)
         self.lock = threading.Lock()
+        # client_id -> lock held while writing to its socket, outside of self.lock
+        self.send_locks: dict[int, threading.Lock] = dict()
+        self.level_locks: dict[str, threading.Lock] = dict()  # level_key -> lock of the level
+        # cross-level operations, applied between two ticks
+        self.between_ticks: queue.SimpleQueue[Callable[[], None]] = queue.SimpleQueue()
+        # None: the levels are updated one after the other by the tick thread
+        self.executor: Optional[Executor] = ThreadPoolExecutor(workers) if workers > 1 else None
         self.logger = Logger()
         self.client_levels: dict[int, Level] = dict()  # the key is the client_id
+        # one snapshot stage per level, shared by all the clients in the level
+        self.stages: dict[str, LevelSnapshotStage] = dict()
+        self.needs_keyframe: set[int] = set()  # clients to send the keyframe instead of the delta
+        self.sent: dict[int, tuple[str, int]] = dict()  # client_id -> last (level_key, seq) sent
+        self.interest = interest or InterestArea()
+        # whatever the area of interest, the load is shed on the objects far from the players
+        self.full_rate_area = InterestArea(radius=FULL_RATE_RADIUS)
+        self.known: dict[int, ObjIds] = dict()  # client_id -> objects the client holds
+        self.inputs: dict[int, tuple[int, KeyMask]] = dict()  # client_id -> last (seq, keys)
+        self.tick = 0  # number of world updates
+        self.tick_scheduler = TickScheduler(tick_rate_hz)
+        self.dropped_snapshots = 0  # snapshots superseded before a slow client could receive them
 
     def handle_client(self, conn: Any, addr: Any, client_id: int):
         self.logger.info(f"Client {addr} connected as {client_id}")
-
-        # Create player for client
-        player = registry.create(
-            cls_name="Player",
-            x=5,
-            y=5,
-            name=f"Player{client_id}",
-            health=10,
-            vision_range=5,
-            hearing_range=5,
-            temperature=36.3,
-        )
-        self.client_levels[client_id] = self.world["level_0"]
-        self.client_levels[client_id].register(player)
-        self.current_level = self.client_levels[client_id]
-        self.client_levels[client_id].get_ground_objs(self)  # type: ignore
-        self.current_level = None
-
         with self.lock:
-            self.clients[client_id] = (conn, player)
-
-            # 👇 Send full world state immediately
-            world_state = self.client_levels[client_id].get_serializable_state()
-            payload = {
-                "world_state": world_state,
-                "player_id": player.id,  # 👈 send player id to client
-                "level_key": self.client_levels[client_id].level_key,
-            }
-            full_state = pickle.dumps(payload)
-            length_prefix = struct.pack("!I", len(full_state))
-            conn.sendall(length_prefix + full_state)
+            player, join_message = self.join(client_id, conn)
+            send_lock = self.send_locks.setdefault(client_id, threading.Lock())
+            send_lock.acquire()  # the join message is sent before any snapshot
+        try:
+            conn.sendall(join_message)
+        finally:
+            send_lock.release()
 
+        frames = FrameReader.from_socket(conn)
         try:
             while True:
-                # First read message length
-                length_data = GameClient.recv_all(conn, 4)
-                message_length = struct.unpack("!I", length_data)[0]
-                data = GameClient.recv_all(conn, message_length)
-                keys = pickle.loads(data)
-                if isinstance(keys, dict) and keys.get("type") == "portal_request":
-                    self.process_portal(client_id, keys["target_level"], keys["exit_name"])
-                else:
-                    # print("pressed keys?", any(keys))
-                    # print(player.is_accepting_keys)
-                    player.get_pressed_keys(keys)  # type: ignore
+                self.handle_message(client_id, player, wire.decode(frames.read_frame()))
         except Exception as e:
             print(f"Exception in handle_client: {e}")
         finally:
             self.disconnect(client_id)
 
+    def join(
+        self, client_id: int, conn: Any, player: Any = None, level_key: str = "level_0"
+    ) -> tuple[Any, bytes]:
+        """
+        Create the player of a new client, in the first level, unless an existing player is
+        given. Return it with the join message, to be sent before any snapshot. Must be called
+        with the lock held.
+        """
+        if player is None:
+            player = registry.create(
+                cls_name="Player",
+                x=5,
+                y=5,
+                name=f"Player{client_id}",
+                health=10,
+                vision_range=5,
+                hearing_range=5,
+                temperature=36.3,
+            )
+        level = self.world[level_key]
+        self.client_levels[client_id] = level
+        factory.prefetch_neighbours(level, self.world)
+        self.clients[client_id] = (conn, player)
+
+        # 👇 Send full world state immediately, as the keyframe of the level stream
+        with self.level_lock(level):
+            level.register(player)
+            stage = self.stage(level)
+            self.known[client_id] = stage.visible(self.interest.visible(level, player))
+        self.sent[client_id] = (stage.level_key, stage.seq)
+        payload = {
+            "type": "join",
+            "snapshot": stage.keyframe_snapshot(self.known[client_id]),
+            "player_id": player.id,  # 👈 send player id to client
+        }
+        return player, self.frame(payload)
+
+    def handle_message(self, client_id: int, player: Any, message: dict[str, Any]) -> None:
+        if message["type"] == "portal_request":
+            self.between_ticks.put(
+                lambda: self.process_portal(
+                    client_id, message["target_level"], message["exit_name"]
+                )
+            )
+        elif message["type"] == "resync":
+            with self.lock:
+                self.needs_keyframe.add(client_id)
+        elif message["type"] == "keys":
+            last = self.inputs.get(client_id)
+            if last is None or message["seq"] > last[0]:  # older inputs are outdated
+                self.inputs[client_id] = (message["seq"], KeyMask(message["mask"]))
+
     def process_portal(self, client_id: int, target_level_key: str, exit_name: str):
+        """Move the player of the client to another level. Only called between two ticks."""
         self.logger.info(f"Processing portal request for client {client_id} -> {target_level_key}")
 
         with self.lock:
+            if client_id not in self.clients:  # the client left in the meantime
+                return
             player = self.clients[client_id][1]
             old_level = self.client_levels[client_id]
 
             # Unregister player from old level
-            old_level.unregister(player)
-            for obj in player.children:
-                old_level.unregister(obj)
+            self.remove_player(old_level, player)
 
             # Move player to new level
             new_level = self.world[target_level_key]
+            factory.prefetch_neighbours(new_level, self.world)
+            self.place_at_exit(player, new_level, exit_name)
+            self.client_levels[client_id] = new_level
+            self.needs_keyframe.add(client_id)
 
-            # Move player to portal spawn point
-            portal = next(obj for obj in new_level._observers if obj.name == exit_name)
-            player.x = portal.x
-            player.y = portal.y
-
-            # Register player in new level
-            for obj in player.children:
+    def place_at_exit(self, player: Any, level: Level, exit_name: str) -> None:
+        """Register the player and its children in the level, at the portal spawn point"""
+        with self.level_lock(level):
+            portal = next(obj for obj in level._observers if obj.name == exit_name)
+            for obj in [*player.children, player]:
                 obj.x = portal.x
                 obj.y = portal.y
-                new_level.register(obj)
-            new_level.register(player)
-
-            self.current_level = new_level
-            new_level.get_ground_objs(self)  # type: ignore
-            self.current_level = None
-            self.client_levels[client_id] = new_level
+                level.register(obj)
 
     def disconnect(self, client_id: int) -> None:
         self.logger.info(f"Disconnecting client {client_id}")
         with self.lock:
             conn, player = self.clients.pop(client_id, (None, None))
+            level = self.client_levels.pop(client_id, None)
+            self.needs_keyframe.discard(client_id)
+            self.sent.pop(client_id, None)
+            self.known.pop(client_id, None)
+            self.send_locks.pop(client_id, None)
+            self.inputs.pop(client_id, None)
         if conn:
             conn.close()
-        if player:
-            self.client_levels.pop(client_id)
-            for cl_id in self.client_levels:
-                self.client_levels[cl_id].unregister(player)
-                for obj in player.children:
-                    self.client_levels[cl_id].unregister(obj)
+        if player and level:
+            self.between_ticks.put(lambda: self.remove_player(level, player))
+
+    def remove_player(self, level: Level, player: Any) -> None:
+        with self.level_lock(level):
+            level.unregister(player)
+            for obj in player.children:
+                level.unregister(obj)
+
+    def level_lock(self, level: Level) -> threading.Lock:
+        """The lock of the level, held while its objects are updated or snapshotted"""
+        return self.level_locks.setdefault(level.level_key, threading.Lock())
+
+    def map_levels(self, function: Callable[..., None], *iterables: Iterable) -> None:
+        """Run ``function`` for each level, on the workers when there are several"""
+        if self.executor is None:
+            for args in zip(*iterables):
+                function(*args)
+        else:
+            for _ in self.executor.map(function, *iterables):  # raise the errors of the workers
+                pass
+
+    def apply_between_ticks(self) -> None:
+        """Apply the queued cross-level operations"""
+        while True:
+            try:
+                operation = self.between_ticks.get_nowait()
+            except queue.Empty:
+                return
+            operation()
+
+    def update_level(
+        self, level: Level, players: list[tuple[Any, Optional[KeyMask]]], near_only: bool = False
+    ) -> None:
+        """
+        Run the game logic of a level, its players holding the given keys. With ``near_only``,
+        only the objects within ``FULL_RATE_RADIUS`` of a player are prepared.
+        """
+        with self.level_lock(level):
+            # the objects see their own level as the current level of the game
+            game = SimpleNamespace(current_level=level)
+            level.reset_is_walkable()
+            for player, keys in players:
+                if keys is not None:  # the keys are held until the next input
+                    player.get_pressed_keys(keys)
+                level.set_volume(player)
+            objs = None
+            if near_only:
+                near = [self.full_rate_area.visible(level, player) for player, _ in players]
+                if None not in near:  # else the whole level is near a player
+                    areas = [ids for ids in near if ids is not None]
+                    objs = [o for o in level.awake_observers if any(o.id in a for a in areas)]
+            level.prepare(None, game, objs)  # type: ignore
+            level.update(None)
+            level.correct_periodic_positions()
 
     def update_world(self) -> None:
+        self.apply_between_ticks()
+        # update each level where there is at least one client
         with self.lock:
-            # update each level where there is at least one client
-            for client_id, level in set(self.client_levels.items()):
-                # Run game logic
-                self.current_level = level
-                level.reset_is_walkable()
-                player = self.clients[client_id][1]
-                level.set_volume(player)
-                level.prepare(level._observers, self)  # type: ignore
-                self.current_level = None
-            self.broadcast()
-
-            for level in set(self.client_levels.values()):
-                self.current_level = level
-                level.update(None)
-                level.correct_periodic_positions()
-                self.current_level = None
-            self.broadcast()
-
-    def broadcast(self):
-        for client_id, (conn, _) in list(
-            self.clients.items()
-        ):  # list() to avoid dict mutation during iteration
-            world_state = self.client_levels[client_id].get_serializable_state()
-            payload = {
-                "world_state": world_state,
-                "level_key": self.client_levels[client_id].level_key,
-            }
-            full_state = pickle.dumps(payload)
-            length_prefix = struct.pack("!I", len(full_state))
+            occupied: dict[Level, list[tuple[Any, Optional[KeyMask]]]] = {}
+            for client_id, level in self.client_levels.items():
+                keys = self.inputs.get(client_id)
+                occupied.setdefault(level, []).append(
+                    (self.clients[client_id][1], keys and keys[1])
+                )
+        # when the ticks exceed their budget, the objects far from players are updated less often
+        stride = 2**self.tick_scheduler.degradation
+        near_only = [self.tick % stride != 0] * len(occupied)
+        self.map_levels(self.update_level, occupied.keys(), occupied.values(), near_only)
+        with self.lock:
+            self.tick += 1
+        lost = self.broadcast()
+        for client_id in lost:
+            self.disconnect(client_id)
+        profiler.maybe_dump()
 
-            try:
-                conn.sendall(length_prefix + full_state)
-            except socket.timeout:
-                print(f"Timeout sending to client {client_id}, will retry next loop")
-                continue  # soft fail
-            except socket.error as e:
-                print(f"Socket error sending to client {client_id}: {e}")
-                self.disconnect(client_id)
+    @staticmethod
+    def frame(message: dict[str, Any]) -> bytes:
+        """Encode a message with its length prefix, ready to be sent"""
+        data = wire.encode_from_server(message)
+        return struct.pack("!I", len(data)) + data
+
+    def stage(self, level: Level) -> LevelSnapshotStage:
+        """The snapshot stage of the level, created and run for the first time on demand"""
+        if level.level_key not in self.stages:
+            self.stages[level.level_key] = LevelSnapshotStage(level.level_key, self.frame)
+            self.stages[level.level_key].tick(
+                level.get_serializable_state(), self.tick, sim_clock.get_ticks()
+            )
+        return self.stages[level.level_key]
+
+    def tick_stage(self, level: Level, stage: LevelSnapshotStage) -> None:
+        with self.level_lock(level), profiler.phase(level.level_key, "serialize"):
+            stage.tick(level.get_serializable_state(), self.tick, sim_clock.get_ticks())
+
+    def tick_stages(self) -> None:
+        """Snapshot once each level with clients"""
+        levels = []
+        for level in set(self.client_levels.values()):
+            if level.level_key in self.stages:
+                levels.append(level)
+            else:
+                with self.level_lock(level):
+                    self.stage(level)
+        stages = [self.stages[level.level_key] for level in levels]
+        self.map_levels(self.tick_stage, levels, stages)
+
+    def next_snapshot(self, client_id: int) -> Optional[bytes]:
+        """
+        The buffer bringing the client up to date with its area of interest: the delta of the
+        last tick if the client holds the previous snapshot, otherwise the keyframe, which
+        supersedes the snapshots the client missed. The keyframe is also sent periodically, see
+        ``LevelSnapshotStage.is_resync``. None if the client is already up to date.
+        """
+        level = self.client_levels[client_id]
+        stage = self.stages[level.level_key]
+        last = self.sent.get(client_id)
+        if last == (stage.level_key, stage.seq):
+            return None
+        self.sent[client_id] = (stage.level_key, stage.seq)
+        known = self.known.get(client_id)
+        visible = stage.visible(self.interest.visible(level, self.clients[client_id][1]))
+        self.known[client_id] = visible
+        if (
+            client_id not in self.needs_keyframe
+            and last == (stage.level_key, stage.seq - 1)
+            and not stage.is_resync()
+        ):
+            return stage.delta_for(known, visible)
+        self.needs_keyframe.discard(client_id)
+        if last is not None and last[0] == stage.level_key:
+            self.dropped_snapshots += stage.seq - last[1] - 1
+        return stage.keyframe_for(visible)
+
+    def broadcast(self) -> list[int]:
+        """
+        Snapshot each level with clients once, then send the same buffers to all its clients,
+        after releasing the lock. Return the clients whose connection is lost, to be disconnected.
+        """
+        outgoing = []
+        with self.lock:
+            self.tick_stages()
+            for client_id, (conn, _) in self.clients.items():
+                data = self.next_snapshot(client_id)
+                if data is not None:
+                    level_key = self.client_levels[client_id].level_key
+                    send_lock = self.send_locks.setdefault(client_id, threading.Lock())
+                    outgoing.append((client_id, conn, send_lock, level_key, data))
+        lost = []
+        for client_id, conn, send_lock, level_key, data in outgoing:
+            with send_lock, profiler.phase(level_key, "broadcast"):
+                try:
+                    conn.sendall(data)
+                except socket.timeout:
+                    print(f"Timeout sending to client {client_id}, resync next loop")
+                    with self.lock:
+                        self.sent.pop(client_id, None)  # the client may have missed a delta
+                except socket.error as e:
+                    print(f"Socket error sending to client {client_id}: {e}")
+                    lost.append(client_id)
+        return lost
 
     def run(self, host="0.0.0.0", port=12345):
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -183,5 +363,5 @@ class GameServer:
 
     def world_loop(self):
         while True:
-            self.update_world()
-            time.sleep(0.1)
+            time.sleep(self.tick_scheduler.delay())
+            self.tick_scheduler.run(self.update_world)
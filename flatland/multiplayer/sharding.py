@@ -0,0 +1,238 @@
+"""
+Sharded server: the simulation of the world is split over several processes.
+
+A coordinator assigns the levels of the ``LevelFactory`` to worker processes. Each worker is a
+``ShardServer`` owning the simulation of its levels, listening on the loopback. The clients connect
+to the coordinator, which proxies each of them to the worker owning the level of its player.
+
+When a player takes a portal to a level owned by another worker, its worker serializes the player
+and its children in a transfer message, drops them and ends the connection. The coordinator
+connects the client to the owner of the target level and forwards the transfer, from which that
+worker rebuilds the player at the portal exit. The keyframe of the join message it answers with is
+forwarded to the client: for the client, it is a level change like any other.
+"""
+
+import asyncio
+import multiprocessing
+import struct
+from typing import Any, Iterable, Optional
+
+from flatland.multiplayer import wire
+from flatland.multiplayer.async_server import AsyncGameServer
+from flatland.multiplayer.framing import StreamFrameReader
+from flatland.multiplayer.interest import InterestArea
+from flatland.multiplayer.replication import ObjState
+from flatland.multiplayer.tick_scheduler import TICK_RATE_HZ
+from flatland.objects.items_registry import registry
+
+SPAWN_LEVEL = "level_0"  # where the new players join, see ``GameServer.join``
+CONNECT_ATTEMPTS = 100  # the workers may still be loading their levels
+CONNECT_RETRY_S = 0.1
+
+
+def prefixed(data: wire.Buffer) -> bytes:
+    """Frame an encoded message with its length prefix"""
+    return struct.pack("!I", len(data)) + data
+
+
+def assign_levels(level_keys: Iterable[str], n_workers: int) -> dict[str, int]:
+    """The worker owning each level: the levels are spread evenly, the same way at every run"""
+    return {key: i % n_workers for i, key in enumerate(sorted(level_keys))}
+
+
+def restore_objects(obj_states: list[ObjState]) -> list[Any]:
+    """Rebuild transferred objects from their states, with their parent links"""
+    objs = {}
+    for obj_data in obj_states:
+        instance = registry.create(
+            cls_name=obj_data["cls_name"],
+            x=obj_data["x"],
+            y=obj_data["y"],
+            name=obj_data["name"],
+            health=obj_data["health"],
+            vision_range=5,
+            hearing_range=5,
+            temperature=36.3,
+            tile_name=obj_data["tile_name"],
+            speech=obj_data["speech"],
+        )
+        for k, v in obj_data.items():
+            if k != "cls_name":
+                setattr(instance, k, v)
+        objs[obj_data["id"]] = instance
+    for obj in objs.values():
+        if obj.parent_id in objs:
+            obj.parent = objs[obj.parent_id]
+            obj.parent.children.append(obj)
+    return list(objs.values())
+
+
+class ShardServer(AsyncGameServer):
+    """
+    A worker: simulates the levels of its world only. Its connections come from the coordinator
+    and start with a transfer, bringing a player or, when empty, asking for a new one.
+    """
+
+    async def admit(
+        self, client_id: int, frames: StreamFrameReader, writer: asyncio.StreamWriter
+    ) -> tuple[Any, bytes]:
+        transfer = wire.decode(await frames.read_frame())
+        if transfer["type"] != "transfer":
+            raise wire.WireError(f"Expected a transfer, got {transfer['type']}")
+        if not transfer["objects"]:
+            with self.lock:
+                return self.join(client_id, writer, level_key=transfer["target_level"])
+        player, *_ = restore_objects(transfer["objects"])
+        level = self.world[transfer["target_level"]]
+        with self.lock:
+            self.place_at_exit(player, level, transfer["exit_name"])
+            return self.join(client_id, writer, player, level.level_key)
+
+    def process_portal(self, client_id: int, target_level_key: str, exit_name: str):
+        """Portals to the levels of other workers hand the player over to the coordinator"""
+        if target_level_key in self.world:
+            return super().process_portal(client_id, target_level_key, exit_name)
+        with self.lock:
+            if client_id not in self.clients:
+                return
+            writer, player = self.clients[client_id]
+            level = self.client_levels[client_id]
+            with self.level_lock(level):
+                objects = [level.get_obj_state(obj) for obj in [player, *player.children]]
+        self.logger.info(f"Handing client {client_id} over for level {target_level_key}")
+        transfer = {
+            "type": "transfer",
+            "target_level": target_level_key,
+            "exit_name": exit_name,
+            "objects": objects,
+        }
+        writer.write(self.frame(transfer))
+        self.ready.pop(client_id, None)  # no more snapshots: its sender stops at the next wake up
+        self.disconnect(client_id)  # the transfer is flushed before the connection is closed
+
+
+class Coordinator:
+    """Accepts the clients and proxies each of them to the worker owning the level of its player"""
+
+    def __init__(self, owners: dict[str, tuple[str, int]]) -> None:
+        self.owners = owners  # level_key -> address of the owning worker
+
+    async def connect(
+        self, transfer: wire.Buffer, level_key: str
+    ) -> tuple[StreamFrameReader, asyncio.StreamWriter]:
+        """Open a connection to the owner of the level, starting with the transfer"""
+        host, port = self.owners[level_key]
+        for _ in range(CONNECT_ATTEMPTS):
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                break
+            except OSError:
+                await asyncio.sleep(CONNECT_RETRY_S)
+        else:
+            raise ConnectionError(f"The worker of level {level_key} is not reachable")
+        writer.write(prefixed(transfer))
+        return StreamFrameReader(reader), writer
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        new_player: dict[str, Any] = {
+            "type": "transfer",
+            "target_level": SPAWN_LEVEL,
+            "exit_name": None,
+            "objects": [],
+        }
+        upstream: Optional[asyncio.StreamWriter] = None
+        uplink: Optional[asyncio.Task] = None
+        try:
+            worker_frames, upstream = await self.connect(wire.encode(new_player), SPAWN_LEVEL)
+            uplink = asyncio.create_task(self.forward(reader, lambda: upstream))
+
+            def close_upstream(_: asyncio.Task) -> None:
+                if upstream is not None:  # the client left
+                    upstream.close()
+
+            uplink.add_done_callback(close_upstream)
+            while True:
+                data = await worker_frames.read_frame()
+                if wire.message_type(data) is not wire.MessageType.TRANSFER:
+                    writer.write(prefixed(data))
+                    await writer.drain()
+                    continue
+                # the player changes worker: the client follows it
+                upstream.close()
+                target_level = wire.decode(data)["target_level"]
+                worker_frames, upstream = await self.connect(data, target_level)
+                join = wire.decode_from_server(await worker_frames.read_frame())
+                writer.write(prefixed(wire.encode_from_server(join["snapshot"])))
+        except (ConnectionError, asyncio.IncompleteReadError, wire.WireError):
+            pass  # the client or its worker left
+        finally:
+            if uplink is not None:
+                uplink.cancel()
+            if upstream is not None:
+                upstream.close()
+            writer.close()
+
+    @staticmethod
+    async def forward(reader: asyncio.StreamReader, upstream: Any) -> None:
+        """Forward the messages of the client to its current worker"""
+        frames = StreamFrameReader(reader)
+        while True:
+            data = await frames.read_frame()
+            upstream().write(prefixed(data))
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 12345) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print("Coordinator listening...")
+        async with server:
+            await server.serve_forever()
+
+
+def run_worker(
+    level_keys: list[str],
+    port: int,
+    interest_radius: Optional[float],
+    workers: int,
+    tick_rate_hz: float = TICK_RATE_HZ,
+) -> None:
+    """Entry point of a worker process"""
+    from flatland.world.world import LazyWorld, factory  # the levels are registered on import
+
+    owned = LazyWorld((key, factory.lazy(key)) for key in level_keys)  # built on the first join
+    interest = InterestArea(radius=interest_radius)
+    ShardServer(owned, interest, workers=workers, tick_rate_hz=tick_rate_hz).run("127.0.0.1", port)
+
+
+def run_sharded(
+    level_keys: Iterable[str],
+    n_workers: int,
+    host: str = "0.0.0.0",
+    port: int = 12345,
+    interest_radius: Optional[float] = None,
+    workers: int = 1,
+    tick_rate_hz: float = TICK_RATE_HZ,
+) -> None:
+    """
+    Start ``n_workers`` worker processes, listening on the ports following ``port``, and run the
+    coordinator on ``port``.
+    """
+    assignment = assign_levels(level_keys, n_workers)
+    context = multiprocessing.get_context("spawn")  # the workers do not inherit pygame
+    processes = []
+    for i in range(n_workers):
+        owned = [key for key, worker in assignment.items() if worker == i]
+        process = context.Process(
+            target=run_worker,
+            args=(owned, port + 1 + i, interest_radius, workers, tick_rate_hz),
+            name=f"flatland-shard-{i}",
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    owners = {key: ("127.0.0.1", port + 1 + worker) for key, worker in assignment.items()}
+    try:
+        asyncio.run(Coordinator(owners).serve(host, port))
+    finally:
+        for process in processes:
+            process.terminate()
@@ -0,0 +1,103 @@
+"""
+Fixed-rate scheduling of the server ticks.
+
+The ticks are due at fixed deadlines, ``period_s`` apart, whatever the time taken by each tick:
+the time spent in a tick is deducted from the wait before the next one, hence the rate does not
+drift as the world gets busier. A server that falls behind runs the late ticks back to back to
+catch up, up to ``max_catch_up`` of them; beyond that, the missed ticks are skipped and counted.
+
+The scheduler also measures the load, the share of the period used by the ticks. When the ticks
+keep exceeding their budget, the ``degradation`` level rises, and the server spends less time on
+the objects far from the players; it falls back once the load is low again.
+"""
+
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from flatland.tracer import tracer
+
+TICK_RATE_HZ = 10.0
+MAX_CATCH_UP = 3  # late ticks run back to back before the missed ones are skipped
+MAX_DEGRADATION = 3
+ADAPT_EVERY = 10  # ticks between two changes of the degradation level
+
+
+class TickScheduler:
+    def __init__(
+        self,
+        rate_hz: float = TICK_RATE_HZ,
+        max_catch_up: int = MAX_CATCH_UP,
+        clock: Callable[[], float] = time.monotonic,
+        smoothing: float = 0.1,
+        degrade_above: float = 1.0,
+        recover_below: float = 0.5,
+    ) -> None:
+        self.period_s = 1.0 / rate_hz
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.smoothing = smoothing
+        self.degrade_above = degrade_above
+        self.recover_below = recover_below
+        self.deadline: Optional[float] = None  # when the next tick is due
+        self.ticks = 0
+        self.late_ticks = 0  # run behind their deadline, to catch up
+        self.skipped_ticks = 0  # missed and dropped to get back on schedule
+        self.overruns = 0  # took longer than the period
+        self.durations: deque[float] = deque(maxlen=1000)  # seconds, of the last ticks
+        self.load = 0.0  # moving average of the tick duration over the period
+        self.degradation = 0  # 0: full quality, up to MAX_DEGRADATION
+        self.adapted_at = 0  # tick of the last change of the degradation level
+
+    def delay(self) -> float:
+        """Seconds to wait before running the next tick, 0 when it is already due"""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        behind = now - self.deadline
+        if behind < 0:
+            return -behind
+        missed = int(behind / self.period_s)
+        if missed > self.max_catch_up:
+            self.skipped_ticks += missed - self.max_catch_up
+            self.deadline += (missed - self.max_catch_up) * self.period_s
+        if missed:
+            self.late_ticks += 1
+        return 0.0
+
+    def run(self, tick: Callable[[], Any]) -> None:
+        """Run a tick, measure it and schedule the next one"""
+        started = self.clock()
+        with tracer.span("tick", "tick", {"tick": self.ticks}):
+            tick()
+        self.record(self.clock() - started)
+        self.deadline = (started if self.deadline is None else self.deadline) + self.period_s
+
+    def record(self, duration: float) -> None:
+        self.ticks += 1
+        self.durations.append(duration)
+        if duration > self.period_s:
+            self.overruns += 1
+        self.load += self.smoothing * (duration / self.period_s - self.load)
+        if self.ticks - self.adapted_at < ADAPT_EVERY:
+            return
+        if self.load > self.degrade_above and self.degradation < MAX_DEGRADATION:
+            self.degradation += 1
+            self.adapted_at = self.ticks
+        elif self.load < self.recover_below and self.degradation > 0:
+            self.degradation -= 1
+            self.adapted_at = self.ticks
+
+    def stats(self) -> dict[str, float]:
+        """The counters, with the median and worst durations of the last ticks, in ms"""
+        durations = sorted(self.durations)
+        return {
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "overruns": self.overruns,
+            "load": self.load,
+            "degradation": self.degradation,
+            "median_ms": 1000 * durations[len(durations) // 2] if durations else 0.0,
+            "max_ms": 1000 * durations[-1] if durations else 0.0,
+        }
@@ -0,0 +1,851 @@
+"""
+Schema-driven binary wire protocol between the clients and the server.
+
+Messages are dicts with a ``type`` key (as produced by the replication and by the client),
+encoded as:
+
+- a header with the protocol version and the message type,
+- a string table: every string of the message is sent once, the strings separated by a NUL
+  character, and referred to by its index,
+- a blob table: values with no fixed layout (e.g. the sprite locations) are tagged-encoded,
+  sent once and referred to by their index,
+- the body. Object states follow the fixed field table generated from ``OBJ_STATE_SCHEMA``:
+  states with the same fields are grouped and sent row by row, all packed by a single struct
+  call, with a struct compiled per layout and number of states. Field names are never sent.
+
+The most frequent messages, the keys and the deltas of the levels where nothing changed, have a
+fixed layout, encoded and decoded by one or two struct calls.
+
+The length prefix framing is unchanged. Unlike pickle, decoding never instantiates arbitrary
+objects, hence it is safe to accept messages from the clients.
+
+The snapshots of the server are smaller with this codec, but slower to encode and decode than with
+the C pickler: by default, they are pickled behind the header instead, see ``encode_from_server``.
+``FLATLAND_SNAPSHOT_CODEC=wire`` sends them with this codec, when the bandwidth matters more than
+the CPU of the server. Only the clients accept pickled messages, see ``decode_from_server``.
+"""
+
+import functools
+import os
+import pickle
+import struct
+from enum import IntEnum
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Optional, Sequence, Union
+
+from ..consts import Direction
+from ..world.level import SPRITE_FIELDS
+
+WIRE_VERSION = 7
+SNAPSHOT_CODEC = os.getenv("FLATLAND_SNAPSHOT_CODEC", "pickle")  # or "wire"
+_SNAPSHOT_TYPES = frozenset({"keyframe", "delta", "join"})
+
+Buffer = Union[bytes, bytearray, memoryview]  # messages are decoded in place, see ``framing``
+
+
+class WireError(ValueError):
+    pass
+
+
+class MessageType(IntEnum):
+    JOIN = 1
+    KEYFRAME = 2
+    DELTA = 3
+    KEYS = 4
+    PORTAL_REQUEST = 5
+    RESYNC = 6
+    TRANSFER = 7  # a player changing server, see ``sharding``
+    PICKLED = 8  # a snapshot of the server, see ``encode_from_server``
+
+
+class Kind(IntEnum):
+    STR = 0  # interned string, or None
+    F64 = 1
+    I32 = 2
+    BOOL = 3
+    DIRECTION = 4
+    ANY = 5  # tagged-encoded blob
+
+
+# the object state schema, see ``Level.get_obj_state``
+OBJ_STATE_SCHEMA: tuple[tuple[str, Kind], ...] = (
+    ("id", Kind.STR),
+    ("cls_name", Kind.STR),
+    ("x", Kind.F64),
+    ("y", Kind.F64),
+    ("health", Kind.F64),
+    ("name", Kind.STR),
+    ("tile_name", Kind.STR),
+    ("speech", Kind.STR),
+    ("prev_x", Kind.F64),
+    ("prev_y", Kind.F64),
+    ("inertia", Kind.F64),
+    ("direction", Kind.DIRECTION),
+    ("is_moving", Kind.BOOL),
+    ("is_pushing", Kind.BOOL),
+    ("is_standing", Kind.BOOL),
+    ("parent_id", Kind.STR),
+    ("render_on_top_of_parent", Kind.BOOL),
+    ("location_as_parent", Kind.BOOL),
+    ("level_key", Kind.STR),
+    ("exit_name", Kind.STR),
+    ("volume", Kind.ANY),
+    ("z_level", Kind.F64),
+    ("sprite_size_x", Kind.I32),
+    ("sprite_size_y", Kind.I32),
+    ("current_standing_idx", Kind.I32),
+)
+
+# fixed field table generated from the schema
+FIELD_NAMES = tuple(name for name, _ in OBJ_STATE_SCHEMA)
+FIELD_KINDS = tuple(kind for _, kind in OBJ_STATE_SCHEMA)
+FIELD_BITS = {name: 1 << i for i, name in enumerate(FIELD_NAMES)}
+ALL_FIELDS = (1 << len(FIELD_NAMES)) - 1
+_KIND_FORMATS = {
+    Kind.STR: "H",
+    Kind.F64: "d",
+    Kind.I32: "i",
+    Kind.BOOL: "?",
+    Kind.DIRECTION: "B",
+    Kind.ANY: "H",
+}
+_STR_TYPES: frozenset[type] = frozenset({str})
+DIRECTIONS = tuple(Direction)
+_DIRECTION_IDX = {id(d): i for i, d in enumerate(DIRECTIONS)}
+NONE_IDX = 0  # the index of None in the string table
+MAX_IDX = 0xFFFF
+NO_SEQ = 0xFFFFFFFF
+SEPARATOR = "\0"  # between the strings of the string table
+MAX_RECORDS = 256  # structs compiled per layout, for as many numbers of states
+
+_HEADER = struct.Struct("!BB")
+_U8 = struct.Struct("!B")
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+# header, number of strings, size of the separated strings
+_PREAMBLE = struct.Struct("!BBHI")
+_KEYFRAME = struct.Struct("!IdIH")  # server tick and time in ms, seq, index of the level key
+_DELTA = struct.Struct("!IdIIH")  # server tick and time in ms, seq, baseline, index of level key
+_EMPTY_RECORDS = bytes(_U32.size)  # no group of states
+_NO_BLOBS = bytes(_U16.size)
+_GROUP = struct.Struct("!III")  # fields mask, mask of the fields sent as blobs, number of states
+# the fixed layouts of the most frequent messages, see ``encode``
+_KEYS_MESSAGE = struct.Struct("!BBHIHII")  # header, no string, no blob, seq and mask of the keys
+# after the preamble and a single string, the level key: no blob, clock, seq, baseline, index of
+# the level key, no spawn, despawn, update nor manifest
+_IDLE_DELTA_TAIL = struct.Struct("!HIdIIHIIIH")
+
+_struct = functools.lru_cache(maxsize=256)(struct.Struct)  # for the formats of the arrays
+
+
+class _Layout:
+    """
+    The fields of a mask, in schema order, with the getter of their values in a state. The states
+    of a group are flattened row by row: the values of a field are a slice of the rows.
+    """
+
+    def __init__(self, mask: int) -> None:
+        self.fields = tuple(i for i in range(len(FIELD_NAMES)) if mask >> i & 1)
+        self.names = tuple(FIELD_NAMES[i] for i in self.fields)
+        getter = itemgetter(*self.names)
+        self.getter: Callable[[dict[str, Any]], tuple[Any, ...]] = (
+            getter if len(self.names) > 1 else lambda state: (getter(state),)
+        )
+        width = len(self.fields)
+        # the fields of each kind, with the slice of their values in the rows
+        self.columns: dict[Kind, list[tuple[int, slice]]] = {}
+        for position, i in enumerate(self.fields):
+            self.columns.setdefault(FIELD_KINDS[i], []).append((i, slice(position, None, width)))
+        # the kinds whose values are converted before packing: the struct checks the numbers
+        self.conversions: list[tuple[Kind, list[slice], list[tuple[int, slice]]]] = [
+            (kind, [column for _, column in columns], columns)
+            for kind, columns in self.columns.items()
+            if kind is not Kind.F64 and kind is not Kind.I32
+        ]
+        self._records: dict[tuple[int, int], struct.Struct] = {}
+        self._tables: dict[int, tuple[int, list[slice], list[slice], list[slice]]] = {}
+        self.template = dict.fromkeys(self.names)  # copied for each decoded state
+
+    def row_format(self, fallback: int) -> str:
+        return "".join(
+            _KIND_FORMATS[Kind.ANY if fallback >> i & 1 else FIELD_KINDS[i]] for i in self.fields
+        )
+
+    def record(self, fallback: int, n: int) -> struct.Struct:
+        """The struct of ``n`` rows, the fields of ``fallback`` being sent as blobs"""
+        record = self._records.get((fallback, n))
+        if record is None:
+            if len(self._records) >= MAX_RECORDS:
+                self._records.clear()
+            record = struct.Struct("!" + self.row_format(fallback) * n)
+            self._records[fallback, n] = record
+        return record
+
+    def tables(self, fallback: int) -> tuple[int, list[slice], list[slice], list[slice]]:
+        """The size of a row, and the slices of the rows holding the indexes of each table"""
+        tables = self._tables.get(fallback)
+        if tables is None:
+            strings, blobs, directions = [], [], []
+            for kind, columns in self.columns.items():
+                for i, column in columns:
+                    if fallback >> i & 1 or kind is Kind.ANY:
+                        blobs.append(column)
+                    elif kind is Kind.STR:
+                        strings.append(column)
+                    elif kind is Kind.DIRECTION:
+                        directions.append(column)
+            size = struct.calcsize("!" + self.row_format(fallback))
+            tables = self._tables[fallback] = (size, strings, blobs, directions)
+        return tables
+
+
+_layouts: dict[int, _Layout] = {}
+_masks: dict[tuple[str, ...], int] = {}
+
+
+def _layout(mask: int) -> _Layout:
+    layout = _layouts.get(mask)
+    if layout is None:
+        if not 0 < mask <= ALL_FIELDS:
+            raise WireError(f"Invalid fields mask {mask:#x}")
+        layout = _layouts[mask] = _Layout(mask)
+    return layout
+
+
+def _mask_of(obj_state: dict[str, Any]) -> int:
+    keys = tuple(obj_state)
+    mask = _masks.get(keys)
+    if mask is None:
+        mask = 0
+        for name in keys:
+            bit = FIELD_BITS.get(name)
+            if bit is None:
+                raise WireError(f"Field {name} is not in the object state schema")
+            mask |= bit
+        _masks[keys] = mask
+    return mask
+
+
+# tags of the blob encoding
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _TUPLE, _DICT, _DIRECTION, _STR_REF = range(11)
+_TAGGED_INT = struct.Struct("!Bq")
+_TAGGED_FLOAT = struct.Struct("!Bd")
+
+
+def _encode_any(value: Any, out: bytearray, strings: dict[str, int]) -> None:
+    """
+    Tagged encoding. Repeated strings (e.g. the same sprite paths for several directions) refer
+    to their first occurrence in the blob.
+    """
+    if value is None:
+        out.append(_NONE)
+    elif isinstance(value, bool):
+        out.append(_TRUE if value else _FALSE)
+    elif isinstance(value, Direction):
+        out.append(_DIRECTION)
+        out.append(_DIRECTION_IDX[id(value)])
+    elif isinstance(value, int):
+        if not -(2**63) <= value < 2**63:
+            raise WireError(f"Integer {value} is too large for the wire")
+        out += _TAGGED_INT.pack(_INT, value)
+    elif isinstance(value, float):
+        out += _TAGGED_FLOAT.pack(_FLOAT, value)
+    elif isinstance(value, str):
+        idx = strings.get(value)
+        if idx is None:
+            strings[value] = len(strings)
+            raw = value.encode()
+            out.append(_STR)
+            out += _U32.pack(len(raw))
+            out += raw
+        else:
+            out.append(_STR_REF)
+            out += _U32.pack(idx)
+    elif isinstance(value, (list, tuple)):
+        out.append(_TUPLE if isinstance(value, tuple) else _LIST)
+        out += _U32.pack(len(value))
+        for item in value:
+            _encode_any(item, out, strings)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        out += _U32.pack(len(value))
+        for k, v in value.items():
+            _encode_any(k, out, strings)
+            _encode_any(v, out, strings)
+    else:
+        raise WireError(f"Values of type {type(value).__name__} cannot be sent on the wire")
+
+
+def _decode_any(data: bytes, offset: int, strings: list[str]) -> tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    if tag == _FALSE or tag == _TRUE:
+        return tag == _TRUE, offset
+    if tag == _INT:
+        return _TAGGED_INT.unpack_from(data, offset - 1)[1], offset + 8
+    if tag == _FLOAT:
+        return _TAGGED_FLOAT.unpack_from(data, offset - 1)[1], offset + 8
+    if tag == _DIRECTION:
+        return DIRECTIONS[data[offset]], offset + 1
+    (n,) = _U32.unpack_from(data, offset)
+    offset += 4
+    if tag == _STR:
+        if offset + n > len(data):
+            raise WireError("Truncated blob")
+        strings.append(bytes(data[offset : offset + n]).decode())
+        return strings[-1], offset + n
+    if tag == _STR_REF:
+        return strings[n], offset
+    if tag == _LIST or tag == _TUPLE:
+        items = []
+        for _ in range(n):
+            item, offset = _decode_any(data, offset, strings)
+            items.append(item)
+        return (items if tag == _LIST else tuple(items)), offset
+    if tag == _DICT:
+        dct = {}
+        for _ in range(n):
+            k, offset = _decode_any(data, offset, strings)
+            dct[k], offset = _decode_any(data, offset, strings)
+        return dct, offset
+    raise WireError(f"Unknown tag {tag}")
+
+
+class _BlobCache:
+    """
+    Encoded blobs of the containers that are shared across messages (e.g. the sprite locations),
+    keyed by identity: these values are never mutated in place.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._encoded: dict[int, bytes] = {}
+        self._alive: dict[int, Any] = {}  # keeping the values alive keeps their ids valid
+        self._decoded: dict[bytes, Any] = {}
+        self._scalars: dict[tuple[type, Any], bytes] = {}  # scalars, keyed by value
+        self.clear()
+
+    def clear(self) -> None:
+        self._encoded.clear()
+        self._alive.clear()
+        self._scalars.clear()
+        self._encoded[id(None)] = bytes([_NONE])  # by far the most common value
+
+    def encode(self, value: Any) -> bytes:
+        blob = self._encoded.get(id(value))
+        if blob is not None:
+            return blob
+        is_container = isinstance(value, (list, tuple, dict))
+        if not is_container:
+            blob = self._scalars.get((type(value), value))
+            if blob is not None:
+                return blob
+        out = bytearray()
+        _encode_any(value, out, {})
+        blob = bytes(out)
+        if len(self._encoded) >= self.max_entries or len(self._scalars) >= self.max_entries:
+            self.clear()
+        if is_container:
+            self._encoded[id(value)] = blob
+            self._alive[id(value)] = value
+        else:
+            self._scalars[(type(value), value)] = blob
+        return blob
+
+    def encode_many(self, values: Sequence[Any]) -> list[bytes]:
+        encoded = self._encoded
+        blobs = list(map(encoded.get, map(id, values)))
+        if None in blobs:
+            blobs = [self.encode(v) if b is None else b for b, v in zip(blobs, values)]
+        return blobs  # type: ignore
+
+    def decode(self, blob: bytes) -> Any:
+        # decoded values are shared by all the objects using them: they must not be mutated
+        value = self._decoded.get(blob)
+        if value is None:
+            value, end = _decode_any(blob, 0, [])
+            if end != len(blob):
+                raise WireError("Trailing bytes in blob")
+            if len(self._decoded) >= self.max_entries:
+                self._decoded.clear()
+            self._decoded[blob] = value
+        return value
+
+
+_blob_cache = _BlobCache()
+
+
+class _Mismatch(Exception):
+    """A value does not fit the kind of its field: the field is sent as a blob"""
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.body = bytearray()
+        self.strings: dict[Any, int] = {None: NONE_IDX}
+        self.blobs: dict[bytes, int] = {}  # equal values are sent once
+
+    def intern_strings(self, values: Sequence[Any]) -> list[int]:
+        # the tables are filled in batch: only the new entries go through python code
+        table = self.strings
+        try:
+            new = [v for v in dict.fromkeys(values) if v not in table]
+        except TypeError:  # unhashable
+            raise _Mismatch()
+        if new:
+            if not _STR_TYPES.issuperset(map(type, new)):
+                raise _Mismatch()
+            start = len(table)
+            if start + len(new) > MAX_IDX:
+                raise WireError("Too many strings in a message")
+            table.update(zip(new, range(start, start + len(new))))
+        return list(map(table.__getitem__, values))
+
+    def string(self, value: Optional[str]) -> int:
+        return self.intern_strings([value])[0]
+
+    def intern_blobs(self, values: Sequence[Any]) -> list[int]:
+        encoded = _blob_cache.encode_many(values)
+        table = self.blobs
+        new = [b for b in dict.fromkeys(encoded) if b not in table]
+        if new:
+            start = len(table)
+            if start + len(new) > MAX_IDX:
+                raise WireError("Too many blobs in a message")
+            table.update(zip(new, range(start, start + len(new))))
+        return list(map(table.__getitem__, encoded))
+
+    def convert(self, kind: Kind, rows: list[Any], columns: list[slice], n: int) -> None:
+        """
+        Check the values of the columns fit the kind, or raise _Mismatch. The strings, blobs and
+        directions are replaced by their index, in place. The numbers are not converted: they are
+        checked by the struct packing the rows, and the values it accepts decode as equal numbers.
+        """
+        if kind is Kind.BOOL:
+            # the struct packs the truth of any value: only the booleans are counted
+            if any(rows[column].count(True) + rows[column].count(False) != n for column in columns):
+                raise _Mismatch()
+            return
+        values: Iterable[Any] = chain.from_iterable(map(rows.__getitem__, columns))
+        if kind is Kind.STR:
+            indexes = self.intern_strings(list(values))
+        elif kind is Kind.ANY:
+            indexes = self.intern_blobs(list(values))
+        else:
+            try:
+                # enum members are singletons: looked up by identity, as their hash is slow
+                indexes = list(map(_DIRECTION_IDX.__getitem__, map(id, values)))
+            except KeyError:
+                raise _Mismatch()
+        for j, column in enumerate(columns):
+            rows[column] = indexes[j * n : (j + 1) * n]
+
+    def records(self, obj_states: list[dict[str, Any]]) -> None:
+        """Object states are grouped by fields, and each group is sent row by row"""
+        if not obj_states:
+            self.body += _EMPTY_RECORDS
+            return
+        groups: dict[int, list[dict[str, Any]]] = {}
+        n = len(obj_states)
+        if list(map(len, obj_states)).count(len(obj_states[0])) == n:
+            groups[_mask_of(obj_states[0])] = obj_states  # e.g. the full states of a keyframe
+        else:
+            for obj_state in obj_states:
+                groups.setdefault(_mask_of(obj_state), []).append(obj_state)
+        try:
+            encoded = [self.group(mask, states) for mask, states in groups.items()]
+        except KeyError:  # same number of fields, but not the same fields: group one by one
+            groups = {}
+            for obj_state in obj_states:
+                groups.setdefault(_mask_of(obj_state), []).append(obj_state)
+            encoded = [self.group(mask, states) for mask, states in groups.items()]
+        self.body += _U32.pack(len(encoded))
+        self.body += b"".join(encoded)
+
+    def group(self, mask: int, obj_states: list[dict[str, Any]]) -> bytes:
+        layout = _layout(mask)
+        n = len(obj_states)
+        rows = list(chain.from_iterable(map(layout.getter, obj_states)))
+        fallback = 0
+        for kind, slices, columns in layout.conversions:
+            try:  # all the fields of a kind at once
+                self.convert(kind, rows, slices, n)
+            except _Mismatch:
+                fallback |= self.fallback(kind, rows, columns, n)
+        try:
+            packed = layout.record(fallback, n).pack(*rows)
+        except (struct.error, OverflowError):  # e.g. out of range: find the fields
+            for kind in (Kind.F64, Kind.I32):
+                for i, column in layout.columns.get(kind, []):
+                    try:
+                        struct.pack(f"!{n}{_KIND_FORMATS[kind]}", *rows[column])
+                    except (struct.error, OverflowError):
+                        fallback |= 1 << i
+                        self.convert(Kind.ANY, rows, [column], n)
+            packed = layout.record(fallback, n).pack(*rows)
+        return _GROUP.pack(mask, fallback, n) + packed
+
+    def fallback(
+        self, kind: Kind, rows: list[Any], columns: list[tuple[int, slice]], n: int
+    ) -> int:
+        """Convert the fields of a kind one by one, sending those that do not fit as blobs"""
+        fallback = 0
+        for i, column in columns:
+            try:
+                self.convert(kind, rows, [column], n)
+            except _Mismatch:
+                fallback |= 1 << i
+                self.convert(Kind.ANY, rows, [column], n)
+        return fallback
+
+    def snapshot(self, snapshot: dict[str, Any]) -> None:
+        level_key = self.string(snapshot["level_key"])
+        if snapshot["type"] == "keyframe":
+            self.body += _KEYFRAME.pack(
+                snapshot["tick"], snapshot["time_ms"], snapshot["seq"], level_key
+            )
+            self.records(snapshot["objects"])
+            self.manifest(snapshot["manifest"])
+            return
+        baseline = NO_SEQ if snapshot["baseline"] is None else snapshot["baseline"]
+        self.body += _DELTA.pack(
+            snapshot["tick"], snapshot["time_ms"], snapshot["seq"], baseline, level_key
+        )
+        self.records(snapshot["spawn"])
+        despawn = self.intern_strings(snapshot["despawn"])
+        self.body += _struct(f"!I{len(despawn)}H").pack(len(despawn), *despawn)
+        # the updates are sent as states with the id field
+        self.records([{"id": obj_id, **changed} for obj_id, changed in snapshot["update"].items()])
+        self.manifest(snapshot["manifest"])
+
+    def manifest(self, manifest: dict[str, Any]) -> None:
+        """The sprite key strings, then the sprite tables of each key as blobs, in field order"""
+        if not manifest:
+            self.body += _U16.pack(0)
+            return
+        keys = self.intern_strings(list(manifest))
+        tables = self.intern_blobs([t.get(f) for t in manifest.values() for f in SPRITE_FIELDS])
+        self.body += _struct(f"!H{len(keys) + len(tables)}H").pack(len(keys), *keys, *tables)
+
+    def finish(self, msg_type: MessageType) -> bytes:
+        # the strings in index order, after None, then the blobs as their lengths and their bytes
+        strings = list(self.strings)[1:]
+        text = SEPARATOR.join(strings)
+        if text.count(SEPARATOR) != max(len(strings) - 1, 0):
+            raise WireError("Strings with a NUL character cannot be sent on the wire")
+        raw_strings = text.encode()
+        head = _PREAMBLE.pack(WIRE_VERSION, msg_type, len(strings), len(raw_strings))
+        if not self.blobs:
+            return b"".join([head, raw_strings, _NO_BLOBS, self.body])
+        blob_lengths = list(map(len, self.blobs))
+        return b"".join(
+            [
+                head,
+                raw_strings,
+                _struct(f"!H{len(blob_lengths)}I").pack(len(blob_lengths), *blob_lengths),
+                *self.blobs,
+                self.body,
+            ]
+        )
+
+
+def _encode_idle_delta(delta: dict[str, Any]) -> bytes:
+    """A delta with no change, as ``_Writer`` encodes it, by two struct calls"""
+    raw = delta["level_key"].encode()
+    baseline = NO_SEQ if delta["baseline"] is None else delta["baseline"]
+    return (
+        _PREAMBLE.pack(WIRE_VERSION, MessageType.DELTA, 1, len(raw))
+        + raw
+        + _IDLE_DELTA_TAIL.pack(
+            0, delta["tick"], delta["time_ms"], delta["seq"], baseline, 1, 0, 0, 0, 0
+        )
+    )
+
+
+def encode(message: dict[str, Any]) -> bytes:
+    """Encode a message: a snapshot, a join, keys, portal or resync request, or a transfer"""
+    msg_type = message["type"]
+    if msg_type == "keys":
+        # the bitmask of the game keys, see ``inputs``
+        return _KEYS_MESSAGE.pack(
+            WIRE_VERSION, MessageType.KEYS, 0, 0, 0, message["seq"], message["mask"]
+        )
+    if (
+        msg_type == "delta"
+        and not (message["spawn"] or message["despawn"] or message["update"])
+        and not message["manifest"]
+        and type(message["level_key"]) is str
+        and SEPARATOR not in message["level_key"]
+    ):
+        return _encode_idle_delta(message)
+    writer = _Writer()
+    try:
+        if msg_type == "keyframe":
+            writer.snapshot(message)
+            return writer.finish(MessageType.KEYFRAME)
+        if msg_type == "delta":
+            writer.snapshot(message)
+            return writer.finish(MessageType.DELTA)
+        if msg_type == "join":
+            snapshot = message["snapshot"]
+            snapshot_type = (
+                MessageType.KEYFRAME if snapshot["type"] == "keyframe" else MessageType.DELTA
+            )
+            writer.body += _U16.pack(writer.string(message["player_id"]))
+            writer.body.append(snapshot_type)
+            writer.snapshot(snapshot)
+            return writer.finish(MessageType.JOIN)
+        if msg_type == "portal_request":
+            writer.body += _U16.pack(writer.string(message["target_level"]))
+            writer.body += _U16.pack(writer.string(message["exit_name"]))
+            return writer.finish(MessageType.PORTAL_REQUEST)
+        if msg_type == "resync":
+            return writer.finish(MessageType.RESYNC)
+        if msg_type == "transfer":
+            writer.body += _U16.pack(writer.string(message["target_level"]))
+            writer.body += _U16.pack(writer.string(message["exit_name"]))
+            writer.records(message["objects"])
+            return writer.finish(MessageType.TRANSFER)
+    except _Mismatch:
+        raise WireError(f"Message {msg_type} does not match its schema")
+    raise WireError(f"Unknown message type {msg_type}")
+
+
+class _Reader:
+    def __init__(self, data: Buffer) -> None:
+        self.data = data
+        self.offset = 0
+        version, msg_type, n_strings, n_bytes = self.unpack(_PREAMBLE)
+        if version != WIRE_VERSION:
+            raise WireError(f"Unsupported wire protocol version {version}")
+        self.msg_type = MessageType(msg_type)
+        self.strings: list[Optional[str]] = [None]  # indexed as ``_Writer.strings``
+        if n_strings:
+            self.strings += str(self.read(n_bytes), "utf-8").split(SEPARATOR)
+        if len(self.strings) != n_strings + 1 or not n_strings and n_bytes:
+            raise WireError("Inconsistent string table")
+        n_blobs = self.u16()
+        blob_lengths = self.unpack(_struct(f"!{n_blobs}I")) if n_blobs else ()
+        self.blobs = [_blob_cache.decode(bytes(self.read(n))) for n in blob_lengths]
+
+    def read(self, n: int) -> Buffer:
+        if self.offset + n > len(self.data):
+            raise WireError("Truncated message")
+        chunk = self.data[self.offset : self.offset + n]
+        self.offset += n
+        return chunk
+
+    def unpack(self, record: struct.Struct) -> tuple[Any, ...]:
+        values = record.unpack_from(self.data, self.offset)
+        self.offset += record.size
+        return values
+
+    def u16(self) -> int:
+        return self.unpack(_U16)[0]
+
+    def u32(self) -> int:
+        return self.unpack(_U32)[0]
+
+    def string(self, idx: int) -> Optional[str]:
+        return self.strings[idx]
+
+    def convert(self, kind: Kind, values: tuple[Any, ...]) -> Sequence[Any]:
+        if kind is Kind.STR:
+            return list(map(self.strings.__getitem__, values))
+        if kind is Kind.ANY:
+            return list(map(self.blobs.__getitem__, values))
+        if kind is Kind.DIRECTION:
+            return list(map(DIRECTIONS.__getitem__, values))
+        return values
+
+    def indexes(self, n: int) -> tuple[int, ...]:
+        return self.unpack(_struct(f"!{n}H")) if n else ()
+
+    def records(self) -> list[dict[str, Any]]:
+        obj_states: list[dict[str, Any]] = []
+        for _ in range(self.u32()):
+            mask, fallback, n = self.unpack(_GROUP)
+            layout = _layout(mask)
+            if fallback & ~mask:
+                raise WireError(f"Invalid fallback mask {fallback:#x}")
+            size, strings, blobs, directions = layout.tables(fallback)
+            # checked before compiling the struct of the rows, whose format grows with n
+            if n * size > len(self.data) - self.offset:
+                raise WireError("Truncated message")
+            rows = list(self.unpack(layout.record(fallback, n)))
+            for column in strings:
+                rows[column] = map(self.strings.__getitem__, rows[column])
+            for column in blobs:
+                rows[column] = map(self.blobs.__getitem__, rows[column])
+            for column in directions:
+                rows[column] = map(DIRECTIONS.__getitem__, rows[column])
+            names, template = layout.names, layout.template
+            for row in zip(*[iter(rows)] * len(names)):
+                obj_state = template.copy()  # faster than inserting the keys one by one
+                obj_state.update(zip(names, row))
+                obj_states.append(obj_state)
+        return obj_states
+
+    def snapshot(self, msg_type: MessageType) -> dict[str, Any]:
+        if msg_type is MessageType.KEYFRAME:
+            tick, time_ms, seq, level_idx = self.unpack(_KEYFRAME)
+            level_key = self.string(level_idx)
+            return {
+                "type": "keyframe",
+                "seq": seq,
+                "baseline": None,
+                "tick": tick,
+                "time_ms": time_ms,
+                "level_key": level_key,
+                "objects": self.records(),
+                "manifest": self.manifest(),
+            }
+        tick, time_ms, seq, baseline, level_idx = self.unpack(_DELTA)
+        level_key = self.string(level_idx)
+        spawn = self.records()
+        despawn = self.convert(Kind.STR, self.indexes(self.u32()))
+        update = {changed.pop("id"): changed for changed in self.records()}
+        manifest = self.manifest()
+        return {
+            "type": "delta",
+            "seq": seq,
+            "baseline": None if baseline == NO_SEQ else baseline,
+            "tick": tick,
+            "time_ms": time_ms,
+            "level_key": level_key,
+            "spawn": spawn,
+            "despawn": list(despawn),
+            "update": update,
+            "manifest": manifest,
+        }
+
+    def manifest(self) -> dict[str, Any]:
+        n = self.u16()
+        if not n:
+            return {}
+        keys = self.convert(Kind.STR, self.indexes(n))
+        tables = self.convert(Kind.ANY, self.indexes(n * len(SPRITE_FIELDS)))
+        it = iter(tables)
+        return {key: dict(zip(SPRITE_FIELDS, it)) for key in keys}
+
+
+def message_type(data: Buffer) -> MessageType:
+    """The type of an encoded message, without decoding it"""
+    if len(data) < _HEADER.size or data[0] != WIRE_VERSION:
+        raise WireError("Not a message of this wire protocol version")
+    try:
+        return MessageType(data[1])
+    except ValueError as e:
+        raise WireError(f"Malformed message: {e}") from e
+
+
+def _decode_fixed(data: Buffer) -> Optional[dict[str, Any]]:
+    """The keys and the idle deltas, decoded from their fixed layout. None for other messages."""
+    size = len(data)
+    if size == _KEYS_MESSAGE.size:
+        version, msg_type, n_strings, n_bytes, n_blobs, seq, mask = _KEYS_MESSAGE.unpack_from(data)
+        if version == WIRE_VERSION and msg_type == MessageType.KEYS:
+            if n_strings or n_bytes or n_blobs:
+                return None
+            return {"type": "keys", "seq": seq, "mask": mask}
+    if size < _PREAMBLE.size + _IDLE_DELTA_TAIL.size:
+        return None
+    version, msg_type, n_strings, n_bytes = _PREAMBLE.unpack_from(data)
+    if (
+        version != WIRE_VERSION
+        or msg_type != MessageType.DELTA
+        or n_strings != 1
+        or size != _PREAMBLE.size + n_bytes + _IDLE_DELTA_TAIL.size
+    ):
+        return None
+    n_blobs, tick, time_ms, seq, baseline, level_idx, *counts = _IDLE_DELTA_TAIL.unpack_from(
+        data, size - _IDLE_DELTA_TAIL.size
+    )
+    if n_blobs or level_idx != 1 or any(counts):
+        return None
+    level_key = str(data[_PREAMBLE.size : size - _IDLE_DELTA_TAIL.size], "utf-8")
+    if SEPARATOR in level_key:
+        return None
+    return {
+        "type": "delta",
+        "seq": seq,
+        "baseline": None if baseline == NO_SEQ else baseline,
+        "tick": tick,
+        "time_ms": time_ms,
+        "level_key": level_key,
+        "spawn": [],
+        "despawn": [],
+        "update": {},
+        "manifest": {},
+    }
+
+
+def decode(data: Buffer) -> dict[str, Any]:
+    """Decode a message encoded by ``encode``. Raise ``WireError`` on malformed messages."""
+    try:
+        message = _decode_fixed(data)
+        if message is not None:
+            return message
+        reader = _Reader(data)
+        msg_type = reader.msg_type
+        if msg_type is MessageType.KEYFRAME or msg_type is MessageType.DELTA:
+            message = reader.snapshot(msg_type)
+        elif msg_type is MessageType.JOIN:
+            player_id = reader.string(reader.u16())
+            snapshot = reader.snapshot(MessageType(reader.unpack(_U8)[0]))
+            message = {"type": "join", "player_id": player_id, "snapshot": snapshot}
+        elif msg_type is MessageType.KEYS:
+            raise WireError("Malformed keys message")  # only sent with their fixed layout
+        elif msg_type is MessageType.PORTAL_REQUEST:
+            target_level = reader.string(reader.u16())
+            exit_name = reader.string(reader.u16())
+            message = {
+                "type": "portal_request",
+                "target_level": target_level,
+                "exit_name": exit_name,
+            }
+        elif msg_type is MessageType.TRANSFER:
+            target_level = reader.string(reader.u16())
+            exit_name = reader.string(reader.u16())
+            message = {
+                "type": "transfer",
+                "target_level": target_level,
+                "exit_name": exit_name,
+                "objects": reader.records(),
+            }
+        elif msg_type is MessageType.RESYNC:
+            message = {"type": "resync"}
+        else:
+            raise WireError("Pickled messages are only accepted from the server")
+    except (struct.error, IndexError, KeyError, TypeError, ValueError, RecursionError) as e:
+        if isinstance(e, WireError):
+            raise
+        raise WireError(f"Malformed message: {e}") from e
+    if reader.offset != len(data):
+        raise WireError("Trailing bytes in message")
+    return message
+
+
+def encode_from_server(message: dict[str, Any]) -> bytes:
+    """
+    Encode a message of the server. The snapshots are pickled, unless ``SNAPSHOT_CODEC`` is
+    ``wire``: pickle is faster, the codec is smaller. The other messages always use the codec.
+    """
+    if SNAPSHOT_CODEC == "pickle" and message["type"] in _SNAPSHOT_TYPES:
+        return _HEADER.pack(WIRE_VERSION, MessageType.PICKLED) + pickle.dumps(
+            message, pickle.HIGHEST_PROTOCOL
+        )
+    return encode(message)
+
+
+def decode_from_server(data: Buffer) -> dict[str, Any]:
+    """Decode a message of the server, pickled or not. The server is trusted, unlike the clients."""
+    if message_type(data) is not MessageType.PICKLED:
+        return decode(data)
+    try:
+        return pickle.loads(data[_HEADER.size :])
+    except Exception as e:  # anything a corrupted pickle raises
+        raise WireError(f"Malformed pickled message: {e}") from e
@@ -5,17 +5,20 @@ import time
 import uuid
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, cast
 
 import pygame
 
 from ..actions.volition import VolitionEngine
 from ..consts import TILE_SIZE, Direction
 from ..interactions.command import InteractionCommand
-from ..interactions.interactions import ContactInteractionMixin
+from ..interactions.dispatch import dispatch
+from ..interactions.interactions import ContactInteractionMixin, InteractionMixin
 from ..interactions.scheduler import InteractionScheduler
 from ..internal.state import InternalState
 from ..logger import Logger
+from ..sim_clock import sim_clock
+from ..tracer import object_args, tracer
 from ..utils import IdentitySetList
 
 if TYPE_CHECKING:
@@ -24,6 +27,9 @@ if TYPE_CHECKING:
 
 # ---------- composite pattern ------------
 class GameObject:
+    # static objects never change their replicated state once registered: it is sent only once
+    is_static = False
+
     def __init__(self, x: int, y: int, name: str, health: float):
         """
         x, y are the positions
@@ -80,6 +86,8 @@ class GameObject:
         self.equilibrium_temperature: float = 30
         self.is_encumbrant: bool = False
         self.ignore_walkable: bool = False
+        # sleeping objects are not prepared nor updated by the level, see ``Level.update_sleeping``
+        self.is_sleeping: bool = False
 
     def __post_init__(self) -> None:
         if hasattr(self, "create_movement_sprites"):
@@ -107,7 +115,10 @@ class GameObject:
         if self.is_prepare_just_done:
             self.is_prepare_just_done = False
             self.logger.info(f"Update for {self.__class__.__name__}")
-            self.volition.update()
+            if tracer.enabled:
+                tracer.call("volition.update", "volition", object_args(self), self.volition.update)
+            else:
+                self.volition.update()
             self.scheduler.update()  # this runs all the interaction callables
             # animation flags:
             if self.prev_x != self.x or self.prev_y != self.y:
@@ -156,7 +167,7 @@ class GameObject:
         return False
 
     def prepare(self, near_objs: Any, game: "Game") -> bool:
-        now = pygame.time.get_ticks()  # in ms
+        now = sim_clock.get_ticks()  # in ms
         interval = 1000 / self.actions_per_second
         tick = int(now // interval)
 
@@ -167,13 +178,47 @@ class GameObject:
             self.logger.info(f"Preparation for {self.__class__.__name__}")
             # prepare interactions
             for near_obj in near_objs:
-                self.scheduler.add(InteractionCommand(self, near_obj, game))
-            self.volition.prepare(game)
+                # skip the pairs for which no interaction mixin would ever produce a callable
+                if dispatch.handlers_for(self.__class__, near_obj.__class__):
+                    self.scheduler.add(InteractionCommand(self, near_obj, game))
+            if tracer.enabled:
+                args = object_args(self)
+                tracer.call("volition.prepare", "volition", args, self.volition.prepare, game)
+            else:
+                self.volition.prepare(game)
             self.internal_state.update(near_objs)
             self.is_prepare_just_done = True
             return True
         return False
 
+    def is_mover(self) -> bool:
+        """Objects that are moving or may act on their neighbours, hence keeping them awake"""
+        return (
+            self.inertia > 0.1
+            or self.prev_x != self.x
+            or self.prev_y != self.y
+            or self.volition.can_act()
+        )
+
+    def is_at_rest(self) -> bool:
+        """
+        Whether the object can be put to sleep: no inertia, no pending actions nor interactions,
+        not attached to other objects and all its evolutions at equilibrium.
+        """
+        return (
+            not self.is_mover()
+            and self.is_standing
+            and not self.volition.list_of_actions
+            and not self.scheduler.queue
+            and self.parent is None
+            and len(self.children) == 0
+            and all(
+                # each mixin of the class, including the overridden ones, is asked in turn
+                mixin.is_at_equilibrium(cast(InteractionMixin, self))
+                for mixin in dispatch.mixins_of(self.__class__)
+            )
+        )
+
     def distance(self, other: Any) -> float:
         return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
 
@@ -4,12 +4,13 @@
 
 from collections import defaultdict
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import pygame
 
-pygame.init()
-pygame.display.set_mode((1, 1))
+from ..asset_mode import asset_mode
+
+asset_mode.init_display()  # the sprites are converted to the display format
 
 from ..actions.actions import LimbControlMixin, MovementMixin, SpeechMixin
 from ..animations.animations import (
@@ -20,6 +21,7 @@ from ..animations.animations import (
     StandingAnimationMixin,
 )
 from ..animations.render import RenderMixin
+from ..animations.sprite_cache import sprite_cache
 from ..consts import BLACK, TILE_SIZE, WHITE, Direction
 from ..interactions.evolution import (
     DamageHealthByInertia,
@@ -242,6 +244,8 @@ class FireBall(
 
 @registry.register
 class Ground(GameObject, StandingAnimationMixin, RenderMixin, EncumbranceMixin):
+    is_static = True
+
     def __init__(self, x: int, y: int, name: str, health: float, tile_name: str, **kwargs: Any):
         super().__init__(x, y, name, health)
         self.z_level = 0.0
@@ -681,11 +685,12 @@ class Cow(
         self.__post_init__()  # do not forget
 
         # Load sound
-        try:
-            self.make_sound = pygame.mixer.Sound("assets/sounds/cow_moo.wav")
-        except pygame.error:
-            self.logger.info("Could not load sound. Probably mixer not initialised.")
-            self.make_sound = None  # type: ignore
+        self.make_sound = None  # type: ignore
+        if not asset_mode.headless:
+            try:
+                self.make_sound = pygame.mixer.Sound("assets/sounds/cow_moo.wav")
+            except pygame.error:
+                self.logger.info("Could not load sound. Probably mixer not initialised.")
 
 
 @registry.register
@@ -949,6 +954,9 @@ class Baloon(
     RenderMixin,
     DeathMixin,
 ):
+    padding = 10
+    line_spacing = 4  # Space between lines
+
     def __init__(self, x: int, y: int, name: str, health: float, speech: str, **kwargs: Any):
         super().__init__(x, y, name, health)
         self.speech = speech
@@ -962,27 +970,50 @@ class Baloon(
         self.__post_init__()  # do not forget
 
     def create_movement_sprites(self) -> None:
+        surface = self.get_balloon_surface()
         self.movement_sprites = {
-            Direction.UP: [self.make_balloon_surface()],
-            Direction.DOWN: [self.make_balloon_surface()],
-            Direction.LEFT: [self.make_balloon_surface()],
-            Direction.RIGHT: [self.make_balloon_surface()],
+            Direction.UP: [surface],
+            Direction.DOWN: [surface],
+            Direction.LEFT: [surface],
+            Direction.RIGHT: [surface],
         }
 
     def create_standing_sprites(self) -> None:
+        surface = self.get_balloon_surface()
         self.standing_sprites = [
             {
-                Direction.UP: [self.make_balloon_surface()],
-                Direction.DOWN: [self.make_balloon_surface()],
-                Direction.LEFT: [self.make_balloon_surface()],
-                Direction.RIGHT: [self.make_balloon_surface()],
+                Direction.UP: [surface],
+                Direction.DOWN: [surface],
+                Direction.LEFT: [surface],
+                Direction.RIGHT: [surface],
             }
         ]
 
+    def get_balloon_surface(self) -> Optional[pygame.Surface]:
+        """Balloons with the same speech share the same surface. Only measured in headless mode"""
+        if asset_mode.headless:
+            self.sprite_size_y = 100 + self.measure_balloon()[1]
+            return None
+        surface = sprite_cache.get_or_create(
+            self, ("balloon", self.speech), self.make_balloon_surface
+        )
+        self.sprite_size_y = 100 + surface.get_height()
+        return surface
+
+    def measure_balloon(self) -> tuple[int, int]:
+        """The size of the balloon surface, without drawing it"""
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.SysFont(None, 18)
+        sizes = [font.size(line) for line in self.speech.split("\n")]
+        width = max(w for w, _ in sizes) + 2 * self.padding
+        height = sum(h for _, h in sizes) + self.line_spacing * (len(sizes) - 1) + 2 * self.padding
+        return width, height
+
     def make_balloon_surface(self) -> pygame.Surface:
         font = pygame.font.SysFont(None, 18)
-        padding = 10
-        line_spacing = 4  # Space between lines
+        padding = self.padding
+        line_spacing = self.line_spacing
 
         # Split text into lines
         lines = self.speech.split("\n")
@@ -8,8 +8,9 @@ from typing import Any
 
 import pygame
 
-pygame.init()
-pygame.display.set_mode((1, 1))
+from ..asset_mode import asset_mode
+
+asset_mode.init_display()  # the sprites are converted to the display format
 
 from ..actions.actions import LimbControlMixin, MovementMixin, SpeechMixin
 from ..animations.animations import (
@@ -1,5 +1,6 @@
 from typing import TYPE_CHECKING, Any, Type
 
+from ..interactions.dispatch import dispatch
 from ..logger import Logger
 
 if TYPE_CHECKING:
@@ -14,6 +15,7 @@ class Registry:
     def register(self, cls: type) -> type:
         self.logger.info(f"About to register {cls.__name__}")
         self._registry[cls.__name__] = cls
+        dispatch.compile(cls)  # precompute the interaction handlers of the class
         return cls
 
     def create(self, cls_name: str, *args: Any, **kwargs: Any) -> "GameObject":
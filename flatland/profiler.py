@@ -0,0 +1,177 @@
+"""
+Per-phase profiler of the ticks, built as a process-wide singleton.
+
+The phases of a tick (``reset_is_walkable``, ``set_volume``, ``prepare``, ``update``,
+``correct_periodic_positions``, ``render`` and, on the server, ``serialize`` and ``broadcast``)
+are timed per level. The object loops of ``prepare``, ``update`` and ``render`` are also timed per
+object class. The last ``window`` durations of each series give rolling percentiles.
+
+It is enabled with ``FLATLAND_PROFILE=true``, or ``profiler.enabled = True``, and by the
+``tracer``, to which the timings are also sent as spans. When disabled, a phase costs one
+attribute check. With ``FLATLAND_PROFILE_DUMP_S`` set, the summary is printed at that period by
+the game and server loops, see ``maybe_dump``.
+"""
+
+import functools
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Optional, TypeVar
+
+from .tracer import object_args, tracer
+
+WINDOW = 1000  # durations kept per series for the percentiles
+
+F = TypeVar("F", bound=Callable[..., Any])
+SeriesKey = tuple[str, str, Optional[str]]  # level key, phase, object class (None: whole phase)
+
+
+class Series:
+    __slots__ = ("durations", "count", "total")
+
+    def __init__(self, window: int = WINDOW) -> None:
+        self.durations: deque[float] = deque(maxlen=window)  # seconds
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, duration: float) -> None:
+        self.durations.append(duration)
+        self.count += 1
+        self.total += duration
+
+    def percentile(self, q: float) -> float:
+        """In ms, over the last durations"""
+        durations = sorted(self.durations)
+        if not durations:
+            return 0.0
+        return 1000 * durations[min(len(durations) - 1, int(q * len(durations)))]
+
+
+class TickProfiler:
+    def __init__(self, window: int = WINDOW) -> None:
+        self.enabled = os.getenv("FLATLAND_PROFILE", "false").lower() == "true" or tracer.enabled
+        self.dump_every_s = float(os.getenv("FLATLAND_PROFILE_DUMP_S", "0"))  # 0: never
+        self.window = window
+        self.series: dict[SeriesKey, Series] = {}
+        self.last_dump = time.monotonic()
+
+    def record(
+        self, level_key: str, phase: str, duration: float, cls_name: Optional[str] = None
+    ) -> None:
+        key = (level_key, phase, cls_name)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series.setdefault(key, Series(self.window))
+        series.add(duration)
+
+    def phase(self, level_key: str, phase: str) -> ContextManager[None]:
+        """A context timing its block, if enabled"""
+        if not self.enabled:
+            return _NOT_TIMED
+        return _Timed(self, level_key, phase)
+
+    def call(self, level_key: str, phase: str, obj: Any, method: Callable, *args: Any) -> Any:
+        """Call a method of an object, timed under its class"""
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.finish(level_key, phase, started, obj)
+
+    def finish(self, level_key: str, phase: str, started: float, obj: Any = None) -> None:
+        """Record a phase, or the part of an object in it, started at ``started``"""
+        duration = time.perf_counter() - started
+        if obj is None:
+            self.record(level_key, phase, duration)
+            if tracer.enabled:
+                tracer.complete(phase, "phase", started, duration, {"level": level_key})
+        else:
+            self.record(level_key, phase, duration, obj.__class__.__name__)
+            if tracer.enabled:
+                args = {"level": level_key, **object_args(obj)}
+                tracer.complete(f"{phase} {args['class']}", "object", started, duration, args)
+
+    def summary(self, level_key: Optional[str] = None) -> list[dict[str, Any]]:
+        """The rolling percentiles of each series, in ms, the most expensive first"""
+        rows = [
+            {
+                "level": key[0],
+                "phase": key[1],
+                "class": key[2],
+                "count": series.count,
+                "total_ms": 1000 * series.total,
+                "p50_ms": series.percentile(0.5),
+                "p95_ms": series.percentile(0.95),
+                "p99_ms": series.percentile(0.99),
+                "max_ms": series.percentile(1.0),
+            }
+            for key, series in list(self.series.items())
+            if level_key is None or key[0] == level_key
+        ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def format_summary(self, level_key: Optional[str] = None, limit: int = 30) -> str:
+        lines = [
+            f"{'level':<12}{'phase':<28}{'class':<20}{'count':>8}"
+            f"{'total ms':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        ]
+        for row in self.summary(level_key)[:limit]:
+            lines.append(
+                f"{row['level']:<12}{row['phase']:<28}{row['class'] or '':<20}{row['count']:>8}"
+                f"{row['total_ms']:>11.1f}{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}"
+                f"{row['p99_ms']:>9.3f}{row['max_ms']:>9.3f}"
+            )
+        return "\n".join(lines)
+
+    def maybe_dump(self) -> None:
+        """Print the summary if the dump period elapsed. Called once per tick by the loops."""
+        if not self.enabled or not self.dump_every_s:
+            return
+        now = time.monotonic()
+        if now - self.last_dump >= self.dump_every_s:
+            self.last_dump = now
+            print(self.format_summary(), flush=True)
+
+    def reset(self) -> None:
+        self.series.clear()
+
+
+class _Timed:
+    __slots__ = ("profiler", "level_key", "phase", "started")
+
+    def __init__(self, profiler: TickProfiler, level_key: str, phase: str) -> None:
+        self.profiler = profiler
+        self.level_key = level_key
+        self.phase = phase
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.profiler.finish(self.level_key, self.phase, self.started)
+
+
+_NOT_TIMED: ContextManager[None] = nullcontext()
+
+
+def profiled(phase: str) -> Callable[[F], F]:
+    """Time a method of ``Level`` as a phase of its level"""
+
+    def decorator(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(level: Any, *args: Any, **kwargs: Any) -> Any:
+            if not profiler.enabled:
+                return method(level, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(level, *args, **kwargs)
+            finally:
+                profiler.finish(level.level_key, phase, started)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+profiler = TickProfiler()
@@ -1,11 +1,62 @@
 """
-This is the server entry point
+This is the server entry point.
+
+The server runs without graphics nor audio assets, unless ``FLATLAND_HEADLESS=false`` is set.
 """
 
+import argparse
+import os
+
+os.environ.setdefault("FLATLAND_HEADLESS", "true")  # before the objects are imported
+
 import pygame
 
+from flatland.multiplayer.async_server import AsyncGameServer
+from flatland.multiplayer.interest import InterestArea
 from flatland.multiplayer.server import GameServer
+from flatland.multiplayer.sharding import run_sharded
+from flatland.multiplayer.tick_scheduler import TICK_RATE_HZ
 from flatland.world.world import world
 
 if __name__ == "__main__":
-    GameServer(world).run()
+    parser = argparse.ArgumentParser(description="Run Flatland Game Server")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=12345, help="Server port")
+    parser.add_argument(
+        "--threads", action="store_true", help="Use a thread per client instead of asyncio"
+    )
+    parser.add_argument(
+        "--interest-radius",
+        type=float,
+        default=None,
+        help="Only send the objects within this many tiles of the player (default: the screen)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of threads updating the levels in parallel"
+    )
+    parser.add_argument(
+        "--tick-rate", type=float, default=TICK_RATE_HZ, help="World updates per second"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="Split the levels over this many worker processes, behind a coordinator",
+    )
+    args = parser.parse_args()
+
+    if args.shards:
+        run_sharded(
+            world,
+            args.shards,
+            args.host,
+            args.port,
+            args.interest_radius,
+            workers=args.workers,
+            tick_rate_hz=args.tick_rate,
+        )
+    else:
+        server_cls = GameServer if args.threads else AsyncGameServer
+        interest = InterestArea(radius=args.interest_radius)
+        server = server_cls(world, interest, workers=args.workers, tick_rate_hz=args.tick_rate)
+        server.run(args.host, args.port)
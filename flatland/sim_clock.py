@@ -0,0 +1,85 @@
+"""
+The simulation clock, built as a process-wide proxy to an injectable clock.
+
+By default the simulation follows the pygame wall clock. For headless runs (AI training,
+regression replays, CI) a ``FixedStepClock`` can be injected: logical time then only advances
+when the simulation is stepped, hence the world can be fast-forwarded deterministically.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, Protocol, Union
+
+import pygame
+
+from .asset_mode import asset_mode
+
+
+class Clock(Protocol):
+    def get_ticks(self) -> int:
+        """Milliseconds elapsed since the start of the simulation"""
+        ...
+
+
+class WallClock:
+    def __init__(self) -> None:
+        self.start = time.monotonic()
+
+    def get_ticks(self) -> int:
+        if asset_mode.headless:  # pygame is not initialised, its clock does not run
+            return int((time.monotonic() - self.start) * 1000)
+        return pygame.time.get_ticks()
+
+
+class FixedStepClock:
+    def __init__(self, step_ms: int = 100, start_ms: int = 0) -> None:
+        self.step_ms = step_ms
+        self.now = start_ms
+
+    def get_ticks(self) -> int:
+        return self.now
+
+    def advance(self, n_steps: int = 1) -> None:
+        self.now += n_steps * self.step_ms
+
+
+class SimulationClock:
+    def __init__(self) -> None:
+        self.clock: Union[WallClock, FixedStepClock, Clock] = WallClock()
+
+    def get_ticks(self) -> int:
+        return self.clock.get_ticks()
+
+    def set_clock(self, clock: Union[WallClock, FixedStepClock, Clock]) -> None:
+        self.clock = clock
+
+    @property
+    def is_fixed_step(self) -> bool:
+        return isinstance(self.clock, FixedStepClock)
+
+    def advance(self, n_steps: int = 1) -> None:
+        if not isinstance(self.clock, FixedStepClock):
+            raise RuntimeError(
+                "Only a fixed-step clock can be advanced: use `sim_clock.fixed_step()` first"
+            )
+        self.clock.advance(n_steps)
+
+    @contextmanager
+    def fixed_step(self, step_ms: int = 100) -> Iterator[FixedStepClock]:
+        """
+        Temporarily replace the clock with a fixed-step one, starting from the current time.
+        If a fixed-step clock is already in use, it is kept.
+        """
+        previous = self.clock
+        if isinstance(previous, FixedStepClock):
+            yield previous
+            return
+        clock = FixedStepClock(step_ms=step_ms, start_ms=previous.get_ticks())
+        self.clock = clock
+        try:
+            yield clock
+        finally:
+            self.clock = previous
+
+
+sim_clock = SimulationClock()
@@ -0,0 +1,140 @@
+"""
+Trace of the simulation in the Chrome trace event format, built as a process-wide singleton.
+
+The trace holds a span per tick, per phase of the ticks (see ``profiler``), per object prepared,
+updated and rendered, per ``VolitionEngine.prepare`` and ``update``, and per interaction executed,
+named after the classes of the initiator and the target. The objects are identified by the
+``class`` and ``id`` args of their spans. The file loads offline in ``chrome://tracing`` and in
+Perfetto (https://ui.perfetto.dev), where the threads of the parallel levels get a track each.
+
+It is enabled with ``FLATLAND_TRACE=<path>``, and the trace is written at exit; ``{pid}`` in the
+path is replaced by the process id. Or with ``tracer.start()`` and ``tracer.save(path)``. Only the
+last ``max_events`` spans are kept.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Optional
+
+MAX_EVENTS = 1_000_000  # about 200 MB of memory at most
+
+
+def object_args(obj: Any) -> dict[str, Any]:
+    return {"class": obj.__class__.__name__, "id": obj.id}
+
+
+class Tracer:
+    def __init__(self, max_events: int = MAX_EVENTS) -> None:
+        self.path = os.getenv("FLATLAND_TRACE") or None
+        self.enabled = self.path is not None  # the profiler is then enabled too
+        self.events: deque[dict[str, Any]] = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        if self.enabled:
+            atexit.register(self.save)
+
+    def start(self) -> None:
+        """Record the spans, and time the phases of the ticks for them"""
+        from .profiler import profiler
+
+        self.enabled = True
+        profiler.enabled = True
+
+    def stop(self) -> None:
+        self.enabled = False
+
+    def complete(
+        self,
+        name: str,
+        cat: str,
+        started: float,
+        duration: float,
+        args: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """Add a span, from its ``time.perf_counter`` start and its duration in seconds"""
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (started - self.origin) * 1e6,
+            "dur": duration * 1e6,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def span(self, name: str, cat: str, args: Optional[dict[str, Any]] = None) -> ContextManager:
+        """A context tracing its block, if enabled"""
+        if not self.enabled:
+            return _NOT_TRACED
+        return _Span(self, name, cat, args)
+
+    def call(self, name: str, cat: str, args: dict[str, Any], function: Callable, *a: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return function(*a)
+        finally:
+            self.complete(name, cat, started, time.perf_counter() - started, args)
+
+    def trace_events(self) -> list[dict[str, Any]]:
+        """The spans, with the names of the process and of the threads that recorded them"""
+        events = list(self.events)
+        metadata = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": 0,
+                "args": {"name": "flatland"},
+            }
+        ]
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in sorted({event["tid"] for event in events}):
+            metadata.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"name": threads.get(tid, str(tid))},
+                }
+            )
+        return metadata + events
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the trace to: set FLATLAND_TRACE or give one")
+        path = path.replace("{pid}", str(self.pid))  # a file per process, e.g. per shard
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        os.replace(f"{path}.tmp", path)  # never a truncated trace
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "started")
+
+    def __init__(self, tracer: Tracer, name: str, cat: str, args: Optional[dict[str, Any]]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        started = self.started
+        self.tracer.complete(self.name, self.cat, started, time.perf_counter() - started, self.args)
+
+
+_NOT_TRACED: ContextManager[None] = nullcontext()
+
+tracer = Tracer()
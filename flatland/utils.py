@@ -13,13 +13,8 @@ def move_in(self: Any, direction: Direction) -> bool:
             (dx, dy) = (1, 0)
         case Direction.LEFT:
             (dx, dy) = (-1, 0)
-    try:
-        grd = [
-            ground
-            for ground in self.ground_objs_list
-            if ground.x == self.x + dx and ground.y == self.y + dy
-        ][0]
-    except IndexError:
+    grd = self.ground_grid.get(self.x + dx, self.y + dy) if self.ground_grid is not None else None
+    if grd is None:
         self.logger.info(f"{self.__class__.__name__} cannot move outside ground")
         self.inertia = 0.0
         return False
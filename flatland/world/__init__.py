@@ -7,4 +7,13 @@ To build a level, simply configure its yaml file. Do not forget to connect paren
 for example the Cow with its CowShadow.
 """
 
-from . import build_tile_map, level, level_factory, register_to_level, world
+from . import (
+    build_tile_map,
+    ground_grid,
+    level,
+    level_compiler,
+    level_factory,
+    register_to_level,
+    spatial_index,
+    world,
+)
@@ -0,0 +1,94 @@
+"""
+Level-owned 2D grid of the Ground tiles, shared by all the objects of the level that need to move.
+The grid also holds the walkability map of the level.
+"""
+
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import numpy as np
+
+from ..consts import MAX_X, MAX_Y
+from ..logger import Logger
+
+if TYPE_CHECKING:
+    from ..objects.base_objects import GameObject
+    from ..objects.items import Ground
+
+
+class GroundGrid:
+    """
+    O(1) lookup of the Ground tile at a given coordinate.
+    The grid is updated incrementally when tiles are registered to or unregistered from the level.
+
+    Arrays are indexed as ``[y, x]``: ``walkable`` is False where an encumbrant object stands,
+    ``has_ground`` is True where there is a tile.
+    """
+
+    def __init__(self, width: int = MAX_X, height: int = MAX_Y) -> None:
+        self.width = width
+        self.height = height
+        self._grid: list[list[Optional["Ground"]]] = [[None] * width for _ in range(height)]
+        self.walkable = np.ones((height, width), dtype=bool)
+        self.has_ground = np.zeros((height, width), dtype=bool)
+        self.logger = Logger()
+
+    def _in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def add(self, tile: "Ground") -> None:
+        x, y = int(tile.x), int(tile.y)
+        if not self._in_bounds(x, y):
+            self.logger.info(f"Ground tile at ({x}, {y}) is outside the grid and is ignored")
+            return
+        if self._grid[y][x] is None:  # the first tile registered at a location wins
+            self._grid[y][x] = tile
+            self.has_ground[y, x] = True
+            tile.walkability_map = self.walkable  # ``tile.is_walkable`` becomes a view
+
+    def remove(self, tile: "Ground") -> None:
+        x, y = int(tile.x), int(tile.y)
+        if self._in_bounds(x, y) and self._grid[y][x] is tile:
+            self._grid[y][x] = None
+            self.has_ground[y, x] = False
+            tile.walkability_map = None
+
+    def get(self, x: int, y: int) -> Optional["Ground"]:
+        """Return the tile at ``(x, y)`` or ``None`` if there is no ground there."""
+        x, y = int(x), int(y)
+        if not self._in_bounds(x, y):
+            return None
+        return self._grid[y][x]
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        """Whether there is a tile at ``(x, y)`` and it is not encumbered"""
+        x, y = int(x), int(y)
+        return self._in_bounds(x, y) and bool(self.has_ground[y, x] and self.walkable[y, x])
+
+    def walkability_map(self) -> np.ndarray:
+        """Boolean ``[y, x]`` map of the cells that can be walked on, e.g. for path finding"""
+        return self.has_ground & self.walkable
+
+    def update_walkability(self, objs: Iterable["GameObject"]) -> None:
+        """
+        Rebuild the walkability map in a single vectorized pass from the positions of the
+        encumbrant objects, including the encumbrant cells of extended objects.
+        """
+        cells: list[tuple[float, float]] = []
+        for obj in objs:
+            if obj.is_encumbrant:
+                cells.append((obj.x, obj.y))
+            if hasattr(obj, "encumbered_cells"):
+                cells.extend(obj.encumbered_cells())
+        self.walkable.fill(True)
+        if not cells:
+            return
+        pos = np.rint(np.asarray(cells, dtype=float)).astype(int)
+        xs, ys = pos[:, 0], pos[:, 1]
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        self.walkable[ys[inside], xs[inside]] = False
+
+    def __iter__(self):
+        for row in self._grid:
+            for tile in row:
+                if tile is not None:
+                    yield tile
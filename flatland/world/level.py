@@ -2,18 +2,36 @@
 world
 """
 
-from typing import TYPE_CHECKING, Any
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Optional
 
 import pygame
 
 from ..consts import MAX_X, MAX_Y
 from ..logger import Logger
+from ..profiler import profiled, profiler
+from ..sim_clock import sim_clock
+from .ground_grid import GroundGrid
+from .spatial_index import SpatialIndex
 
 if TYPE_CHECKING:
     from ..__main__ import Game
     from ..objects.base_objects import GameObject
     from ..objects.items import Player
 
+# the sprite tables are the same for all the objects of a class (and tile): they are not part of
+# the object states, but of the sprite manifest of the level
+SPRITE_FIELDS = (
+    "movement_sprites_locations",
+    "standing_sprites_locations",
+    "dying_sprites_locations",
+    "push_sprites_locations",
+)
+
+
+def sprite_key(cls_name: str, tile_name: Optional[str]) -> str:
+    return cls_name if tile_name is None else f"{cls_name}/{tile_name}"
+
 
 # --------------------- implemented via observer pattern ----------------
 class Level:
@@ -22,16 +40,37 @@ class Level:
     Via the observer method, the world loops through the objects and updates them.
     """
 
-    def __init__(self, level_key: str = "") -> None:
+    def __init__(self, level_key: str = "", interaction_radius: float = 2.0) -> None:
         self._observers: list["GameObject"] = []
         self._scheduled_to_die: list[tuple["GameObject", int, int]] = []
         self.logger = Logger()
         self.level_key = level_key
+        # objects only interact with (and perceive) the objects within this radius,
+        # or within their vision/hearing range if larger
+        self.interaction_radius = interaction_radius
+        self.spatial_index = SpatialIndex()
+        self.ground_grid = GroundGrid()
+        # the objects that are not sleeping, in registration order. Rebuilt lazily when dirty
+        self._awake: list["GameObject"] = []
+        self._awake_dirty = False
+        # the states of the static objects are read once, see ``get_serializable_state``
+        self._static_states: dict[str, dict[str, Any]] = {}
+        self.sprite_manifest: dict[str, dict[str, Any]] = {}  # sprite key -> sprite tables
 
     def register(self, obj: "GameObject") -> None:
         if obj not in self._observers:
             self.logger.info(f"Register to world {obj}")
             self._observers.append(obj)
+            obj.is_sleeping = False
+            self._awake_dirty = True
+            self.spatial_index.insert(obj)
+            if obj.__class__.__name__ == "Ground":
+                self.ground_grid.add(obj)  # type: ignore
+            if hasattr(obj, "set_ground_grid"):
+                obj.set_ground_grid(self.ground_grid)
+            key = sprite_key(obj.__class__.__name__, getattr(obj, "tile_name", None))
+            if key not in self.sprite_manifest:
+                self.sprite_manifest[key] = {f: getattr(obj, f, None) for f in SPRITE_FIELDS}
 
     def send_keys_to_user(self, keys) -> None:
         for observer in self._observers:
@@ -39,53 +78,153 @@ class Level:
                 observer.get_pressed_keys(keys)
 
     def get_ground_objs(self, game: "Game"):
-        """This is to allow movement"""
+        """
+        This is to allow movement. Objects are bound to the level ground grid when they
+        are registered, hence calling this is only needed if the grid was swapped.
+        """
         for obj in self._observers:
-            if hasattr(obj, "get_ground_objs"):
-                obj.get_ground_objs(game)
+            if hasattr(obj, "set_ground_grid"):
+                obj.set_ground_grid(self.ground_grid)
 
     def unregister(self, obj: "GameObject") -> None:
         if obj in self._observers:
             self._observers.remove(obj)
+            self._awake_dirty = True
+            self.spatial_index.remove(obj)
+            self._static_states.pop(obj.id, None)
+            if obj.__class__.__name__ == "Ground":
+                self.ground_grid.remove(obj)  # type: ignore
+
+    def get_near_objs(
+        self, obj: "GameObject", radius: Optional[float] = None
+    ) -> list["GameObject"]:
+        """
+        Return the objects within ``radius`` of ``obj`` (``obj`` included).
+        If ``radius`` is not given, the largest between the level interaction radius and
+        the vision and hearing ranges of ``obj`` is used.
+        """
+        if radius is None:
+            radius = max(self.interaction_radius, obj.vision_range or 0, obj.hearing_range or 0)
+        return self.spatial_index.query(obj.x, obj.y, radius)
 
+    @profiled("set_volume")
     def set_volume(self, player: "Player") -> None:
         for obj in self._observers:
             if hasattr(obj, "set_volume"):
                 obj.set_volume(player)
 
+    @property
+    def awake_observers(self) -> list["GameObject"]:
+        if self._awake_dirty:
+            self._awake = [obj for obj in self._observers if not obj.is_sleeping]
+            self._awake_dirty = False
+        return self._awake
+
+    def wake(self, obj: "GameObject") -> None:
+        if obj.is_sleeping:
+            obj.is_sleeping = False
+            self._awake_dirty = True
+
+    def update_sleeping(self, updated: list["GameObject"]) -> None:
+        """
+        Wake up the objects close to the movers and put to sleep the objects in ``updated``
+        that are at rest and have no mover nearby. Sleeping objects are not prepared nor updated.
+        """
+        near_movers: set[int] = set()
+        for mover in [obj for obj in self.awake_observers if obj.is_mover()]:
+            # +1 as the mover may have stepped away since the last indexing
+            for obj in self.spatial_index.query(mover.x, mover.y, self.interaction_radius + 1):
+                near_movers.add(id(obj))
+                self.wake(obj)
+        for obj in updated:
+            if id(obj) not in near_movers and obj.is_at_rest():
+                obj.is_sleeping = True
+                self._awake_dirty = True
+
+    @profiled("update")
     def update(self, event: Any) -> None:
-        for observer in self._observers:
-            observer.update(event)
-        now = pygame.time.get_ticks()
+        # only the objects that have just been prepared and updated may fall asleep
+        if profiler.enabled:
+            updated = [
+                observer
+                for observer in self.awake_observers
+                if profiler.call(self.level_key, "update", observer, observer.update, event)
+            ]
+        else:
+            updated = [observer for observer in self.awake_observers if observer.update(event)]
+        now = sim_clock.get_ticks()
         for obj, dt, t in self._scheduled_to_die:
             if t + dt < now:
                 self.unregister(obj)
                 self._scheduled_to_die.remove((obj, dt, t))
+        self.update_sleeping(updated)
 
-    def prepare(self, near_objs: Any, game: "Game") -> None:
-        for obj in self._observers:
-            obj.prepare(near_objs, game)
+    @profiled("prepare")
+    def prepare(
+        self, near_objs: Any, game: "Game", objs: Optional[list["GameObject"]] = None
+    ) -> None:
+        """
+        Prepare ``objs``, all the awake objects by default. If ``near_objs`` is ``None``, each
+        object only receives the objects returned by ``get_near_objs``.
+        """
+        timed = profiler.enabled
+        for obj in self.awake_observers if objs is None else objs:
+            near = self.get_near_objs(obj) if near_objs is None else near_objs
+            if timed:
+                profiler.call(self.level_key, "prepare", obj, obj.prepare, near, game)
+            else:
+                obj.prepare(near, game)
 
+    @profiled("reset_is_walkable")
     def reset_is_walkable(self) -> None:
-        for observer in self._observers:
-            if hasattr(observer, "reset_is_walkable"):
-                observer.reset_is_walkable()
+        """Rebuild the walkability map of the level from the positions of the encumbrant objects"""
+        self.ground_grid.update_walkability(self._observers)
 
+    @property
+    def walkability(self) -> Any:
+        """Boolean ``[y, x]`` numpy map of the cells of the level that can be walked on"""
+        return self.ground_grid.walkability_map()
+
+    @profiled("correct_periodic_positions")
     def correct_periodic_positions(self) -> None:
-        for obj in self._observers:
+        for obj in self.awake_observers:
             obj.x = obj.x % MAX_X
             obj.y = obj.y % MAX_Y
+            self.spatial_index.move(obj)
+
+    def step(self, n: int = 1, game: Any = None, keys: Any = None) -> None:
+        """
+        Advance the simulation of ``n`` fixed time steps, without rendering.
+        This requires a fixed-step simulation clock, e.g. ``with sim_clock.fixed_step(): level.step(100)``.
+        If ``game`` is not given, a minimal headless game whose current level is self is used.
+        """
+        if game is None:
+            game = SimpleNamespace(current_level=self)
+        for _ in range(n):
+            sim_clock.advance()
+            self.reset_is_walkable()
+            if keys is not None and any(keys):
+                self.send_keys_to_user(keys)
+            self.prepare(None, game)
+            self.update(keys)
+            self.correct_periodic_positions()
 
+    @profiled("render")
     def render(self, screen) -> None:
+        timed = profiler.enabled
         for obj in self.order_observers_by_z_level():
             if hasattr(obj, "render"):
-                obj.render(screen)
+                if timed:
+                    profiler.call(self.level_key, "render", obj, obj.render, screen)
+                else:
+                    obj.render(screen)
 
     def order_observers_by_z_level(self) -> list["GameObject"]:
         return sorted(self._observers, key=lambda obj: obj.z_level)
 
     def schedule_to_unregister(self, obj, timer_ms: int = 1000) -> None:
-        now = pygame.time.get_ticks()
+        now = sim_clock.get_ticks()
+        self.wake(obj)
         self._scheduled_to_die.append((obj, timer_ms, now))
 
     def extract_instance(self, obj_serial: dict[str, Any]) -> Any:
@@ -95,16 +234,23 @@ class Level:
                 return obj
         return None
 
-    def get_serializable_state(self) -> dict[str, list[dict[str, Any]]]:
+    def get_serializable_state(self) -> dict[str, Any]:
         """
         This method is needed in the multiplayer only, to serialise the objects and
-        transfer them over the internet.
+        transfer them over the internet. The states of the static objects are read once and
+        the same dicts are returned at every call, so that they are not compared again.
         """
         objs = []
+        static_states = self._static_states
         for obj in self._observers:
-            obj_state = self.get_obj_state(obj)
+            if obj.is_static:
+                obj_state = static_states.get(obj.id)
+                if obj_state is None:
+                    obj_state = static_states[obj.id] = self.get_obj_state(obj)
+            else:
+                obj_state = self.get_obj_state(obj)
             objs.append(obj_state)
-        return {"objects": objs}
+        return {"objects": objs, "manifest": self.sprite_manifest}
 
     def get_obj_state(self, obj: "GameObject") -> dict[str, Any]:
         obj_state = {
@@ -126,10 +272,6 @@ class Level:
             "parent_id": obj.parent_id,
             "render_on_top_of_parent": obj.render_on_top_of_parent,
             "location_as_parent": obj.location_as_parent,
-            "movement_sprites_locations": getattr(obj, "movement_sprites_locations", None),
-            "standing_sprites_locations": getattr(obj, "standing_sprites_locations", None),
-            "dying_sprites_locations": getattr(obj, "dying_sprites_locations", None),
-            "push_sprites_locations": getattr(obj, "push_sprites_locations", None),
             "level_key": getattr(obj, "level_key", None),
             "exit_name": getattr(obj, "exit_name", None),
             "volume": getattr(obj, "volume", None),
@@ -0,0 +1,229 @@
+"""
+Offline level compiler.
+
+Parsing the level yaml files is slow, hence each yaml is compiled into a compact binary artifact
+holding the tile grid, the object records and the parent/children links. Artifacts are cached
+next to the yaml files, keyed by the content hash of the yaml: when the yaml changes, the
+artifact is automatically rebuilt. Loading an artifact does not parse any yaml.
+
+To compile all the levels ahead of time, run::
+
+    python -m flatland.world.level_compiler assets/levels
+"""
+
+import hashlib
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import yaml  # type: ignore
+
+from ..logger import Logger
+
+MAGIC = b"FLVC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHH32s")  # magic, format version, marshal version, sha256 of the yaml
+CACHE_DIR_NAME = ".cache"
+NO_INDEX = -1
+
+logger = Logger()
+
+
+class LevelCompilationError(Exception):
+    pass
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def __call__(self, string: Optional[str]) -> int:
+        if string is None:
+            return NO_INDEX
+        if string not in self._index:
+            self._index[string] = len(self.strings)
+            self.strings.append(string)
+        return self._index[string]
+
+
+def _is_grid_tile(obj_conf: dict[str, Any], width: int, height: int) -> bool:
+    """Ground tiles that can be stored in the tile grid, i.e. with no extra fields"""
+    return (
+        obj_conf["cls_name"] == "Ground"
+        and set(obj_conf) <= {"cls_name", "name", "x", "y", "health", "tile_name"}
+        and isinstance(obj_conf.get("x", 0), int)
+        and isinstance(obj_conf.get("y", 0), int)
+        and 0 <= obj_conf.get("x", 0) < width
+        and 0 <= obj_conf.get("y", 0) < height
+    )
+
+
+def compile_config(config: dict[str, Any], digest: bytes = b"\0" * 32) -> bytes:
+    """Compile a level config, as loaded from yaml, into the binary artifact"""
+    strings = _StringTable()
+    objects = config["objects"]
+    name_to_idx = {obj_conf["name"]: idx for idx, obj_conf in enumerate(objects)}
+    grounds = [o for o in objects if o["cls_name"] == "Ground"]
+    width = max([o.get("x", 0) for o in grounds if isinstance(o.get("x", 0), int)] + [-1]) + 1
+    height = max([o.get("y", 0) for o in grounds if isinstance(o.get("y", 0), int)] + [-1]) + 1
+
+    # tile grid: one string index per cell for the tile and the name, and the health
+    tile_names = array("i", [NO_INDEX] * (width * height))
+    names = array("i", [NO_INDEX] * (width * height))
+    healths = array("d", [0.0] * (width * height))
+
+    records: list[tuple] = []
+    for obj_conf in objects:
+        if _is_grid_tile(obj_conf, width, height):
+            cell = obj_conf.get("y", 0) * width + obj_conf.get("x", 0)
+            if tile_names[cell] == NO_INDEX:  # otherwise two tiles share the cell: full record
+                tile_names[cell] = strings(obj_conf.get("tile_name"))
+                names[cell] = strings(obj_conf["name"])
+                healths[cell] = obj_conf.get("health", 10)
+                records.append((cell,))
+                continue
+        records.append(
+            (
+                strings(obj_conf["cls_name"]),
+                strings(obj_conf["name"]),
+                obj_conf.get("x", 0),
+                obj_conf.get("y", 0),
+                obj_conf.get("health", 10),
+                strings(obj_conf.get("tile_name")),
+                obj_conf.get("vision_range"),
+                obj_conf.get("hearing_range"),
+                tuple((strings(k), v) for k, v in obj_conf.get("other_attributes", {}).items()),
+                name_to_idx[obj_conf["parent"]] if obj_conf.get("parent") else NO_INDEX,
+                tuple(name_to_idx[child] for child in obj_conf.get("children", [])),
+            )
+        )
+
+    payload = (
+        config["level_key"],
+        tuple(strings.strings),
+        (width, height, tile_names.tobytes(), names.tobytes(), healths.tobytes()),
+        tuple(records),
+    )
+    try:
+        body = marshal.dumps(payload)
+    except ValueError as e:
+        raise LevelCompilationError(f"Level {config['level_key']} cannot be compiled: {e}")
+    return HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, digest) + body
+
+
+def read_header(data: bytes) -> tuple[bytes, int, int, bytes]:
+    if len(data) < HEADER.size:
+        raise LevelCompilationError("Truncated level artifact")
+    return HEADER.unpack_from(data)
+
+
+def decompile(data: bytes) -> dict[str, Any]:
+    """Rebuild, without parsing any yaml, the level config from the binary artifact"""
+    magic, version, marshal_version, _ = read_header(data)
+    if magic != MAGIC or version != FORMAT_VERSION or marshal_version != marshal.version:
+        raise LevelCompilationError("Incompatible level artifact")
+    level_key, strings, grid, records = marshal.loads(data[HEADER.size :])
+    width, _, tile_bytes, name_bytes, health_bytes = grid
+    tile_names, names, healths = array("i"), array("i"), array("d")
+    tile_names.frombytes(tile_bytes)
+    names.frombytes(name_bytes)
+    healths.frombytes(health_bytes)
+
+    def string(idx: int) -> Optional[str]:
+        return None if idx == NO_INDEX else strings[idx]
+
+    objects: list[dict[str, Any]] = []
+    links: list[tuple[int, int, tuple[int, ...]]] = []
+    for record in records:
+        if len(record) == 1:
+            (cell,) = record
+            health = healths[cell]
+            objects.append(
+                {
+                    "cls_name": "Ground",
+                    "name": string(names[cell]),
+                    "x": cell % width,
+                    "y": cell // width,
+                    "health": int(health) if health.is_integer() else health,
+                    "tile_name": string(tile_names[cell]),
+                }
+            )
+            continue
+        cls_idx, name_idx, x, y, health, tile_idx, vision, hearing, other, parent, children = record
+        links.append((len(objects), parent, children))
+        objects.append(
+            {
+                "cls_name": string(cls_idx),
+                "name": string(name_idx),
+                "x": x,
+                "y": y,
+                "health": health,
+                "tile_name": string(tile_idx),
+                "vision_range": vision,
+                "hearing_range": hearing,
+                "other_attributes": {string(k): v for k, v in other},
+            }
+        )
+    for idx, parent, children in links:
+        if parent != NO_INDEX:
+            objects[idx]["parent"] = objects[parent]["name"]
+        if children:
+            objects[idx]["children"] = [objects[child]["name"] for child in children]
+    return {"level_key": level_key, "objects": objects}
+
+
+def artifact_path(yaml_path: Path, digest: bytes) -> Path:
+    return yaml_path.parent / CACHE_DIR_NAME / f"{yaml_path.stem}.{digest.hex()[:16]}.flvc"
+
+
+def compile_level(yaml_path: Union[str, Path]) -> Path:
+    """Compile a yaml level into its cached artifact, removing the stale artifacts of the level"""
+    yaml_path = Path(yaml_path)
+    source = yaml_path.read_bytes()
+    digest = hashlib.sha256(source).digest()
+    target = artifact_path(yaml_path, digest)
+    data = compile_config(yaml.safe_load(source), digest)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for stale in target.parent.glob(f"{yaml_path.stem}.*.flvc"):
+        if stale != target:
+            stale.unlink(missing_ok=True)
+    # write atomically, as several processes may load the levels at the same time
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, target)
+    return target
+
+
+def load_level_config(yaml_path: Union[str, Path]) -> dict[str, Any]:
+    """
+    Load the config of a level from its cached artifact. If the artifact is missing, stale or
+    unreadable, the yaml is parsed and the artifact rebuilt.
+    """
+    yaml_path = Path(yaml_path)
+    source = yaml_path.read_bytes()
+    digest = hashlib.sha256(source).digest()
+    target = artifact_path(yaml_path, digest)
+    try:
+        data = target.read_bytes()
+        if read_header(data)[3] == digest:
+            return decompile(data)
+    except (OSError, ValueError, EOFError, TypeError, LevelCompilationError) as e:
+        logger.info(f"No valid compiled artifact for {yaml_path}: {e}")
+    try:
+        compile_level(yaml_path)
+    except (OSError, LevelCompilationError) as e:  # e.g. read-only assets: keep going with yaml
+        logger.info(f"Could not compile {yaml_path}: {e}")
+    return yaml.safe_load(source)
+
+
+if __name__ == "__main__":
+    folder = Path(sys.argv[1] if len(sys.argv) > 1 else "assets/levels")
+    for path in sorted(folder.glob("*.yaml")):
+        print(f"{path} -> {compile_level(path)}")
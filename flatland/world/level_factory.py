@@ -1,23 +1,85 @@
 """
 This is the factory pattern to generate levels.
 Each level shall be built and registered in the factory
+
+The factory also hands out lazy level proxies: a level is built only when it is first accessed,
+and the levels reachable through the portals of an occupied level can be prefetched in background.
+A ``LazyWorld`` swaps each proxy for its level once built, hence the game and the servers, which
+get their levels from it, never go through the proxy on each tick.
 """
 
 # level_factory.py
 
-from typing import Any, Callable
+import threading
+from typing import Any, Callable, Container, Optional, cast
 
+from ..logger import Logger
 from .level import Level
 
 # The builder functions you will register: always return a Level
 LevelBuilder = Callable[..., Level]
 
 
+class LazyLevel:
+    """
+    Proxy to a Level that is built on first access. Attribute access is forwarded to the level,
+    hence the proxy can be used wherever a Level is expected.
+    """
+
+    __slots__ = ("_key", "_builder", "_level", "_lock")
+
+    def __init__(self, key: str, builder: LevelBuilder) -> None:
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_builder", builder)
+        object.__setattr__(self, "_level", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def is_built(self) -> bool:
+        return self._level is not None
+
+    def resolve(self) -> Level:
+        """Return the level, building it if needed. Concurrent callers wait for the same build."""
+        level: Optional[Level] = self._level
+        if level is None:
+            with self._lock:
+                level = self._level
+                if level is None:
+                    level = self._builder()
+                    object.__setattr__(self, "_level", level)
+        return level
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self) -> str:
+        state = "built" if self.is_built else "not built"
+        return f"<LazyLevel {self._key} ({state})>"
+
+
+class LazyWorld(dict[str, Level]):
+    """The levels by key, as lazy proxies replaced by their level when first looked up"""
+
+    def __getitem__(self, key: str) -> Level:
+        level = super().__getitem__(key)
+        if type(level) is LazyLevel:
+            level = level.resolve()
+            self[key] = level
+        return level
+
+
 class LevelFactory:
     """Factory specialized for builder functions that create Levels."""
 
     def __init__(self) -> None:
         self._registry: dict[str, LevelBuilder] = {}
+        self._proxies: dict[str, LazyLevel] = {}
+        self._prefetching: dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self.logger = Logger()
 
     def register(self, key: str) -> Callable[[LevelBuilder], LevelBuilder]:
         """Decorator to register a builder function."""
@@ -34,12 +96,63 @@ class LevelFactory:
         return set(self._registry.keys())
 
     def create(self, key: str, **kwargs: Any) -> Level:
-        """Create a Level by calling the registered builder function."""
+        """
+        The Level of ``key``, built once by the registered builder function, with ``kwargs``: the
+        same Level is returned for the same key, whether it was built by ``create`` or by its
+        lazy proxy.
+        """
+        return cast(LazyLevel, self.lazy(key, **kwargs)).resolve()
+
+    def build(self, key: str, **kwargs: Any) -> Level:
+        """Build a new Level by calling the registered builder function."""
         if key not in self._registry:
             raise ValueError(f"No level registered under key '{key}'.")
         builder = self._registry[key]
         return builder(**kwargs)
 
+    def lazy(self, key: str, **kwargs: Any) -> Level:
+        """
+        Return the lazy proxy of a level: the same proxy is returned for the same key. ``kwargs``
+        are passed to the builder, by the first call only.
+        """
+        if key not in self._registry:
+            raise ValueError(f"No level registered under key '{key}'.")
+        with self._lock:
+            proxy = self._proxies.get(key)
+            if proxy is None:
+                proxy = LazyLevel(key, lambda: self.build(key, **kwargs))
+                self._proxies[key] = proxy
+        return cast(Level, proxy)
+
+    def prefetch(self, key: str) -> Optional[threading.Thread]:
+        """Build the level ``key`` on a background thread, unless it is built or being built."""
+        proxy = cast(LazyLevel, self.lazy(key))
+        with self._lock:
+            thread = self._prefetching.get(key)
+            if proxy.is_built or (thread is not None and thread.is_alive()):
+                return None
+            self.logger.info(f"Prefetching level {key}")
+            thread = threading.Thread(target=proxy.resolve, name=f"prefetch-{key}", daemon=True)
+            self._prefetching[key] = thread
+        thread.start()
+        return thread
+
+    def prefetch_neighbours(
+        self, level: Level, owned: Optional[Container[str]] = None
+    ) -> list[threading.Thread]:
+        """
+        Prefetch the levels reachable through the portals (and doors) of ``level``. Only those of
+        ``owned`` when given, e.g. the levels of a shard: the others are built by their owner.
+        """
+        threads = []
+        for obj in list(level._observers):
+            key = getattr(obj, "level_key", "")
+            if key in self._registry and (owned is None or key in owned):
+                thread = self.prefetch(key)
+                if thread is not None:
+                    threads.append(thread)
+        return threads
+
 
 # A global factory instance
 factory = LevelFactory()
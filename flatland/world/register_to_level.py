@@ -2,15 +2,15 @@ import glob
 import os
 import random
 import string
+from functools import partial
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import yaml  # type: ignore
-
 from ..consts import MAX_X, MAX_Y, TILE_SIZE
 from ..objects.items_registry import registry
 from .build_tile_map import build_tile_map
 from .level import Level
+from .level_compiler import load_level_config
 from .level_factory import factory
 
 if TYPE_CHECKING:
@@ -19,15 +19,17 @@ if TYPE_CHECKING:
 
 
 def load_levels_from_yaml(level_folder: str):
+    """
+    Register a builder per level to the factory. Levels are built only when they are first needed,
+    from their compiled artifacts, which are rebuilt when the yaml changes.
+    """
     level_files = Path(level_folder).glob("*.yaml")
     for file_path in level_files:
-        with open(file_path, "r") as f:
-            level_data = yaml.safe_load(f)
-            build_level_from_config(level_data)
+        config = load_level_config(file_path)
+        factory.register(config["level_key"])(partial(build_level_from_config, config))
 
 
-def build_level_from_config(config: dict):
-    # Register level to factory
+def build_level_from_config(config: dict) -> Level:
     level_key = config["level_key"]
     level = Level(level_key)
     name_to_object = {}
@@ -80,6 +82,4 @@ def build_level_from_config(config: dict):
             obj.children.append(child_obj)
             child_obj.parent = obj
 
-    @factory.register(level_key)
-    def _level_fn() -> Level:
-        return level
+    return level
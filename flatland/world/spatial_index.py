@@ -0,0 +1,140 @@
+"""
+Cell-bucketed spatial index used by the Level to answer neighbour queries.
+
+The level is periodic (see ``Level.correct_periodic_positions``): positions are wrapped
+before being bucketed and queries wrap around the borders, so that an object close to
+the left edge also sees the objects close to the right edge.
+"""
+
+import math
+from itertools import chain
+from typing import TYPE_CHECKING, Iterable
+
+from ..consts import MAX_X, MAX_Y
+
+if TYPE_CHECKING:
+    from ..objects.base_objects import GameObject
+
+
+class SpatialIndex:
+    """
+    Buckets the objects in square cells of side ``cell_size`` over a ``width x height`` torus.
+    """
+
+    def __init__(self, cell_size: int = 2, width: int = MAX_X, height: int = MAX_Y) -> None:
+        self.cell_size = cell_size
+        self.width = width
+        self.height = height
+        self.n_cols = math.ceil(width / cell_size)
+        self.n_rows = math.ceil(height / cell_size)
+        self._cells: dict[tuple[int, int], list["GameObject"]] = {}
+        self._obj_cell: dict[int, tuple[int, int]] = {}  # id(obj) -> cell
+
+    def _cell_of(self, x: float, y: float) -> tuple[int, int]:
+        return int((x % self.width) // self.cell_size), int((y % self.height) // self.cell_size)
+
+    def __contains__(self, obj: "GameObject") -> bool:
+        return id(obj) in self._obj_cell
+
+    def __len__(self) -> int:
+        return len(self._obj_cell)
+
+    def insert(self, obj: "GameObject") -> None:
+        if id(obj) in self._obj_cell:
+            self.move(obj)
+            return
+        cell = self._cell_of(obj.x, obj.y)
+        self._cells.setdefault(cell, []).append(obj)
+        self._obj_cell[id(obj)] = cell
+
+    def remove(self, obj: "GameObject") -> None:
+        cell = self._obj_cell.pop(id(obj), None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        for i, existing in enumerate(bucket):
+            if existing is obj:
+                del bucket[i]
+                break
+        if not bucket:
+            del self._cells[cell]
+
+    def move(self, obj: "GameObject") -> None:
+        """Re-bucket ``obj`` after its position changed. Cheap when the cell did not change."""
+        old_cell = self._obj_cell.get(id(obj))
+        if old_cell is None:
+            self.insert(obj)
+            return
+        new_cell = self._cell_of(obj.x, obj.y)
+        if new_cell != old_cell:
+            self.remove(obj)
+            self._cells.setdefault(new_cell, []).append(obj)
+            self._obj_cell[id(obj)] = new_cell
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._obj_cell.clear()
+
+    @staticmethod
+    def _axis_cells(
+        lo: float, hi: float, extent: int, cell_size: int, n_cells: int
+    ) -> Iterable[int]:
+        """Wrapped cell indices covering the interval ``[lo, hi]`` on a periodic axis."""
+        if hi - lo >= extent:
+            return range(n_cells)
+        lo_w = lo % extent
+        hi_w = lo_w + (hi - lo)
+        if hi_w < extent:
+            return range(int(lo_w // cell_size), int(hi_w // cell_size) + 1)
+        return chain(
+            range(int(lo_w // cell_size), n_cells),
+            range(0, int((hi_w - extent) // cell_size) + 1),
+        )
+
+    def periodic_distance(self, x0: float, y0: float, x1: float, y1: float) -> float:
+        dx = abs(x0 - x1) % self.width
+        dy = abs(y0 - y1) % self.height
+        return math.hypot(min(dx, self.width - dx), min(dy, self.height - dy))
+
+    def query(self, x: float, y: float, radius: float) -> list["GameObject"]:
+        """Return all the objects within ``radius`` (periodic euclidean distance) of ``(x, y)``."""
+        cols = set(
+            self._axis_cells(x - radius, x + radius, self.width, self.cell_size, self.n_cols)
+        )
+        rows = set(
+            self._axis_cells(y - radius, y + radius, self.height, self.cell_size, self.n_rows)
+        )
+        result: list["GameObject"] = []
+        for i in cols:
+            for j in rows:
+                for obj in self._cells.get((i, j), ()):
+                    if self.periodic_distance(x, y, obj.x, obj.y) <= radius:
+                        result.append(obj)
+        return result
+
+    def query_rect(
+        self, x: float, y: float, half_width: float, half_height: float
+    ) -> list["GameObject"]:
+        """Return all the objects in the (wrapped) rectangle centred on ``(x, y)``."""
+        cols = set(
+            self._axis_cells(
+                x - half_width, x + half_width, self.width, self.cell_size, self.n_cols
+            )
+        )
+        rows = set(
+            self._axis_cells(
+                y - half_height, y + half_height, self.height, self.cell_size, self.n_rows
+            )
+        )
+        result: list["GameObject"] = []
+        for i in cols:
+            for j in rows:
+                for obj in self._cells.get((i, j), ()):
+                    dx = abs(x - obj.x) % self.width
+                    dy = abs(y - obj.y) % self.height
+                    if (
+                        min(dx, self.width - dx) <= half_width
+                        and min(dy, self.height - dy) <= half_height
+                    ):
+                        result.append(obj)
+        return result
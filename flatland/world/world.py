@@ -1,7 +1,8 @@
 from .level import Level
-from .level_factory import factory
+from .level_factory import LazyWorld, factory
 from .register_to_level import load_levels_from_yaml
 
 load_levels_from_yaml("assets/levels")
 
-world = {key: factory.create(key) for key in factory.level_keys()}
+# levels are built on first access, see LevelFactory.lazy
+world = LazyWorld((key, factory.lazy(key)) for key in factory.level_keys())
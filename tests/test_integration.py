@@ -7,6 +7,7 @@ import pytest
 from flatland.consts import Direction
 from flatland.game import Game
 from flatland.objects.items_registry import registry
+from flatland.sim_clock import sim_clock
 from flatland.world.level import Level
 
 
@@ -229,3 +230,39 @@ def test_cast():
     process.join(timeout=10)
 
     assert process.exitcode == 0  # ensure clean exit
+
+
+def test_inertia_damage_headless():
+    goblin = registry.create(
+        cls_name="Goblin",
+        x=4,
+        y=0,
+        name="ashpack",
+        health=9,
+        vision_range=3,
+        hearing_range=5,
+    )
+    stone = registry.create(cls_name="Stone", x=0, y=0, name="a rock", health=50)
+    stone.direction = Direction.RIGHT
+    stone.inertia = 19
+    level = Level()
+    for obj in [stone, goblin]:
+        level.register(obj)
+    for x in range(5):
+        level.register(
+            registry.create(
+                cls_name="Ground",
+                x=x,
+                y=0,
+                name="ground",
+                health=50,
+                tile_name="assets/sprites/terrain/tile_1_1_1_1",
+            )
+        )
+
+    start = time.time()
+    with sim_clock.fixed_step(step_ms=100):
+        level.step(100)  # 10 seconds of logical time
+    assert time.time() - start < 10
+    assert goblin.health < 9
+    assert stone.health < 50
@@ -5,7 +5,10 @@ from typing import Any
 import pygame
 import pytest
 
-from flatland.objects.items import Stone
+from flatland.interactions.dispatch import dispatch
+from flatland.interactions.evolution import DeathMixin
+from flatland.interactions.interactions import ContactInteractionMixin
+from flatland.objects.items import Ground, Player, Stone
 
 
 def test_interaction(display) -> None:
@@ -26,3 +29,15 @@ def test_interaction(display) -> None:
 
     assert stone.health < health_stone
     assert stone2.health < health_stone2
+
+
+def test_interaction_dispatch_matrix(display) -> None:
+    assert dispatch.handlers_for(Ground, Ground) == ()
+    assert dispatch.handlers_for(Player, Stone) == ()
+    stone_handlers = dispatch.handlers_for(Stone, Stone)
+    assert ContactInteractionMixin.__dict__["get_interaction_callables"] in stone_handlers
+    assert DeathMixin.__dict__["get_interaction_callables"] in stone_handlers
+    # evolutions only apply to the object itself
+    assert DeathMixin.__dict__["get_interaction_callables"] not in dispatch.handlers_for(
+        Stone, Ground
+    )
@@ -0,0 +1,270 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pygame
+import yaml  # type: ignore
+
+from flatland.consts import MAX_X, MAX_Y, Direction
+from flatland.objects.base_objects import GameObject
+from flatland.objects.items import Ground, Stone
+from flatland.objects.items_2 import Portal
+from flatland.profiler import profiler
+from flatland.sim_clock import sim_clock
+from flatland.tracer import tracer
+from flatland.utils import move_in
+from flatland.world.level import Level
+from flatland.world.level_compiler import compile_level, decompile, load_level_config
+from flatland.world.level_factory import LazyWorld, LevelFactory
+from flatland.world.spatial_index import SpatialIndex
+
+
+def test_spatial_index_query_wraps_around_borders() -> None:
+    index = SpatialIndex(cell_size=2, width=MAX_X, height=MAX_Y)
+    left = GameObject(0, 4, "left", 1)
+    right = GameObject(MAX_X - 1, 4, "right", 1)
+    far = GameObject(6, 4, "far", 1)
+    for obj in (left, right, far):
+        index.insert(obj)
+    near = index.query(0, 4, 1.5)
+    assert left in near and right in near
+    assert far not in near
+
+
+def test_level_near_objs_follow_positions() -> None:
+    level = Level()
+    mover = GameObject(0, 0, "mover", 1)
+    still = GameObject(5, 5, "still", 1)
+    level.register(mover)
+    level.register(still)
+    assert still not in level.get_near_objs(mover)
+    mover.x, mover.y = 4, 5
+    level.correct_periodic_positions()
+    assert still in level.get_near_objs(mover)
+    level.unregister(still)
+    assert still not in level.get_near_objs(mover)
+
+
+def test_ground_grid_shared_by_movers() -> None:
+    level = Level()
+    stone = Stone(0, 0, "a rock", 10)
+    tiles = [
+        Ground(x, 0, "ground", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        for x in range(2)
+    ]
+    for obj in [stone, *tiles]:
+        level.register(obj)
+    assert stone.ground_grid is level.ground_grid
+    assert level.ground_grid.get(1, 0) is tiles[1]
+    assert move_in(stone, Direction.RIGHT)
+    assert (stone.x, stone.y) == (1, 0)
+    assert not move_in(stone, Direction.RIGHT)  # no ground there
+    level.unregister(tiles[0])
+    assert level.ground_grid.get(0, 0) is None
+
+
+def test_static_objects_fall_asleep_and_wake_up_near_movers() -> None:
+    level = Level()
+    stone = Stone(0, 0, "a rock", 10)
+    stone.temperature = stone.equilibrium_temperature
+    tiles = [
+        Ground(x, 0, "ground", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        for x in range(6)
+    ]
+    for obj in [stone, *tiles]:
+        level.register(obj)
+
+    with sim_clock.fixed_step(step_ms=1000):  # long enough for every object to act
+        level.step()
+    assert all(obj.is_sleeping for obj in level._observers)
+    assert not tiles[0].is_walkable  # the stone encumbers its tile
+    assert level.awake_observers == []
+
+    stone.inertia = 3.0
+    stone.direction = Direction.RIGHT
+    level.wake(stone)
+    with sim_clock.fixed_step(step_ms=1000):  # long enough for every object to act
+        level.step()
+    assert not stone.is_sleeping
+    assert not tiles[1].is_sleeping
+    assert tiles[5].is_sleeping  # too far to be woken up
+
+
+def test_walkability_map_is_vectorized_and_viewed_by_tiles() -> None:
+    level = Level()
+    stone = Stone(1, 0, "a rock", 10)
+    tiles = [
+        Ground(x, 0, "ground", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        for x in range(3)
+    ]
+    for obj in [stone, *tiles]:
+        level.register(obj)
+    level.reset_is_walkable()
+    # the map is also False where there is no ground
+    assert level.walkability[0].tolist()[:4] == [True, False, True, False]
+    assert not tiles[1].is_walkable and tiles[2].is_walkable
+    stone.x = 2
+    level.reset_is_walkable()
+    assert tiles[1].is_walkable and not tiles[2].is_walkable
+
+
+def test_level_compiler_caches_and_rebuilds_on_change(tmp_path) -> None:
+    source = Path("assets/levels/house_1.yaml")
+    yaml_path = tmp_path / "house_1.yaml"
+    yaml_path.write_bytes(source.read_bytes())
+    config = yaml.safe_load(source.read_bytes())
+
+    artifact = compile_level(yaml_path)
+    compiled = load_level_config(yaml_path)
+    assert [o["name"] for o in compiled["objects"]] == [o["name"] for o in config["objects"]]
+    for compiled_obj, obj in zip(compiled["objects"], config["objects"]):
+        for key in ("cls_name", "x", "y", "health", "tile_name", "parent", "children"):
+            assert compiled_obj.get(key) == obj.get(key)
+
+    # a change of the yaml invalidates the artifact, which is rebuilt
+    config["objects"][0]["health"] = 3
+    yaml_path.write_text(yaml.safe_dump(config))
+    assert load_level_config(yaml_path)["objects"][0]["health"] == 3
+    assert not artifact.exists()
+    assert len(list(artifact.parent.glob("house_1.*.flvc"))) == 1
+    assert decompile(compile_level(yaml_path).read_bytes())["objects"][0]["health"] == 3
+
+
+def test_lazy_levels_are_built_on_access_and_portal_neighbours_prefetched() -> None:
+    levels = LevelFactory()
+    built: list[str] = []
+
+    def build(key: str, target: str = "") -> Level:
+        built.append(key)
+        level = Level(key)
+        if target:
+            portal = Portal(1, 1, f"portal_to_{target}", 10)
+            portal.level_key = target
+            level.register(portal)
+        return level
+
+    levels.register("outside")(lambda: build("outside", target="house"))
+    levels.register("house")(lambda: build("house"))
+    world = LazyWorld((key, levels.lazy(key)) for key in levels.level_keys())
+    assert built == []
+    assert levels.lazy("outside") is dict.__getitem__(world, "outside")
+
+    outside = world["outside"]
+    assert type(outside) is Level  # the first lookup builds the level, and replaces its proxy
+    assert len(outside._observers) == 1
+    assert world["outside"] is outside and dict.__getitem__(world, "outside") is outside
+    assert built == ["outside"]
+
+    for thread in levels.prefetch_neighbours(outside):
+        thread.join()
+    assert built == ["outside", "house"]
+    assert world["house"].level_key == "house"
+    assert levels.prefetch_neighbours(outside) == []  # already built
+    assert built == ["outside", "house"]
+    # the levels are built once: created or looked up, the same level is returned
+    assert levels.create("house") is levels.create("house") is world["house"]
+    assert built == ["outside", "house"]
+
+
+HEADLESS_GAME = """
+import pygame
+
+def no_display(*args, **kwargs):
+    raise AssertionError("the headless game must not open a display")
+
+pygame.display.set_mode = no_display
+
+from flatland.game import Game
+from flatland.objects.items_registry import registry
+from flatland.sim_clock import sim_clock
+from flatland.world.world import world
+
+game = Game(world)
+cow = registry.create("Cow", x=1, y=1, name="cow", health=10, vision_range=5, hearing_range=5)
+world["level_0"].register(cow)
+with sim_clock.fixed_step(step_ms=100) as clock:
+    started = clock.get_ticks()
+    game.run_headless(20, "level_0")
+    assert clock.get_ticks() - started == 2000
+assert game.current_level is world["level_0"]
+assert not pygame.display.get_init()
+"""
+
+
+def test_the_game_runs_headless_without_a_screen() -> None:
+    env = {**os.environ, "FLATLAND_HEADLESS": "true"}
+    result = subprocess.run(
+        [sys.executable, "-c", HEADLESS_GAME], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_ticks_are_profiled_per_phase_and_class_only_when_enabled() -> None:
+    level = Level("profiled")
+    level.register(Stone(0, 0, "a rock", 10))
+    for x in range(3):
+        level.register(Ground(x, 0, "ground", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1"))
+    screen = pygame.Surface((64, 64))
+
+    profiler.reset()
+    with sim_clock.fixed_step(step_ms=1000):
+        level.step()
+    level.render(screen)
+    assert profiler.summary("profiled") == []  # disabled
+
+    profiler.enabled = True
+    try:
+        with sim_clock.fixed_step(step_ms=1000):
+            level.step(3)
+        level.render(screen)
+    finally:
+        profiler.enabled = False
+    rows = {(row["phase"], row["class"]): row for row in profiler.summary("profiled")}
+    for phase in ("reset_is_walkable", "prepare", "update", "correct_periodic_positions"):
+        assert rows[phase, None]["count"] == 3
+    assert rows["render", None]["count"] == 1
+    assert rows["render", "Ground"]["count"] == 3 and rows["render", "Stone"]["count"] == 1
+    assert rows["prepare", "Stone"]["count"] >= 1
+    row = rows["prepare", None]
+    assert 0 < row["p50_ms"] <= row["p95_ms"] <= row["max_ms"] <= row["total_ms"]
+    assert "reset_is_walkable" in profiler.format_summary("profiled")
+    profiler.reset()
+
+
+def test_ticks_are_traced_in_the_chrome_trace_format(tmp_path) -> None:
+    level = Level("traced")
+    stone = Stone(0, 0, "a rock", 10)
+    level.register(stone)
+    for x in range(3):
+        level.register(Ground(x, 0, "ground", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1"))
+
+    tracer.events.clear()
+    tracer.start()
+    try:
+        with sim_clock.fixed_step(step_ms=1000):
+            level.step(2)
+    finally:
+        tracer.stop()
+        profiler.enabled = False
+        profiler.reset()
+    tracer.save(str(tmp_path / "trace.json"))
+    tracer.events.clear()
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] == "X"]
+    assert {event["name"] for event in events if event["ph"] == "M"} >= {"process_name"}
+    names = {(span["cat"], span["name"]) for span in spans}
+    assert {
+        ("phase", "prepare"),
+        ("object", "prepare Stone"),
+        ("volition", "volition.prepare"),
+    } <= names
+    assert ("interaction", "Stone -> Stone") in names  # with itself
+    interaction = next(span for span in spans if span["name"] == "Stone -> Stone")
+    assert interaction["args"]["initiator"] == {"class": "Stone", "id": stone.id}
+    # the spans of an object are nested in the span of its phase
+    phase = next(span for span in spans if span["name"] == "prepare")
+    obj = next(span for span in spans if span["name"] == "prepare Stone")
+    assert phase["ts"] <= obj["ts"] and obj["ts"] + obj["dur"] <= phase["ts"] + phase["dur"]
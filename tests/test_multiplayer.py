@@ -0,0 +1,738 @@
+import asyncio
+import itertools
+import math
+import os
+import pickle
+import socket
+import struct
+import subprocess
+import sys
+from typing import Optional
+
+import pygame
+import pytest
+
+from flatland.animations.animation_clock import animation_clock
+from flatland.consts import MAX_X, Direction
+from flatland.multiplayer import server as server_module
+from flatland.multiplayer import wire
+from flatland.multiplayer.async_server import AsyncGameServer
+from flatland.multiplayer.framing import FrameReader, StreamFrameReader
+from flatland.multiplayer.inputs import KEY_BITS, InputSender, KeyMask
+from flatland.multiplayer.interest import InterestArea
+from flatland.multiplayer.interpolation import JitterBuffer, next_positions
+from flatland.multiplayer.load_test import Bot, parse_script, run_bots_async, summarize
+from flatland.multiplayer.replication import LevelSnapshotStage, apply_snapshot
+from flatland.multiplayer.server import GameServer
+from flatland.multiplayer.sharding import Coordinator, ShardServer, assign_levels
+from flatland.multiplayer.tick_scheduler import TickScheduler
+from flatland.objects.items import Ground, Stone
+from flatland.objects.items_2 import Portal
+from flatland.profiler import profiler
+from flatland.world.level import Level
+from flatland.world.level_factory import LevelFactory
+
+
+def test_delta_snapshots_only_carry_changes() -> None:
+    level = Level("test")
+    for x in range(4):
+        level.register(
+            Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        )
+    stone = Stone(1, 0, "stone", 10)
+    level.register(stone)
+    stage = LevelSnapshotStage("test", pickle.dumps)
+
+    stage.tick(level.get_serializable_state())
+    keyframe = stage.keyframe_snapshot()
+    assert keyframe["type"] == "keyframe"
+    client_state = apply_snapshot({}, keyframe)
+
+    stone.x = 2
+    stage.tick(level.get_serializable_state())
+    delta = pickle.loads(stage.delta())
+    assert delta["type"] == "delta" and delta["baseline"] == keyframe["seq"]
+    assert delta["update"] == {stone.id: {"x": 2}}
+    assert delta["spawn"] == [] and delta["despawn"] == []
+    assert len(stage.delta()) < len(stage.keyframe()) / 10
+
+    new_stone = Stone(3, 0, "new_stone", 10)
+    level.register(new_stone)
+    level.unregister(stone)
+    stage.tick(level.get_serializable_state())
+    delta = pickle.loads(stage.delta())
+    assert [o["id"] for o in delta["spawn"]] == [new_stone.id]
+    assert delta["despawn"] == [stone.id]
+
+    client_state = apply_snapshot(client_state, delta)
+    expected = {o["id"]: o for o in level.get_serializable_state()["objects"]}
+    assert client_state.keys() == expected.keys()
+    assert client_state[new_stone.id] == expected[new_stone.id]
+
+
+def test_keyframes_are_sent_periodically_on_level_change_and_on_request() -> None:
+    level_0, level_1 = Level("level_0"), Level("level_1")
+    level_1.register(Stone(3, 3, "door", 10))
+    server = GameServer({"level_0": level_0, "level_1": level_1})
+    with server.lock:
+        player, _ = server.join(0, None)  # the keyframe of the first tick of the level
+    server.stages["level_0"].keyframe_interval = 3
+
+    def next_snapshot() -> dict:
+        server.tick_stages()
+        data = server.next_snapshot(0)
+        assert data is not None
+        return wire.decode_from_server(data[4:])
+
+    types = [next_snapshot()["type"] for _ in range(6)]
+    assert types == ["delta", "delta", "keyframe", "delta", "delta", "keyframe"]
+    server.process_portal(0, "level_1", "door")
+    snapshot = next_snapshot()
+    assert (snapshot["type"], snapshot["level_key"]) == ("keyframe", "level_1")
+    assert next_snapshot()["type"] == "delta"
+    server.handle_message(0, player, {"type": "resync"})
+    assert next_snapshot()["type"] == "keyframe"
+    assert next_snapshot()["type"] == "delta"
+
+
+def test_wire_codec_round_trips_and_is_smaller_than_pickle() -> None:
+    level = Level("test")
+    for x in range(4):
+        level.register(
+            Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        )
+    stone = Stone(1, 0, "stone", 10)
+    level.register(stone)
+    stage = LevelSnapshotStage("test", pickle.dumps)
+
+    stage.tick(level.get_serializable_state())
+    keyframe = stage.keyframe_snapshot()
+    assert wire.decode(wire.encode(keyframe)) == keyframe
+    assert len(wire.encode(keyframe)) < len(pickle.dumps(keyframe))
+
+    stone.x, stone.direction, stone.name = 2, Direction.LEFT, "rolled_stone"
+    level.register(Stone(3, 0, "new_stone", 10))
+    stage.tick(level.get_serializable_state())
+    delta = pickle.loads(stage.delta())
+    assert wire.decode(wire.encode(delta)) == delta
+    join = {"type": "join", "player_id": stone.id, "snapshot": keyframe}
+    assert wire.decode(wire.encode(join)) == join
+
+    # values that do not fit the schema are still sent, as blobs
+    odd = {**keyframe["objects"][0], "x": None, "sprite_size_x": 2.5}
+    odd_keyframe = {**keyframe, "objects": [odd]}
+    assert wire.decode(wire.encode(odd_keyframe)) == odd_keyframe
+
+
+def test_wire_codec_client_messages() -> None:
+    keys = {"type": "keys", "seq": 7, "mask": KEY_BITS[pygame.K_UP] | KEY_BITS[pygame.K_9]}
+    assert wire.decode(wire.encode(keys)) == keys
+    portal = {"type": "portal_request", "target_level": "house_1", "exit_name": "door"}
+    assert wire.decode(wire.encode(portal)) == portal
+    assert wire.decode(wire.encode({"type": "resync"})) == {"type": "resync"}
+    idle = {
+        "type": "delta",
+        "seq": 3,
+        "baseline": None,
+        "tick": 12,
+        "time_ms": 200.0,
+        "level_key": "level_0",
+        "spawn": [],
+        "despawn": [],
+        "update": {},
+        "manifest": {},
+    }
+    assert wire.decode(wire.encode(idle)) == idle
+    assert wire.decode(wire.encode({**idle, "level_key": None})) == {**idle, "level_key": None}
+
+    with pytest.raises(wire.WireError):
+        wire.encode({**portal, "exit_name": "do\0or"})
+    for malformed in (b"", b"\x01", wire.encode(portal)[:-1], wire.encode(portal) + b"\x00"):
+        with pytest.raises(wire.WireError):
+            wire.decode(malformed)
+    with pytest.raises(wire.WireError):
+        wire.decode(pickle.dumps(portal))
+
+
+def test_server_snapshots_are_pickled_unless_the_wire_codec_is_chosen(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    snapshot = {
+        "type": "keyframe",
+        "seq": 1,
+        "baseline": None,
+        "tick": 3,
+        "time_ms": 30.0,
+        "level_key": "level_0",
+        "objects": [],
+        "manifest": {},
+    }
+    pickled = wire.encode_from_server(snapshot)
+    assert wire.message_type(pickled) is wire.MessageType.PICKLED
+    assert wire.decode_from_server(pickled) == snapshot
+    with pytest.raises(wire.WireError):
+        wire.decode(pickled)  # never unpickled from a client
+    with pytest.raises(wire.WireError):
+        wire.decode_from_server(pickled[:-1])
+    resync = {"type": "resync"}
+    assert wire.encode_from_server(resync) == wire.encode(resync)
+
+    monkeypatch.setattr(wire, "SNAPSHOT_CODEC", "wire")
+    assert wire.encode_from_server(snapshot) == wire.encode(snapshot)
+    assert wire.decode_from_server(wire.encode_from_server(snapshot)) == snapshot
+
+
+def test_frames_are_decoded_in_place_whatever_the_reads() -> None:
+    level = Level("test")
+    for x in range(20):
+        level.register(
+            Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        )
+    stage = LevelSnapshotStage("test", wire.encode)
+    stage.tick(level.get_serializable_state())
+    keyframe = stage.keyframe_snapshot()
+    keys = {"type": "keys", "seq": 1, "mask": KEY_BITS[pygame.K_UP]}
+    messages = [keys, keyframe, keys, keys, keyframe, {"type": "resync"}]
+    stream = b"".join(struct.pack("!I", len(data)) + data for data in map(wire.encode, messages))
+
+    # reads of varying sizes: partial headers and payloads, several frames at once
+    for chunk_sizes in ([1], [3, 7], [len(stream)], [100, 1, 5000]):
+        chunks = itertools.cycle(chunk_sizes)
+        position = 0
+
+        def recv_into(view: memoryview) -> int:
+            nonlocal position
+            n = min(len(view), next(chunks), len(stream) - position)
+            view[:n] = stream[position : position + n]
+            position += n
+            return n
+
+        frames = FrameReader(recv_into, buffer_size=64)  # grows for the keyframes
+        assert [wire.decode(frames.read_frame()) for _ in messages] == messages
+        with pytest.raises(ConnectionError):
+            frames.read_frame()
+
+    frames = FrameReader(lambda view: len(view), max_frame_size=1024)
+    frames.buffer[:4] = struct.pack("!I", 1025)
+    with pytest.raises(wire.WireError):
+        frames.read_frame()
+
+
+def test_the_asyncio_server_reassembles_the_frames_split_across_reads() -> None:
+    level = Level("level_0")
+    for x in range(4):
+        level.register(
+            Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        )
+    server = AsyncGameServer({"level_0": level})
+    keys = [{"type": "keys", "seq": seq, "mask": KEY_BITS[pygame.K_UP]} for seq in (1, 2)]
+    frames = [struct.pack("!I", len(data)) + data for data in map(wire.encode, keys)]
+
+    async def scenario() -> None:
+        tcp_server = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        frame_reader = StreamFrameReader(reader)
+        assert wire.decode_from_server(await frame_reader.read_frame())["type"] == "join"
+
+        # a frame in two reads, then the end of a frame and the whole next one in a single read
+        writer.write(frames[0][:3])
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        assert server.inputs == {}
+        writer.write(frames[0][3:-2])
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        assert server.inputs == {}
+        writer.write(frames[0][-2:] + frames[1])
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        assert server.inputs == {0: (2, KeyMask(KEY_BITS[pygame.K_UP]))}
+
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_level_snapshots_are_serialized_once_per_tick_for_all_clients() -> None:
+    level = Level("test")
+    stone = Stone(1, 0, "stone", 10)
+    level.register(stone)
+    serialized: list[dict] = []
+
+    def serialize(snapshot: dict) -> bytes:
+        serialized.append(snapshot)
+        return wire.encode(snapshot)
+
+    stage = LevelSnapshotStage("test", serialize)
+    stage.tick(level.get_serializable_state())
+    client_states = [apply_snapshot({}, wire.decode(stage.keyframe())) for _ in range(3)]
+    assert stage.keyframe() is stage.keyframe()
+    assert len(serialized) == 2  # the delta and the keyframe of the tick
+
+    for x in (2, 3):
+        stone.x = x
+        stage.tick(level.get_serializable_state())
+        assert stage.delta() is stage.delta()
+        client_states = [apply_snapshot(s, wire.decode(stage.delta())) for s in client_states]
+    assert len(serialized) == 4  # one per tick, whatever the number of clients
+
+    late_client = apply_snapshot({}, wire.decode(stage.keyframe()))
+    expected = {o["id"]: o for o in level.get_serializable_state()["objects"]}
+    assert all(state == expected for state in [*client_states, late_client])
+    assert wire.decode(stage.delta())["baseline"] == wire.decode(stage.keyframe())["seq"] - 1
+
+
+def test_slow_clients_skip_stale_snapshots_without_blocking_the_tick() -> None:
+    level = Level("level_0")
+    for x in range(4):
+        level.register(
+            Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        )
+    server = AsyncGameServer({"level_0": level}, write_buffer_limit=1024)
+
+    async def read_message(reader: asyncio.StreamReader) -> dict:
+        length = struct.unpack("!I", await reader.readexactly(4))[0]
+        return wire.decode_from_server(await reader.readexactly(length))
+
+    async def scenario() -> None:
+        tcp_server = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        join = await read_message(reader)
+        state = apply_snapshot({}, join["snapshot"])
+
+        # the client stops reading while the world keeps ticking
+        for _ in range(5):
+            server.update_world()
+            await asyncio.sleep(0.01)
+        messages = [await read_message(reader)]
+        while messages[-1]["seq"] < server.stages["level_0"].seq:
+            messages.append(await read_message(reader))
+        for message in messages:
+            state = apply_snapshot(state, message)
+        assert join["player_id"] in state
+        assert state == {o["id"]: o for o in level.get_serializable_state()["objects"]}
+
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+    asyncio.run(scenario())
+    assert server.clients == {}
+
+    # a client that could not take the last snapshots gets the keyframe of the last tick instead
+    with server.lock:
+        server.join(1, None)
+    for _ in range(5):
+        server.tick_stages()
+    data = server.next_snapshot(1)
+    assert data is not None
+    assert wire.decode_from_server(data[4:])["type"] == "keyframe"
+    assert server.dropped_snapshots == 4
+    assert server.next_snapshot(1) is None  # up to date
+    server.tick_stages()
+    data = server.next_snapshot(1)
+    assert data is not None
+    assert wire.decode_from_server(data[4:])["type"] == "delta"
+
+
+def test_clients_only_receive_the_objects_in_their_area_of_interest() -> None:
+    level = Level("level_0")
+    stones = [Stone(x, 0, f"stone_{x}", 10) for x in range(0, MAX_X - 1, 2)]
+    for stone in stones:
+        level.register(stone)
+    carried = Stone(6, 6, "carried", 10)
+    stones[1].children.append(carried)  # children are seen with their parent
+    level.register(carried)
+    server = GameServer({"level_0": level}, interest=InterestArea(width=4, height=4))
+    with server.lock:
+        player, join_message = server.join(0, None)
+
+    def frame_of(data: Optional[bytes]) -> dict:
+        assert data is not None
+        return wire.decode_from_server(data[4:])
+
+    def visible_states() -> dict:
+        ids = {s.id for s in stones if min(abs(s.x - player.x), MAX_X - abs(s.x - player.x)) <= 2}
+        ids.add(player.id)
+        if stones[1].id in ids:
+            ids.add(carried.id)
+        return {o["id"]: o for o in level.get_serializable_state()["objects"] if o["id"] in ids}
+
+    player.x, player.y = 2, 0
+    level.correct_periodic_positions()
+    server.tick_stages()
+    state = apply_snapshot({}, frame_of(join_message)["snapshot"])
+    state = apply_snapshot(state, frame_of(server.next_snapshot(0)))
+    assert state == visible_states()
+    assert carried.id in state and stones[4].id not in state
+
+    player.x = 8  # stones 0 to 2 leave the view, stones 3 to 5 enter it
+    level.correct_periodic_positions()
+    server.tick_stages()
+    delta = frame_of(server.next_snapshot(0))
+    assert set(delta["despawn"]) == {stones[0].id, stones[1].id, stones[2].id, carried.id}
+    assert {o["id"] for o in delta["spawn"]} == {stones[3].id, stones[4].id, stones[5].id}
+    assert apply_snapshot(state, delta) == visible_states()
+
+
+def test_static_objects_are_read_once_and_sprite_tables_sent_per_class() -> None:
+    level = Level("test")
+    tiles = [
+        Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        for x in range(4)
+    ]
+    stones = [Stone(x, 0, f"stone_{x}", 10) for x in range(2)]
+    for obj in [*tiles, *stones]:
+        level.register(obj)
+
+    first = level.get_serializable_state()
+    second = level.get_serializable_state()
+    assert [a is b for a, b in zip(first["objects"], second["objects"])] == [True] * 4 + [False] * 2
+    assert "standing_sprites_locations" not in first["objects"][0]
+
+    stage = LevelSnapshotStage("test", wire.encode)
+    stage.tick(first)
+    keyframe = wire.decode(stage.keyframe())
+    assert set(keyframe["manifest"]) == {
+        "Ground/assets/sprites/terrain/tile_1_1_1_1",
+        "Stone",
+    }
+    stone_tables = keyframe["manifest"]["Stone"]
+    assert stone_tables["standing_sprites_locations"] == stones[0].standing_sprites_locations
+    assert stone_tables["push_sprites_locations"] is None
+
+
+def test_inputs_are_sent_on_change_and_held_by_the_server() -> None:
+    sender = InputSender(heartbeat_s=1.0)
+    up = KeyMask(KEY_BITS[pygame.K_UP])
+    idle = KeyMask()
+    messages = [
+        sender.poll(keys, now)
+        for keys, now in [(idle, 0.0), (idle, 0.5), (up, 0.6), (up, 0.7), (up, 1.7), (idle, 1.8)]
+    ]
+    assert [m and m["mask"] for m in messages] == [0, None, up.mask, None, up.mask, 0]
+    assert [m["seq"] for m in messages if m] == [0, 1, 2, 3]
+    assert messages[2] is not None and messages[4] is not None
+    assert len(wire.encode(messages[2])) < 20
+
+    level = Level("level_0")
+    server = GameServer({"level_0": level})
+    conn, peer = socket.socketpair()
+    with server.lock:
+        player, _ = server.join(0, conn)
+    server.handle_message(0, player, messages[4])
+    server.handle_message(0, player, messages[2])  # outdated: ignored
+    assert server.inputs[0] == (2, up)
+    received: list[KeyMask] = []
+    player.get_pressed_keys = received.append
+    profiler.reset()
+    profiler.enabled = True
+    try:
+        server.update_world()
+        server.update_world()
+    finally:
+        profiler.enabled = False
+    assert received == [up, up]  # the held keys are fed to the player at every tick
+    counts = {(row["phase"], row["class"]): row["count"] for row in profiler.summary("level_0")}
+    assert counts["serialize", None] == counts["broadcast", None] == counts["set_volume", None] == 2
+    assert counts["update", "Player"] == 2
+    profiler.reset()
+    server.disconnect(0)
+    peer.close()
+    assert up[pygame.K_UP] and not up[pygame.K_DOWN] and any(up) and not any(idle)
+
+
+def test_clients_render_buffered_snapshots_in_the_past() -> None:
+    level = Level("test")
+    stone = Stone(1, 0, "stone", 10)
+    level.register(stone)
+    stage = LevelSnapshotStage("test", pickle.dumps)
+    snapshots = []
+    for tick in range(4):
+        stone.x = 1 + tick
+        stage.tick(level.get_serializable_state(), tick, tick * 100.0)
+        snapshots.append(stage.keyframe_snapshot() if tick == 0 else pickle.loads(stage.delta()))
+    assert wire.decode(wire.encode(snapshots[1]))["time_ms"] == 100.0
+    assert [snapshot["tick"] for snapshot in snapshots] == [0, 1, 2, 3]
+
+    # the snapshots arrive with jitter, the client renders 150ms behind the server clock
+    buffer = JitterBuffer(delay_ms=150, smoothing=0)
+    for snapshot, arrival in zip(snapshots, (1000.0, 1130.0, 1190.0, 1300.0)):
+        buffer.push(snapshot, arrival)
+    assert buffer.pop_due(1100) == []
+    assert buffer.pop_due(1150) == snapshots[:1]
+    assert buffer.interpolation(1200) == (0.5, snapshots[1])
+    assert buffer.pop_due(1260) == snapshots[1:2]
+    assert next_positions(snapshots[2]) == {stone.id: (3, None)}
+    assert buffer.pop_due(math.inf) == snapshots[2:]
+    assert buffer.interpolation(math.inf) == (0.0, None)
+
+
+def test_animations_advance_at_their_own_pace() -> None:
+    stone = Stone(1, 0, "stone", 10)
+    assert [animation_clock.step(stone) for _ in range(3)] == [1, 1, 1]
+    try:
+        animation_clock.fps = 10
+        steps = []
+        for time_ms in (0, 16, 33, 50, 100, 116, 200):
+            animation_clock.set_time(time_ms)
+            steps.append(animation_clock.step(stone))
+        assert steps == [1, 0, 0, 0, 1, 0, 1]
+    finally:
+        animation_clock.fps = None
+
+
+def test_levels_are_updated_in_parallel_and_portals_applied_between_ticks() -> None:
+    world = {"level_0": Level("level_0"), "level_1": Level("level_1")}
+    world["level_1"].register(Stone(3, 3, "door", 10))
+    updated: list[str] = []
+
+    class RecordingServer(GameServer):
+        def update_level(self, level, *args) -> None:
+            updated.append(level.level_key)
+            super().update_level(level, *args)
+
+    server = RecordingServer(world, workers=2)
+    pairs = [socket.socketpair() for _ in range(2)]
+    with server.lock:
+        player_0, _ = server.join(0, pairs[0][0])
+        player_1, _ = server.join(1, pairs[1][0])
+    portal = {"type": "portal_request", "target_level": "level_1", "exit_name": "door"}
+    server.handle_message(1, player_1, portal)
+    assert server.client_levels[1] is world["level_0"]  # queued until the next tick
+
+    server.update_world()
+    assert server.client_levels[1] is world["level_1"] and (player_1.x, player_1.y) == (3, 3)
+    assert player_1 in world["level_1"]._observers and player_1 not in world["level_0"]._observers
+    assert sorted(updated) == ["level_0", "level_1"]
+    assert set(server.stages) == {"level_0", "level_1"}
+
+    server.disconnect(0)
+    assert player_0 in world["level_0"]._observers  # removed between ticks
+    server.update_world()
+    assert player_0 not in world["level_0"]._observers
+    assert sorted(updated) == ["level_0", "level_1", "level_1"]
+    server.disconnect(1)
+    for _, peer in pairs:
+        peer.close()
+
+
+def test_a_shard_never_builds_the_levels_of_the_other_shards(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    levels = LevelFactory()
+    built: list[str] = []
+
+    def build(key: str, target: str) -> Level:
+        built.append(key)
+        level = Level(key)
+        portal = Portal(1, 1, f"portal_to_{target}", 10)
+        portal.level_key = target
+        level.register(portal)
+        return level
+
+    levels.register("level_0")(lambda: build("level_0", target="level_1"))
+    levels.register("level_1")(lambda: build("level_1", target="level_0"))
+    monkeypatch.setattr(server_module, "factory", levels)
+
+    shard = ShardServer({"level_0": levels.lazy("level_0")})
+    with shard.lock:
+        shard.join(0, None)
+    for thread in list(levels._prefetching.values()):
+        thread.join()
+    assert built == ["level_0"]  # level_1 is owned by another shard
+
+    server = GameServer({key: levels.lazy(key) for key in levels.level_keys()})
+    with server.lock:
+        server.join(0, None)
+    for thread in list(levels._prefetching.values()):
+        thread.join()
+    assert built == ["level_0", "level_1"]
+
+
+def test_sharded_workers_hand_players_over_through_the_coordinator() -> None:
+    assert assign_levels(["level_2", "level_0", "level_1"], 2) == {
+        "level_0": 0,
+        "level_1": 1,
+        "level_2": 0,
+    }
+    level_0, level_1 = Level("level_0"), Level("level_1")
+    level_1.register(Stone(3, 3, "door", 10))
+    shards = [ShardServer({"level_0": level_0}), ShardServer({"level_1": level_1})]
+
+    async def read_message(reader: asyncio.StreamReader) -> dict:
+        length = struct.unpack("!I", await reader.readexactly(4))[0]
+        return wire.decode_from_server(await reader.readexactly(length))
+
+    async def scenario() -> None:
+        tcp_servers = [
+            await asyncio.start_server(shard.handle_connection, "127.0.0.1", 0) for shard in shards
+        ]
+        owners = {
+            key: tcp_server.sockets[0].getsockname()[:2]
+            for key, tcp_server in zip(["level_0", "level_1"], tcp_servers)
+        }
+        coordinator = await asyncio.start_server(
+            Coordinator(owners).handle_connection, "127.0.0.1", 0
+        )
+        port = coordinator.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        join = await read_message(reader)
+        assert join["snapshot"]["level_key"] == "level_0"
+
+        portal = wire.encode(
+            {"type": "portal_request", "target_level": "level_1", "exit_name": "door"}
+        )
+        writer.write(struct.pack("!I", len(portal)) + portal)
+        snapshot = join["snapshot"]
+        while snapshot["level_key"] != "level_1":
+            for shard in shards:
+                shard.update_world()
+            snapshot = await asyncio.wait_for(read_message(reader), 5)
+        assert snapshot["type"] == "keyframe"
+        player = next(o for o in snapshot["objects"] if o["id"] == join["player_id"])
+        assert (player["x"], player["y"]) == (3, 3)
+        assert shards[0].clients == {} and len(shards[1].clients) == 1
+        assert shards[0].ready == {}  # its sender is no longer woken up
+        assert all(obj.id != join["player_id"] for obj in level_0._observers)
+
+        writer.close()
+        for tcp_server in [*tcp_servers, coordinator]:
+            tcp_server.close()
+            await tcp_server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_ticks_keep_their_rate_and_degrade_under_load() -> None:
+    now = [0.0]
+    scheduler = TickScheduler(rate_hz=10, max_catch_up=2, clock=lambda: now[0])
+
+    def tick(duration: float) -> None:
+        def work() -> None:
+            now[0] += duration
+
+        scheduler.run(work)
+
+    assert scheduler.delay() == 0.0
+    tick(0.03)
+    assert scheduler.delay() == pytest.approx(0.07)  # the time of the tick is deducted
+    now[0] = 0.1
+    tick(0.45)  # an overrun: the ticks due at 0.2 to 0.5 are late
+    assert scheduler.delay() == 0.0
+    assert scheduler.skipped_ticks == 1 and scheduler.late_ticks == 1
+    for _ in range(2):  # catching up, back to back
+        tick(0.01)
+        assert scheduler.delay() == 0.0
+    tick(0.01)
+    assert scheduler.delay() == pytest.approx(0.02)  # back on schedule
+    assert (scheduler.ticks, scheduler.late_ticks, scheduler.overruns) == (5, 2, 1)
+
+    for _ in range(40):
+        now[0] += scheduler.delay()
+        tick(0.15)
+    assert scheduler.degradation >= 2
+    for _ in range(200):
+        now[0] += scheduler.delay()
+        tick(0.01)
+    assert scheduler.degradation == 0
+    assert scheduler.stats()["max_ms"] == pytest.approx(450)
+
+
+def test_objects_far_from_the_players_are_prepared_less_often_when_degraded() -> None:
+    level = Level("level_0")
+    near, far = Stone(6, 6, "near", 10), Stone(11, 1, "far", 10)
+    for stone in (near, far):
+        level.register(stone)
+    server = GameServer({"level_0": level})  # the area of interest covers the whole level
+    with server.lock:
+        player, _ = server.join(0, None)
+    assert server.interest.visible(level, player) is None
+    prepared: list[str] = []
+    for obj in (near, far, player):
+        obj.prepare = lambda near_objs, game, name=obj.name: prepared.append(name)  # type: ignore
+
+    server.tick_scheduler.degradation = 1
+    server.update_level(level, [(player, None)], near_only=True)
+    assert sorted(prepared) == ["Player0", "near"]
+    prepared.clear()
+    server.update_level(level, [(player, None)])
+    assert sorted(prepared) == ["Player0", "far", "near"]
+
+
+HEADLESS_SERVER = """
+import time
+
+import pygame
+from flatland.animations.sprite_cache import sprite_cache
+from flatland.multiplayer.server import GameServer
+from flatland.objects.items_registry import registry
+from flatland.sim_clock import sim_clock
+from flatland.world.level import Level
+
+level = Level("level_0")
+cow = registry.create("Cow", x=1, y=1, name="cow", health=10, vision_range=5, hearing_range=5)
+balloon = registry.create("Baloon", x=2, y=2, name="balloon", health=10, speech="hi\\nthere")
+level.register(cow)
+level.register(balloon)
+server = GameServer({"level_0": level})
+server.tick_stages()
+assert not pygame.display.get_init() and not pygame.mixer.get_init()
+assert len(sprite_cache) == 0 and cow.make_sound is None
+time.sleep(0.01)
+assert sim_clock.get_ticks() >= 10  # the simulation runs without the pygame clock
+assert cow.movement_sprites == cow.movement_sprites_locations  # paths instead of surfaces
+assert balloon.sprite_size_y > 100 and balloon.standing_sprites[0]
+assert level.sprite_manifest["Cow"]["movement_sprites_locations"] == cow.movement_sprites_locations
+"""
+
+
+def test_the_server_runs_without_loading_assets() -> None:
+    env = {**os.environ, "FLATLAND_HEADLESS": "true"}
+    result = subprocess.run(
+        [sys.executable, "-c", HEADLESS_SERVER], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_bots_measure_the_snapshots_and_the_input_latency() -> None:
+    assert parse_script("right:0.5,up+slash,idle:2") == [
+        (KEY_BITS[pygame.K_RIGHT], 0.5),
+        (KEY_BITS[pygame.K_UP] | KEY_BITS[pygame.K_SPACE], 1.0),
+        (0, 2.0),
+    ]
+    with pytest.raises(ValueError):
+        parse_script("jump:1")
+    level = Level("level_0")
+    for x in range(4):
+        level.register(
+            Ground(x, 0, f"ground_{x}", 10, tile_name="assets/sprites/terrain/tile_1_1_1_1")
+        )
+    server = AsyncGameServer({"level_0": level}, tick_rate_hz=50)
+    duration_s = 1.5
+
+    async def scenario() -> list[dict]:
+        tcp_server = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        world_loop = asyncio.create_task(server.world_loop_async())
+        bots = [Bot(i, itertools.cycle(parse_script("right:0.3,up:0.3"))) for i in range(2)]
+        reports = await run_bots_async(bots, "127.0.0.1", port, duration_s=duration_s)
+        world_loop.cancel()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        return reports
+
+    reports = asyncio.run(scenario())
+    for report in reports:
+        assert report["error"] is None and report["keyframes"] >= 1
+        # no timing threshold: the runners are shared, only what the bots measured is checked
+        assert report["snapshot_rate_hz"] > 0 and report["down_kbps"] > report["up_kbps"] > 0
+        assert report["latencies_ms"]
+        assert all(0 < ms < 1000 * duration_s for ms in report["latencies_ms"])
+    summary = summarize(reports)
+    assert summary["connected"] == 2 and summary["errors"] == 0
+    assert summary["latency_samples"] == sum(len(r["latencies_ms"]) for r in reports)
@@ -1,10 +1,12 @@
+import gc
 import os
 from typing import Any
 
 import pygame
 import pytest
 
-from flatland.consts import MAX_X, MAX_Y, TILE_SIZE
+from flatland.animations.sprite_cache import SpriteCache, sprite_cache
+from flatland.consts import MAX_X, MAX_Y, TILE_SIZE, Direction
 from flatland.llm_stub import LLMNPCBrain
 from flatland.objects.items import Cow, Player, Stone
 from flatland.world.world import world
@@ -46,3 +48,30 @@ def test_npc_brain():
         brain.observe(event)
     assert brain.decide_action() == "reflect"
     assert "Bob" in brain.speak()
+
+
+def test_sprites_are_shared_between_instances() -> None:
+    cow_1 = Cow(1, 1, "lola", 4, 3, 3)
+    cow_2 = Cow(2, 1, "lolita", 4, 3, 3)
+    assert cow_1.movement_sprites[Direction.UP][0] is cow_2.movement_sprites[Direction.UP][0]
+    path = cow_1.movement_sprites_locations[Direction.UP][0]
+    gc.collect()
+    refs = sprite_cache.refcount(path)
+    del cow_2
+    gc.collect()
+    assert sprite_cache.refcount(path) == refs - 1
+
+
+def test_sprite_cache_evicts_unreferenced_sprites() -> None:
+    cache = SpriteCache(max_bytes=2 * 64 * 64 * 4)
+    owner, former_owner = Stone(1, 1, "a rock", 10), Stone(2, 1, "another rock", 10)
+    cache.get_or_create(former_owner, "kept", lambda: pygame.Surface((64, 64), pygame.SRCALPHA))
+    assert cache.refcount("kept") == 1
+    del former_owner  # its reference is released by its finalizer
+    gc.collect()
+    assert cache.refcount("kept") == 0 and "kept" in cache  # unreferenced, not evicted yet
+    for key in ["a", "b"]:
+        cache.get_or_create(owner, key, lambda: pygame.Surface((64, 64), pygame.SRCALPHA))
+    assert "kept" not in cache
+    assert "a" in cache and "b" in cache
+    assert cache.max_bytes is not None and cache.total_bytes <= cache.max_bytes